@@ -0,0 +1,144 @@
+"""
+Корпус страниц объявлений для бенчмарка парсера.
+
+Сохраненные страницы лежат в benchmarks/corpus/*.html. Добавить реальные:
+    python -m benchmarks.corpus record https://lombard-perspectiva.ru/clocks_today/... [...]
+Если каталог пуст, load_corpus() генерирует синтетические страницы реального размера
+(меню, сетка фото, таблица характеристик, карусель похожих товаров, инлайн-скрипты) -
+детерминированно, по seed.
+"""
+import glob
+import os
+import random
+import sys
+from dataclasses import dataclass
+from typing import List
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+BASE_URL = "https://lombard-perspectiva.ru/clocks_today/"
+
+BRANDS = ["Rolex", "Omega", "Patek Philippe", "Audemars Piguet", "Cartier", "Breitling", "IWC", "Panerai"]
+MODELS = ["Submariner", "Daytona", "Seamaster", "Nautilus", "Royal Oak", "Santos", "Navitimer", "Luminor"]
+LABELS = [
+    ("Тип", ["Мужские", "Женские", "Унисекс"]),
+    ("Материал корпуса", ["Нержавеющая сталь", "Желтое золото", "Титан", "Керамика"]),
+    ("Водонепроницаемость", ["30 м", "100 м", "300 м"]),
+    ("Диаметр корпуса, мм", ["36", "40", "41", "42", "44"]),
+    ("Цвет циферблата", ["Черный", "Синий", "Белый", "Зеленый"]),
+    ("Безель", ["Вращающийся", "Гладкий", "Рифленый"]),
+    ("Механизм", ["Автоматический", "Кварцевый", "Механический"]),
+    ("Функции", ["Дата", "Хронограф", "GMT", "Дата, хронограф"]),
+    ("Запас хода", ["48 ч", "70 ч", "72 ч"]),
+    ("Калибр", ["3135", "3235", "8900", "4130"]),
+    ("Материал ремешка", ["Сталь", "Кожа", "Каучук"]),
+    ("Комплектация", ["Коробка, документы", "Только часы", "Полный комплект"]),
+    ("Состояние", ["Отличное", "Хорошее", "Новое"]),
+    ("Стекло", ["Сапфировое", "Минеральное"]),
+]
+ROW_CLASS = "d-block d-sm-flex flex-nowrap justify-space-between align-baseline my-2"
+
+
+@dataclass
+class CorpusPage:
+    name: str
+    url: str
+    content: bytes
+    encoding: str = "utf-8"
+
+
+def _menu(rng: random.Random) -> str:
+    items = "".join(
+        f'<li class="v-list-item v-list-item--link"><a href="/catalog/{i}/" class="menu-link">'
+        f'{rng.choice(BRANDS)} {rng.choice(MODELS)}</a></li>'
+        for i in range(rng.randint(60, 120))
+    )
+    return f'<header class="v-app-bar"><nav class="v-navigation-drawer"><ul class="v-list">{items}</ul></nav></header>'
+
+
+def _card(rng: random.Random, i: int) -> str:
+    return (
+        f'<div class="catalog-item v-card v-sheet theme--light elevation-0">'
+        f'<a class="catalog-item--link" href="/clocks_today/item-{i}/">'
+        f'<img class="catalog-item--image" src="/upload/preview/{rng.getrandbits(48):x}.jpg" alt=""></a>'
+        f'<div class="catalog-item--title">{rng.choice(BRANDS)}</div>'
+        f'<div class="catalog-item--subtitle">{rng.choice(MODELS)}</div>'
+        f'<p class="catalog-item--price">{rng.randint(100, 9000) * 1000:,} ₽</p></div>'
+    ).replace(",", " ")
+
+
+def _script(rng: random.Random, size: int) -> str:
+    body = ";".join(f"var _{rng.getrandbits(32):x}={rng.random()}" for _ in range(size // 24))
+    return f"<script>{body}</script>"
+
+
+def synthetic_page(seed: int) -> CorpusPage:
+    """Страница объявления в разметке сайта (Vuetify/Nuxt) размером ~150-300 КБ"""
+    rng = random.Random(seed)
+    brand, model = rng.choice(BRANDS), rng.choice(MODELS)
+    photos = "".join(
+        f'<div class="v-image"><img src="/upload/iblock/{rng.getrandbits(64):x}.jpg?w=800"></div>'
+        for _ in range(rng.randint(4, 16))
+    )
+    rows = "".join(
+        f'<div class="{ROW_CLASS}"><div class="option-label">{label}</div>'
+        f'<div class="option-dots"></div><div class="option-value">{rng.choice(values)}</div></div>'
+        for label, values in LABELS
+        if rng.random() > 0.15
+    )
+    similar = "".join(_card(rng, i) for i in range(rng.randint(20, 40)))
+    body = (
+        f'<div id="__nuxt"><div id="__layout"><div class="v-application">{_menu(rng)}'
+        f'<main class="v-main"><div class="container">'
+        f'<div class="catalog-item--photos__grid">{photos}</div>'
+        f'<a class="catalog-item--brand-title" href="/brand/{brand.lower()}/">{brand}</a>'
+        f'<div class="catalog-item--model">{model}</div>'
+        f'<div class="text-gray">Ref. {rng.randint(1000, 999999)}.{rng.randint(10, 99)}</div>'
+        f'<p class="item-price--text">{rng.randint(100, 9000) * 1000} ₽</p>'
+        f'<div class="d-flex"><div class="flex-shrink-0">{rng.choice(["Отличное", "Хорошее", "Новое"])}</div></div>'
+        f'<section class="catalog-item--options">{rows}</section>'
+        f'<section class="similar v-slide-group">{similar}</section>'
+        f'</div></main><footer class="v-footer">{_card(rng, 0) * 5}</footer></div></div></div>'
+    )
+    scripts = "".join(_script(rng, rng.randint(20_000, 60_000)) for _ in range(2))
+    html = (
+        f'<!doctype html><html lang="ru"><head><meta charset="utf-8"><title>{brand} {model}</title>'
+        f'<style>{".v-btn{display:inline-flex}" * 800}</style></head>'
+        f'<body>{body}{scripts}</body></html>'
+    )
+    name = f"synthetic-{seed:03d}"
+    return CorpusPage(name=name, url=f"{BASE_URL}{name}/", content=html.encode("utf-8"))
+
+
+def load_corpus(size: int = 20) -> List[CorpusPage]:
+    """Сохраненные страницы из CORPUS_DIR, иначе size синтетических"""
+    paths = sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html")))
+    if not paths:
+        return [synthetic_page(seed) for seed in range(size)]
+    pages = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            pages.append(CorpusPage(name=name, url=f"{BASE_URL}{name}/", content=f.read()))
+    return pages
+
+
+def record(urls: List[str]):
+    """Сохранить страницы в корпус (один раз, с сетью)"""
+    import requests
+    from src.http_pool import DEFAULT_HEADERS
+
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for url in urls:
+        response = requests.get(url, headers=DEFAULT_HEADERS, timeout=30)
+        response.raise_for_status()
+        name = url.rstrip("/").rsplit("/", 1)[-1] or "index"
+        with open(os.path.join(CORPUS_DIR, f"{name}.html"), "wb") as f:
+            f.write(response.content)
+        print(f"{name}.html: {len(response.content) // 1024} КБ")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "record":
+        record(sys.argv[2:])
+    else:
+        print("Использование: python -m benchmarks.corpus record URL [URL ...]")
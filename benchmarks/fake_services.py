@@ -0,0 +1,271 @@
+"""
+Локальные заменители внешних сервисов для нагрузочного теста (benchmarks/loadtest.py).
+
+FakeBotAPI - HTTP-сервер с методами Bot API: отвечает как Telegram, записывает вызовы,
+умеет добавлять задержку и отвечать 429 с retry_after.
+FakeLombardSite - страницы объявлений (benchmarks.corpus.synthetic_page) и картинки.
+"""
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from benchmarks.corpus import synthetic_page
+
+SITE_ORIGIN = "https://lombard-perspectiva.ru"
+LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+@dataclass
+class ApiCall:
+    at: float
+    method: str
+    params: Dict[str, str]
+    status: int
+
+
+class _Server:
+    """ThreadingHTTPServer в фоновом потоке на свободном порту 127.0.0.1"""
+
+    def __init__(self, handler_cls):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _delay(latency: float, jitter: float):
+    if latency or jitter:
+        time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+
+class _BotApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        api: "FakeBotAPI" = self.server.owner
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)  # multipart с файлами не разбираем
+        parts = urlsplit(self.path)
+        method = parts.path.rsplit("/", 1)[-1]
+        params = dict(parse_qsl(parts.query))
+        status, payload = api.respond(method, params)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeBotAPI(_Server):
+    """
+    Заменитель api.telegram.org.
+    latency/jitter - задержка ответа, сек; flood_rate - доля ограничиваемых методов
+    (send*/edit*/copy*/forward*), на которые приходит 429 с retry_after.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 flood_rate: float = 0.0, retry_after: int = 1):
+        super().__init__(_BotApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls: List[ApiCall] = []
+        self._cond = threading.Condition()
+        self._next_id = 1000
+
+    @property
+    def api_url(self) -> str:
+        """Шаблон для telebot.apihelper.API_URL"""
+        return self.base_url + "/bot{0}/{1}"
+
+    def _message_id(self) -> int:
+        with self._cond:
+            self._next_id += 1
+            return self._next_id
+
+    def _chat(self, chat_id: str) -> Dict[str, Any]:
+        if chat_id.startswith("@") or chat_id.startswith("-"):
+            numeric = -(abs(hash(chat_id)) % 10**12) - 1 if chat_id.startswith("@") else int(chat_id)
+            return {"id": numeric, "type": "channel", "title": f"Fake {chat_id}", "username": chat_id.lstrip("@")}
+        return {"id": int(chat_id or 0), "type": "private", "first_name": "Manager"}
+
+    def _message(self, params: Dict[str, str], **content) -> Dict[str, Any]:
+        return {
+            "message_id": self._message_id(),
+            "date": int(time.time()),
+            "chat": self._chat(params.get("chat_id", "0")),
+            **content,
+        }
+
+    def _result(self, method: str, params: Dict[str, str]) -> Any:
+        photo = [{"file_id": f"photo-{self._next_id}", "file_unique_id": f"u{self._next_id}", "width": 1280, "height": 960}]
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Load", "username": "load_test_bot"}
+        if method == "getChat":
+            return self._chat(params.get("chat_id", "0"))
+        if method == "sendMediaGroup":
+            media = json.loads(params.get("media", "[]"))
+            return [self._message(params, photo=photo) for _ in media]
+        if method == "sendPhoto":
+            return self._message(params, photo=photo)
+        if method == "sendVideo":
+            return self._message(params, video={"file_id": f"video-{self._next_id}", "file_unique_id": "v",
+                                                "width": 1280, "height": 720, "duration": 10})
+        if method.startswith(("send", "edit", "copyMessage", "forwardMessage")):
+            return self._message(params, text=params.get("text", ""))
+        if method == "copyMessages":
+            return [{"message_id": self._message_id()} for _ in json.loads(params.get("message_ids", "[]"))]
+        return True
+
+    def respond(self, method: str, params: Dict[str, str]):
+        _delay(self.latency, self.jitter)
+        if method.startswith(LIMITED_PREFIXES) and random.random() < self.flood_rate:
+            status, payload = 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        else:
+            status, payload = 200, {"ok": True, "result": self._result(method, params)}
+        with self._cond:
+            self.calls.append(ApiCall(time.monotonic(), method, params, status))
+            self._cond.notify_all()
+        return status, payload
+
+    def wait_for(self, predicate: Callable[[ApiCall], bool], since: int = 0,
+                 timeout: float = 30.0) -> Optional[ApiCall]:
+        """Первый успешный вызов с индексом >= since, подходящий под predicate"""
+        deadline = time.monotonic() + timeout
+        checked = since
+        with self._cond:
+            while True:
+                for call in self.calls[checked:]:
+                    if call.status == 200 and predicate(call):
+                        return call
+                checked = len(self.calls)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def wait_idle(self, quiet: float = 2.0, timeout: float = 120.0) -> bool:
+        """Дождаться, пока бот перестанет слать запросы (quiet секунд без вызовов)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while time.monotonic() < deadline:
+                last = self.calls[-1].at if self.calls else 0.0
+                idle = time.monotonic() - last
+                if idle >= quiet:
+                    return True
+                self._cond.wait(quiet - idle)
+        return False
+
+    def mark(self) -> int:
+        with self._cond:
+            return len(self.calls)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            by_method: Dict[str, int] = {}
+            for call in self.calls:
+                by_method[call.method] = by_method.get(call.method, 0) + 1
+            return {
+                "calls": len(self.calls),
+                "flood_responses": sum(1 for call in self.calls if call.status == 429),
+                "by_method": by_method,
+            }
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, with_body: bool):
+        site: "FakeLombardSite" = self.server.owner
+        _delay(site.latency, site.jitter)
+        path = urlsplit(self.path).path
+        if path.startswith("/clock/"):
+            name = path.strip("/").rsplit("/", 1)[-1]
+            seed = int(name.rsplit("-", 1)[-1]) if name.rsplit("-", 1)[-1].isdigit() else 0
+            body, content_type = site.page(seed), "text/html; charset=utf-8"
+        elif path.startswith("/upload/"):
+            body, content_type = b"\xff\xd8\xff\xe0" + b"\0" * 2048, "image/jpeg"
+        else:
+            body, content_type = b"not found", "text/plain"
+        self.send_response(200 if content_type != "text/plain" else 404)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(True)
+
+    def do_HEAD(self):
+        self._reply(False)
+
+
+class FakeLombardSite(_Server):
+    """Заменитель lombard-perspectiva.ru: /clock/<name>-<seed>/ и картинки /upload/..."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__(_SiteHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self._pages: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+
+    def page(self, seed: int) -> bytes:
+        with self._lock:
+            if seed not in self._pages:
+                self._pages[seed] = synthetic_page(seed).content
+            return self._pages[seed]
+
+    @staticmethod
+    def listing_url(seed: int) -> str:
+        return f"{SITE_ORIGIN}/clock/watch-{seed}/"
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Адаптер requests: запросы к SITE_ORIGIN уходят на локальный FakeLombardSite"""
+
+    def __init__(self, target: str, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target.rstrip("/")
+
+    def send(self, request, **kwargs):
+        request.url = self.target + request.url[len(SITE_ORIGIN):]
+        return super().send(request, **kwargs)
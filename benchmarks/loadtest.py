@@ -0,0 +1,316 @@
+"""
+Нагрузочный тест обработчиков src/handlers.py (синхронный режим, src/main.py) без Telegram и без сайта.
+
+N менеджеров параллельно проходят сценарий
+ссылка -> превью -> перестановка фото -> выбор каналов -> публикация везде.
+Обновления идут через bot.process_new_updates (как в webhook), все запросы к Bot API -
+в локальный FakeBotAPI через обычный HTTP и outbound_governor, страницы и картинки -
+в FakeLombardSite.
+
+    python -m benchmarks.loadtest --managers 10 --flows 3 --api-latency 0.05 --flood-rate 0.02
+
+Отчет: пропускная способность, p50/p95/p99 по шагам, доля ошибок, вызовы API и 429.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Настройки бота для прогона: токен фиктивный, запросы уходят только в FakeBotAPI
+for _key, _value in {
+    "BOT_TOKEN": "123456:LOAD-TEST",
+    "CHANNEL_ID": "@loadtest_channel",
+    "MY_CHANNEL_ID": "-1001000000001",
+    "ADMIN_ID": "1",
+    "API_ID": "1",
+    "API_HASH": "loadtest",
+    "RATE_LIMIT_PER_MINUTE": "0",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+from telebot import apihelper, types  # noqa: E402
+
+from benchmarks.fake_services import SITE_ORIGIN, ApiCall, FakeBotAPI, FakeLombardSite, RedirectAdapter  # noqa: E402
+from benchmarks.parser_bench import percentile  # noqa: E402
+
+STEPS = ("first_preview", "preview_ready", "reorder", "choose_channels", "confirm", "publish")
+
+
+@dataclass
+class LoadTestConfig:
+    managers: int = 5
+    flows: int = 2  # сценариев на менеджера
+    pages: int = 50  # разных объявлений
+    api_latency: float = 0.0
+    api_jitter: float = 0.0
+    flood_rate: float = 0.0
+    retry_after: int = 1
+    site_latency: float = 0.0
+    step_timeout: float = 60.0
+
+
+@dataclass
+class LoadTestReport:
+    config: LoadTestConfig
+    wall_seconds: float = 0.0
+    flows_ok: int = 0
+    flows_failed: int = 0
+    updates: int = 0
+    steps: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    step_errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    api: Dict = field(default_factory=dict)
+    governor: Dict = field(default_factory=dict)
+
+    @property
+    def error_rate(self) -> float:
+        total = self.flows_ok + self.flows_failed
+        return self.flows_failed / total if total else 0.0
+
+    def summary(self) -> Dict:
+        wall = self.wall_seconds or 1e-9
+        return {
+            "managers": self.config.managers,
+            "flows_ok": self.flows_ok,
+            "flows_failed": self.flows_failed,
+            "error_rate": self.error_rate,
+            "wall_seconds": self.wall_seconds,
+            "flows_per_sec": self.flows_ok / wall,
+            "updates_per_sec": self.updates / wall,
+            "api_calls_per_sec": self.api.get("calls", 0) / wall,
+            "steps": {
+                step: {
+                    "count": len(self.steps[step]),
+                    "errors": self.step_errors[step],
+                    "p50_ms": percentile(self.steps[step], 50) * 1000 if self.steps[step] else None,
+                    "p95_ms": percentile(self.steps[step], 95) * 1000 if self.steps[step] else None,
+                    "p99_ms": percentile(self.steps[step], 99) * 1000 if self.steps[step] else None,
+                }
+                for step in STEPS
+            },
+            "api": self.api,
+            "governor": self.governor,
+        }
+
+    def format(self) -> str:
+        data = self.summary()
+        lines = [
+            f"managers={data['managers']} flows ok={data['flows_ok']} failed={data['flows_failed']} "
+            f"(error rate {data['error_rate']:.1%}) in {data['wall_seconds']:.1f}s",
+            f"throughput: {data['flows_per_sec']:.2f} flows/s, {data['updates_per_sec']:.1f} updates/s, "
+            f"{data['api_calls_per_sec']:.1f} API calls/s",
+            f"{'step':<16}{'n':>5}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+        ]
+        for step, row in data["steps"].items():
+            cells = "".join(f"{row[key]:>10.0f}" if row[key] is not None else f"{'-':>10}"
+                            for key in ("p50_ms", "p95_ms", "p99_ms"))
+            lines.append(f"{step:<16}{row['count']:>5}{row['errors']:>5}{cells}")
+        lines.append(f"API: {data['api'].get('calls', 0)} calls, {data['api'].get('flood_responses', 0)} x 429 injected; "
+                     f"by method: {data['api'].get('by_method', {})}")
+        lines.append(f"governor: {data['governor']}")
+        return "\n".join(lines)
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Manager:
+    """Один менеджер: свой чат, последовательные сценарии"""
+
+    def __init__(self, harness: "LoadTest", index: int):
+        self.harness = harness
+        self.chat_id = 50_000 + index
+        self.user = {"id": self.chat_id, "is_bot": False, "first_name": f"Manager {index}"}
+
+    def _message(self, text: str) -> Dict:
+        return {
+            "message_id": next(self.harness.ids),
+            "date": int(time.time()),
+            "chat": {"id": self.chat_id, "type": "private"},
+            "from": self.user,
+            "text": text,
+        }
+
+    def _post(self, update: Dict):
+        update["update_id"] = next(self.harness.ids)
+        with self.harness.lock:
+            self.harness.updates += 1
+        self.harness.bot.process_new_updates([types.Update.de_json(update)])
+
+    def _step(self, name: str, update: Dict, match: Callable[[ApiCall], bool], since: Optional[int] = None,
+              started: Optional[float] = None) -> ApiCall:
+        api = self.harness.api
+        since = api.mark() if since is None else since
+        started = time.monotonic() if started is None else started
+        if update is not None:
+            self._post(update)
+        call = api.wait_for(match, since=since, timeout=self.harness.config.step_timeout)
+        if call is None:
+            self.harness.report.step_errors[name] += 1
+            raise StepFailed(f"{name}: timeout")
+        text = call.params.get("text", "")
+        if text.startswith(("Ошибка", "Произошла")) or "непредвиденная ошибка" in text:
+            self.harness.report.step_errors[name] += 1
+            raise StepFailed(f"{name}: {text}")
+        self.harness.report.steps[name].append(call.at - started)
+        return call
+
+    def _callback(self, data: str) -> Dict:
+        return {"callback_query": {
+            "id": f"{self.chat_id}-{next(self.harness.ids)}",
+            "from": self.user,
+            "message": self._message("menu"),
+            "chat_instance": str(self.chat_id),
+            "data": data,
+        }}
+
+    def _to_me(self, method: str, text_prefix: str = "") -> Callable[[ApiCall], bool]:
+        chat = str(self.chat_id)
+        return lambda call: (call.method == method and call.params.get("chat_id") == chat
+                             and call.params.get("text", "").startswith(text_prefix))
+
+    def run_flow(self, seed: int):
+        url = FakeLombardSite.listing_url(seed)
+        chat = str(self.chat_id)
+
+        since, started = self.harness.api.mark(), time.monotonic()
+        self._step("first_preview", {"message": self._message(url)},
+                   lambda call: call.method == "sendMessage" and call.params.get("chat_id") == chat
+                   and f'href="{url}"' in call.params.get("text", ""), since, started)
+        self._step("preview_ready", None, self._to_me("sendMessage", "Готово!"), since, started)
+
+        self._step("reorder", self._callback("move_down_photo_0"), self._to_me("editMessageReplyMarkup"))
+        self._step("choose_channels", self._callback("send_to_channel"), self._to_me("sendMessage", "Куда отправить"))
+        self._step("confirm", self._callback("send_everywhere"), self._to_me("sendMessage", "Отправить пост ВО ВСЕ"))
+
+        publish = self._callback("confirm_send")
+        query_id = publish["callback_query"]["id"]
+        call = self._step("publish", publish,
+                          lambda call: call.method == "answerCallbackQuery" and call.params.get("callback_query_id") == query_id)
+        if call.params.get("text") != "Готово":
+            self.harness.report.step_errors["publish"] += 1
+            raise StepFailed(f"publish: {call.params.get('text')}")
+
+    def run(self, seeds: List[int]):
+        for seed in seeds:
+            try:
+                self.run_flow(seed)
+                with self.harness.lock:
+                    self.harness.report.flows_ok += 1
+            except StepFailed as e:
+                logging.getLogger(__name__).warning(f"Менеджер {self.chat_id}: {e}")
+                with self.harness.lock:
+                    self.harness.report.flows_failed += 1
+
+
+class LoadTest:
+    """Поднимает заменители, направляет в них бота, гоняет менеджеров и возвращает все как было"""
+
+    def __init__(self, config: LoadTestConfig):
+        self.config = config
+        self.report = LoadTestReport(config)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.api = FakeBotAPI(config.api_latency, config.api_jitter, config.flood_rate, config.retry_after)
+        self.site = FakeLombardSite(config.site_latency)
+
+    def __enter__(self):
+        from src import main
+        from src.http_pool import get_http_session
+
+        self.bot = main.create_runtime().raw_bot
+        self._main = main
+        self._http = get_http_session()
+        self._saved_api_url = apihelper.API_URL
+        self.api.start()
+        self.site.start()
+        apihelper.API_URL = self.api.api_url
+        self._http.mount(SITE_ORIGIN, RedirectAdapter(self.site.base_url))
+        return self
+
+    def __exit__(self, *exc):
+        # Фоновые задачи бота (медиа превью, рассылка, отложенные удаления) еще могут слать запросы:
+        # пока они идут, API_URL должен смотреть в FakeBotAPI
+        from src.scheduler import scheduler
+
+        deadline = time.monotonic() + self.config.step_timeout
+        while scheduler.stats()["queue_depth"] and time.monotonic() < deadline:
+            time.sleep(0.2)
+        if not self.api.wait_idle(timeout=self.config.step_timeout * 2):
+            logging.getLogger(__name__).warning("Бот продолжает слать запросы после прогона")
+        self._http.adapters.pop(SITE_ORIGIN, None)
+        apihelper.API_URL = self._saved_api_url
+        self.api.stop()
+        self.site.stop()
+
+    def run(self) -> LoadTestReport:
+        from src.ratelimit import outbound_governor
+
+        governor_before = outbound_governor.stats()
+        managers = [Manager(self, i) for i in range(self.config.managers)]
+        threads = [
+            threading.Thread(
+                target=manager.run,
+                args=([(i * self.config.flows + k) % self.config.pages for k in range(self.config.flows)],),
+                daemon=True,
+            )
+            for i, manager in enumerate(managers)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report.wall_seconds = time.monotonic() - started
+        self.report.updates = self.updates
+        self.report.api = self.api.stats()
+        self.report.governor = {key: value - governor_before[key] for key, value in outbound_governor.stats().items()}
+        return self.report
+
+
+def run_load_test(config: LoadTestConfig) -> LoadTestReport:
+    with LoadTest(config) as harness:
+        return harness.run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    args.add_argument("--managers", type=int, default=5)
+    args.add_argument("--flows", type=int, default=2, help="сценариев на менеджера")
+    args.add_argument("--pages", type=int, default=50, help="разных объявлений")
+    args.add_argument("--api-latency", type=float, default=0.05, help="задержка Bot API, сек")
+    args.add_argument("--api-jitter", type=float, default=0.02)
+    args.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429 на send/edit")
+    args.add_argument("--retry-after", type=int, default=1)
+    args.add_argument("--site-latency", type=float, default=0.1, help="задержка сайта, сек")
+    args.add_argument("--step-timeout", type=float, default=60.0)
+    args.add_argument("--json", action="store_true", help="отчет в JSON")
+    options = args.parse_args(argv)
+
+    config = LoadTestConfig(
+        managers=options.managers,
+        flows=options.flows,
+        pages=options.pages,
+        api_latency=options.api_latency,
+        api_jitter=options.api_jitter,
+        flood_rate=options.flood_rate,
+        retry_after=options.retry_after,
+        site_latency=options.site_latency,
+        step_timeout=options.step_timeout,
+    )
+    report = run_load_test(config)
+    print(json.dumps(report.summary(), indent=2, ensure_ascii=False) if options.json else report.format())
+    return 1 if report.flows_failed else 0
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)  # логи бота на INFO заглушают отчет
+    sys.exit(main())
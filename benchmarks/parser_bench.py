@@ -0,0 +1,192 @@
+"""
+Офлайн-бенчмарк LombardParser.parse на корпусе страниц (benchmarks/corpus.py).
+
+Сеть не используется: страницы отдает StubTransport вместо requests.Session.
+Отчет: задержка разбора страницы (p50/p95), пиковая память и число аллокаций
+(tracemalloc), страниц в секунду в одном потоке и в пуле потоков.
+
+    python -m benchmarks.parser_bench                    # отчет
+    python -m benchmarks.parser_bench --check            # сравнить с baseline.json, код 1 при регрессии
+    python -m benchmarks.parser_bench --update-baseline  # записать текущие цифры как baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import CorpusPage, load_corpus
+from src.parser import LombardParser
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Время шумит от запуска к запуску, память почти детерминирована - допуски разные
+TIME_METRICS = ("p50_ms", "p95_ms")
+MEMORY_METRICS = ("peak_kb", "allocations")
+THROUGHPUT_METRICS = ("pages_per_sec", "pages_per_sec_workers")
+
+
+@dataclass
+class StubResponse:
+    content: bytes
+    encoding: str = "utf-8"
+    status_code: int = 200
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding)
+
+    def raise_for_status(self):
+        pass
+
+
+class StubTransport:
+    """Замена requests.Session: отдает страницы корпуса по URL"""
+
+    def __init__(self, pages: List[CorpusPage]):
+        self._pages = {page.url: page for page in pages}
+
+    def get(self, url: str, headers=None, timeout=None) -> StubResponse:
+        page = self._pages[url]
+        return StubResponse(content=page.content, encoding=page.encoding)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_latency(parser: LombardParser, pages: List[CorpusPage], rounds: int) -> List[float]:
+    """Время разбора каждой страницы - медиана по rounds прогонам (гасит случайные паузы ОС)"""
+    timings = {page.url: [] for page in pages}
+    for _ in range(rounds):
+        for page in pages:
+            started = time.perf_counter()
+            parser.parse(page.url)
+            timings[page.url].append(time.perf_counter() - started)
+    return [statistics.median(values) for values in timings.values()]
+
+
+def measure_memory(parser: LombardParser, pages: List[CorpusPage]) -> Dict[str, float]:
+    """Пик памяти за один проход по корпусу и число блоков, выделенных за проход и не освобожденных"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        for page in pages:
+            parser.parse(page.url)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {"peak_kb": peak / 1024, "allocations": allocations}
+
+
+def measure_throughput(parser: LombardParser, pages: List[CorpusPage], rounds: int, workers: int) -> float:
+    urls = [page.url for page in pages] * rounds
+    started = time.perf_counter()
+    if workers <= 1:
+        for url in urls:
+            parser.parse(url)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(parser.parse, urls))
+    return len(urls) / (time.perf_counter() - started)
+
+
+def run(engine: Optional[str] = None, rounds: int = 5, workers: int = 4,
+        pages: Optional[List[CorpusPage]] = None) -> Dict[str, float]:
+    pages = pages if pages is not None else load_corpus()
+    # Без кэша: каждый вызов - полный разбор страницы
+    parser = LombardParser(http=StubTransport(pages), cache=None, engine=engine)
+    measure_latency(parser, pages, 1)  # прогрев
+
+    timings = measure_latency(parser, pages, rounds)
+    report = {
+        "engine": parser.engine,
+        "pages": len(pages),
+        "avg_page_kb": statistics.mean(len(page.content) for page in pages) / 1024,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        **measure_memory(parser, pages),
+        "pages_per_sec": measure_throughput(parser, pages, rounds, 1),
+        "pages_per_sec_workers": measure_throughput(parser, pages, rounds, workers),
+        "workers": workers,
+    }
+    return report
+
+
+def check_regressions(report: Dict[str, float], baseline: Dict[str, float],
+                      tolerance: float, memory_tolerance: float) -> List[str]:
+    """Метрики, ухудшившиеся относительно baseline больше допуска (доля)"""
+    problems = []
+    for keys, allowed in ((TIME_METRICS, tolerance), (MEMORY_METRICS, memory_tolerance)):
+        for key in keys:
+            if key in baseline and report[key] > baseline[key] * (1 + allowed):
+                problems.append(f"{key}: {report[key]:.2f} > {baseline[key]:.2f} (+{allowed:.0%})")
+    for key in THROUGHPUT_METRICS:
+        if key in baseline and report[key] < baseline[key] * (1 - tolerance):
+            problems.append(f"{key}: {report[key]:.2f} < {baseline[key]:.2f} (-{tolerance:.0%})")
+    return problems
+
+
+def format_report(report: Dict[str, float]) -> str:
+    return (
+        f"engine={report['engine']} pages={report['pages']} (~{report['avg_page_kb']:.0f} KB)\n"
+        f"  latency p50={report['p50_ms']:.2f} ms p95={report['p95_ms']:.2f} ms\n"
+        f"  memory peak={report['peak_kb']:.0f} KB allocations={report['allocations']:.0f}\n"
+        f"  throughput {report['pages_per_sec']:.1f} pages/s (1 thread), "
+        f"{report['pages_per_sec_workers']:.1f} pages/s ({report['workers']} workers)"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    args.add_argument("--engine", choices=["lxml", "bs4"], action="append",
+                      help="движок парсера (можно несколько раз); по умолчанию оба")
+    args.add_argument("--rounds", type=int, default=5)
+    args.add_argument("--workers", type=int, default=4)
+    args.add_argument("--tolerance", type=float, default=0.5, help="допустимое ухудшение времени, доля")
+    args.add_argument("--memory-tolerance", type=float, default=0.10, help="допустимый рост памяти, доля")
+    args.add_argument("--baseline", default=BASELINE_PATH)
+    args.add_argument("--check", action="store_true", help="сравнить с baseline")
+    args.add_argument("--update-baseline", action="store_true", help="записать baseline")
+    options = args.parse_args(argv)
+
+    pages = load_corpus()
+    reports = {}
+    for engine in options.engine or ["lxml", "bs4"]:
+        reports[engine] = run(engine, options.rounds, options.workers, pages)
+        print(format_report(reports[engine]))
+
+    if options.update_baseline:
+        with open(options.baseline, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, sort_keys=True)
+        print(f"Baseline записан: {options.baseline}")
+
+    if options.check:
+        with open(options.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = [
+            f"[{engine}] {problem}"
+            for engine, report in reports.items()
+            if engine in baseline
+            for problem in check_regressions(report, baseline[engine], options.tolerance, options.memory_tolerance)
+        ]
+        if problems:
+            print("Регрессия относительно baseline:\n  " + "\n  ".join(problems))
+            return 1
+        print("Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
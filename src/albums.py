@@ -0,0 +1,105 @@
+"""
+Сборка поста для публикации: фото и видео вперемешку в порядке сессии, в наименьшее число
+альбомов по 10, подпись - один раз на первом элементе. Один альбом - один запрос к Bot API.
+Общая часть для обоих режимов: вызовы Bot API по плану делает publishing.send_post.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from telebot.types import InputFile, InputMedia, InputMediaPhoto, InputMediaVideo
+
+from .media_cache import media_cache
+from .session import MediaData, UserSession
+
+ALBUM_LIMIT = 10  # Элементов в одном sendMediaGroup
+CAPTION_LIMIT = 1024  # Длиннее подпись к медиа быть не может - текст уходит отдельным сообщением
+FILE_ID_BYTES = 90  # Примерный размер file_id в запросе вместо файла, который уже есть у Telegram
+
+
+def is_postable(media: MediaData, verdicts: Dict[str, bool]) -> bool:
+    """Локальный файл на месте, ссылка на фото прошла проверку"""
+    if media.is_local_file:
+        return os.path.exists(media.file_path)
+    return media.media_type == "photo" and verdicts.get(media.url, True)
+
+
+def media_payload(media: MediaData) -> int:
+    """Сколько байт уйдет в Telegram, чтобы показать это медиа"""
+    if not media.is_local_file:
+        return len(media.url)
+    if media_cache.contains(media.file_path, media.media_type):
+        return FILE_ID_BYTES
+    try:
+        return os.path.getsize(media.file_path)
+    except OSError:
+        return 0
+
+
+def album_sizes(count: int) -> List[int]:
+    """
+    Размеры альбомов: меньше всего запросов и ни одного альбома из одного элемента
+    (sendMediaGroup принимает от 2 до 10), например 11 -> [6, 5], 20 -> [10, 10].
+    """
+    if count <= 0:
+        return []
+    groups = -(-count // ALBUM_LIMIT)
+    base, extra = divmod(count, groups)
+    return [base + 1] * extra + [base] * (groups - extra)
+
+
+@dataclass
+class Album:
+    media: List[MediaData] = field(default_factory=list)
+    inputs: List[InputMedia] = field(default_factory=list)
+    uploads: List[Optional[MediaData]] = field(default_factory=list)  # None - не загружается с диска
+
+
+@dataclass
+class PostPlan:
+    text: Optional[str] = None  # Отдельным сообщением: медиа нет или текст не влезает в подпись
+    albums: List[Album] = field(default_factory=list)
+    skipped: int = 0
+
+    @property
+    def calls(self) -> int:
+        return len(self.albums) + (1 if self.text else 0)
+
+    @property
+    def items(self) -> int:
+        return sum(len(album.media) for album in self.albums)
+
+
+def build_post(session: UserSession, verdicts: Dict[str, bool],
+               media_input: Callable[[MediaData], Union[str, InputFile]], parse_mode: str = "HTML") -> PostPlan:
+    """План публикации сессии: альбомы в порядке session.get_all_media() и куда идет текст"""
+    all_media = session.get_all_media()
+    media = [item for item in all_media if is_postable(item, verdicts)]
+    plan = PostPlan(skipped=len(all_media) - len(media))
+    caption = session.text or None
+    if caption and (not media or len(caption) > CAPTION_LIMIT):
+        plan.text, caption = caption, None
+
+    position = 0
+    for size in album_sizes(len(media)):
+        album = Album()
+        for item in media[position:position + size]:
+            source = media_input(item) if item.is_local_file else item.url
+            input_class = InputMediaVideo if item.media_type == "video" else InputMediaPhoto
+            first = position == 0 and not album.media
+            album.inputs.append(input_class(source, caption=caption if first else None,
+                                            parse_mode=parse_mode if first and caption else None))
+            album.media.append(item)
+            album.uploads.append(item if isinstance(source, InputFile) else None)
+        plan.albums.append(album)
+        position += size
+    return plan
+
+
+def post_cost(session: UserSession, verdicts: Dict[str, bool]) -> Tuple[int, int]:
+    """(запросов, байт) полной отправки поста в один канал при текущем кэше file_id"""
+    media = [item for item in session.get_all_media() if is_postable(item, verdicts)]
+    text = session.text or ""
+    separate_text = bool(text) and (not media or len(text) > CAPTION_LIMIT)
+    calls = len(album_sizes(len(media))) + (1 if separate_text else 0)
+    return calls, len(text.encode("utf-8")) + sum(media_payload(item) for item in media)
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+
+from .config import settings
+from .http_pool import DEFAULT_HEADERS
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_async_http_session() -> aiohttp.ClientSession:
+    """
+    Общая aiohttp-сессия режима asyncio (settings.runtime = "async") - аналог http_pool.get_http_session.
+    Создается в работающем цикле событий и пересоздается, если цикл сменился (тесты, перезапуск).
+    """
+    global _session
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session._loop is not loop:
+        connector = aiohttp.TCPConnector(limit=settings.http_pool_size * 2, limit_per_host=settings.http_pool_size)
+        _session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+        logger.info(f"Async HTTP pool created (per host={settings.http_pool_size})")
+    return _session
+
+
+async def close_async_http_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,185 @@
+"""
+Режим asyncio (settings.runtime = "async"): те же обработчики (src/handlers.py) на AsyncTeleBot.
+
+Сетевые ожидания - загрузка страницы, HEAD-проверки картинок, загрузка медиа в Telegram, get_chat -
+идут через aiohttp в одном цикле событий, а не держат поток пула на каждый запрос.
+Сессии, кэши, лимиты Bot API, метрики, трассировка и /profile общие с синхронным режимом.
+
+Запуск: RUNTIME=async python -m src.main (или python -m src.async_main)
+"""
+import asyncio
+import concurrent.futures
+import logging
+import signal
+import sys
+from typing import Optional, Set
+
+from src.config import settings
+from src.scheduler import scheduler
+from src.profiling import MODES as PROFILE_MODES
+from src import metrics
+from src.ratelimit import install_async_outbound_governor
+from src.chat_executor import ChatOrderedAsyncTeleBot
+from src.async_http import close_async_http_session
+from src.channels import channel_registry
+from src.dispatcher import copy_fan_out_async, fan_out_async, deliver_async
+from src.async_utils import start_preview_pipeline, update_preview
+from src import handlers
+from src.handlers import user_sessions, start_background_jobs
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+logger = logging.getLogger(__name__)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_tasks: Set[asyncio.Task] = set()
+# Отложенные действия, отданные в цикл планировщиком и еще не завершенные
+_scheduled: Set[concurrent.futures.Future] = set()
+
+
+# ==================== ЦИКЛ СОБЫТИЙ ==========================
+def submit(coro):
+    """Запустить корутину в цикле бота из любого потока (планировщик, профилировщик)"""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None and running is _loop:
+        task = running.create_task(coro)
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        return task
+    if _loop is None or _loop.is_closed():
+        coro.close()
+        return None
+    return asyncio.run_coroutine_threadsafe(coro, _loop)
+
+def _report_scheduled(future):
+    _scheduled.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Scheduled action failed: {future.exception()!r}")
+
+def _run_scheduled(coroutine_function, *args):
+    """Поток планировщика только отдает корутину в цикл: медленное действие не задерживает остальные"""
+    future = submit(coroutine_function(*args))
+    if future is not None:
+        _scheduled.add(future)
+        future.add_done_callback(_report_scheduled)
+
+def schedule(delay: float, coroutine_function, *args):
+    """Отложенная корутина через общий планировщик: при остановке она выполнится до выхода"""
+    return scheduler.schedule(delay, _run_scheduled, coroutine_function, *args)
+
+class AsyncRuntime:
+    """Операции обработчиков на AsyncTeleBot: сеть - через aiohttp, работа CPU и диска - в to_thread"""
+
+    name = "asyncio"
+    # cProfile на время одной корутины не снять - обработчики перемешаны в одном цикле событий
+    profile_modes = tuple(mode for mode in PROFILE_MODES if mode != "cpu")
+
+    def __init__(self, bot: ChatOrderedAsyncTeleBot):
+        self.raw_bot = self.bot = bot
+
+    def adapt(self, handler):
+        return handler
+
+    async def parse(self, parser, url):
+        return await parser.parse_async(url)
+
+    async def parse_many(self, parser, urls, on_done):
+        await parser.parse_many(urls, on_done=on_done)
+
+    async def offload(self, function, *args):
+        return await asyncio.to_thread(function, *args)
+
+    async def update_preview(self, session):
+        return await update_preview(self.bot, session)
+
+    async def start_preview_pipeline(self, session, on_ready=None, started_at=None):
+        return await start_preview_pipeline(self.bot, session, on_ready=on_ready, started_at=started_at)
+
+    async def fan_out(self, destinations, session):
+        return await fan_out_async(self.bot, destinations, session)
+
+    async def copy_fan_out(self, destinations, session, savings):
+        return await copy_fan_out_async(self.bot, destinations, session, savings=savings)
+
+    async def deliver(self, name, destination_id, session):
+        return await deliver_async(self.bot, name, destination_id, session)
+
+    async def refresh_channels(self):
+        await channel_registry.refresh_async(self.bot)
+
+    def refresh_channels_in_background(self):
+        # Одним gather в цикле бота; планировщик не ждет сеть
+        submit(channel_registry.refresh_async(self.bot))
+
+    def schedule(self, delay, coroutine_function, *args):
+        return schedule(delay, coroutine_function, *args)
+
+    def call_soon(self, coroutine_function, *args):
+        submit(coroutine_function(*args))
+
+    def update_stats(self):
+        return self.bot.stats()
+
+
+# ==================== API ===================================
+_runtime: Optional[AsyncRuntime] = None
+
+
+def create_runtime() -> AsyncRuntime:
+    """Собрать режим asyncio и зарегистрировать в нем обработчики (один раз на процесс)"""
+    global _runtime
+    if _runtime is None:
+        bot = ChatOrderedAsyncTeleBot(settings.bot_token, chat_queue_limit=settings.chat_queue_limit)
+        install_async_outbound_governor()
+        bot.on_reject = handlers.reject_update
+        _runtime = AsyncRuntime(bot)
+        handlers.install(_runtime)
+    return _runtime
+
+
+# ==================== ЗАПУСК =================================
+
+async def shutdown(bot: ChatOrderedAsyncTeleBot):
+    """Доработать начатые обновления, выполнить отложенные действия и сохранить сессии перед выходом"""
+    if not await bot.join(timeout=30):
+        logger.warning(f"{bot.stats()['pending']} updates still pending at shutdown")
+    # Планировщик выполняет отложенные удаления через submit - цикл должен еще работать
+    await asyncio.to_thread(scheduler.shutdown, drain=True)
+    if _scheduled:
+        await asyncio.wait([asyncio.wrap_future(future) for future in list(_scheduled)], timeout=30)
+    user_sessions.close()
+    await close_async_http_session()
+    await bot.close_session()
+
+async def main():
+    global _loop
+    _loop = asyncio.get_running_loop()
+    bot = create_runtime().bot
+    logger.info("Бот запущен (asyncio)!")
+    logger.info(f"Доступные каналы: {[name for name, _ in settings.all_channels]}")
+
+    polling = asyncio.create_task(bot.polling(skip_pending=True, non_stop=True, timeout=60))
+    # SIGTERM от k8s/systemd: останавливаем polling и удаляем отложенные сообщения до выхода
+    _loop.add_signal_handler(signal.SIGTERM, polling.cancel)
+    start_background_jobs()
+    metrics.start_metrics_server(settings.metrics_port)
+    try:
+        await polling
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await shutdown(bot)
+
+def run():
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,93 @@
+"""
+Asyncio adapters of the preview and sending helpers in src/utils.py (settings.runtime = "async").
+The logic itself is shared (src/publishing.py); here it is awaited on AsyncTeleBot, so network waits
+(HEAD checks, uploads, Bot API calls) run on the event loop instead of holding a thread.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import Message
+
+from . import publishing
+from .image_check import image_validator
+from .instrumentation import emit, FIRST_PREVIEW, PREVIEW_READY
+from .publishing import Transport, is_current_post
+from .session import UserSession
+
+logger = logging.getLogger(__name__)
+
+_background_tasks: Set["asyncio.Task"] = set()
+
+
+def _transport(bot: AsyncTeleBot) -> Transport:
+    return Transport(bot, validate_session_media, image_validator.validate_many_async)
+
+
+async def validate_session_media(session: UserSession) -> dict:
+    """Checks all web photo URLs of the session concurrently; later checks hit the cache."""
+    return await publishing.validate_session_media(image_validator.validate_many_async, session)
+
+
+async def send_photos_to_destination(bot: AsyncTeleBot, destination_id: str, session: UserSession,
+                                     timeout: Optional[int] = None, sent: Optional[List[int]] = None) -> bool:
+    """Async version of utils.send_photos_to_destination."""
+    return await publishing.send_post(_transport(bot), destination_id, session, timeout, sent)
+
+
+async def send_preview_text(bot: AsyncTeleBot, session: UserSession) -> Message:
+    return await publishing.send_preview_text(bot, session)
+
+
+async def send_preview_media(bot: AsyncTeleBot, session: UserSession, generation: Optional[str] = None):
+    return await publishing.send_preview_media(_transport(bot), session, generation)
+
+
+async def send_preview(bot: AsyncTeleBot, session: UserSession):
+    return await publishing.send_preview(_transport(bot), session)
+
+
+async def update_preview(bot: AsyncTeleBot, session: UserSession) -> bool:
+    """Async version of utils.update_preview: edits the sent preview in place, re-sends it only as a fallback."""
+    return await publishing.update_preview(_transport(bot), session)
+
+
+async def start_preview_pipeline(bot: AsyncTeleBot, session: UserSession,
+                                 on_ready: Optional[Callable[[], Awaitable]] = None,
+                                 started_at: Optional[float] = None) -> "asyncio.Task":
+    """
+    Async version of utils.start_preview_pipeline: URL validation starts right away, the text goes out
+    before returning, media follow in a background task and `on_ready` is awaited after them.
+    The task does not hold the chat lock, so it stops if the post is cleared or replaced meanwhile.
+    """
+    chat_id = session.chat_id
+    started_at = started_at if started_at is not None else time.monotonic()
+    generation = session.trace_id
+    validation = asyncio.create_task(validate_session_media(session))
+
+    async def media_stage():
+        try:
+            await validation
+            if not is_current_post(session, generation):
+                return
+            await send_preview_media(bot, session, generation)
+            emit(PREVIEW_READY, chat_id=chat_id, seconds=time.monotonic() - started_at)
+        except Exception as e:
+            logger.error(f"Error sending preview media: {e}")
+        finally:
+            if on_ready and is_current_post(session, generation):
+                await on_ready()
+
+    try:
+        await send_preview_text(bot, session)
+        emit(FIRST_PREVIEW, chat_id=chat_id, seconds=time.monotonic() - started_at)
+    except Exception as e:
+        logger.error(f"Error sending preview: {e}")
+        await bot.send_message(chat_id, f"Error creating preview: {e}")
+    task = asyncio.create_task(media_stage())
+    # The loop keeps only weak references to tasks
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
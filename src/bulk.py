@@ -0,0 +1,191 @@
+"""
+Массовая загрузка ссылок: все ссылки на lombard-perspectiva.ru из сообщения или текстового файла
+разбираются параллельно (не больше settings.parser_concurrency страниц сразу), готовые посты
+складываются в очередь черновиков сессии (UserSession.drafts) в порядке ссылок, не больше
+settings.bulk_max_drafts. Черновик можно открыть и
+опубликовать как обычный пост или опубликовать всю очередь во все каналы сразу.
+Общая часть обработчиков (src/handlers.py) для обоих режимов; прогресс - одно сообщение, которое правится.
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .config import settings
+from .metrics import BULK_LINKS
+from .session import UserSession
+from .tracing import propagate
+
+logger = logging.getLogger(__name__)
+
+LINK_RE = re.compile(r"https://lombard-perspectiva\.ru/clock/[^\s<>\"']+")
+TRAILING_PUNCTUATION = ".,;:!?)]}»"
+TEXT_FILE_EXTENSIONS = (".txt", ".csv", ".md", ".html", ".htm")
+MAX_REPORTED_ERRORS = 10
+
+
+def extract_links(text: Optional[str]) -> List[str]:
+    """Ссылки на часы из текста в порядке появления, без повторов"""
+    links = []
+    for match in LINK_RE.findall(text or ""):
+        link = match.rstrip(TRAILING_PUNCTUATION)
+        if link not in links:
+            links.append(link)
+    return links
+
+
+def is_links_file(file_name: Optional[str], mime_type: Optional[str]) -> bool:
+    """Текстовый файл со ссылками (выгрузка из таблицы, заметки)"""
+    return (mime_type or "").startswith("text/") or (file_name or "").lower().endswith(TEXT_FILE_EXTENSIONS)
+
+
+def make_draft(url: str, text: str, photos: List[str], custom_photos: List[str],
+               custom_videos: List[str]) -> Dict[str, Any]:
+    """Черновик в UserSession.drafts: только строки, чтобы сессия сохранялась в JSON"""
+    return {"url": url, "text": text, "web_photos": list(photos),
+            "custom_photos": list(custom_photos), "custom_videos": list(custom_videos)}
+
+
+def draft_title(draft: Dict[str, Any], limit: int = 50) -> str:
+    """Первая строка текста без HTML-тегов - для списка очереди"""
+    first_line = re.sub(r"<[^>]+>", "", draft.get("text", "")).strip().split("\n", 1)[0]
+    title = first_line or draft.get("url", "")
+    return title if len(title) <= limit else title[:limit - 1] + "…"
+
+
+def load_draft(session: UserSession, draft: Dict[str, Any]) -> UserSession:
+    """Открыть черновик в сессии как новый пост (очередь черновиков остается)"""
+    session.clear()
+    session.url = draft["url"]
+    session.text = draft["text"]
+    session.add_web_photos(draft["web_photos"])
+    session.add_custom_photos(draft["custom_photos"])
+    session.add_custom_videos(draft["custom_videos"])
+    return session
+
+
+def draft_session(chat_id: int, draft: Dict[str, Any]) -> UserSession:
+    """Отдельная сессия под публикацию черновика - текущий пост пользователя не трогается"""
+    return load_draft(UserSession(chat_id=chat_id), draft)
+
+
+def drafts_text(session: UserSession) -> str:
+    if not session.drafts:
+        return "Очередь черновиков пуста. Пришлите несколько ссылок или .txt файл со ссылками."
+    lines = [f"{i + 1}. {draft_title(draft)}" for i, draft in enumerate(session.drafts)]
+    return f"Черновиков в очереди: {len(session.drafts)}\n\n" + "\n".join(lines)
+
+
+class BulkProgress:
+    """Счетчики массовой загрузки и текст сообщения о прогрессе"""
+
+    def __init__(self, total: int, skipped: Optional[List[str]] = None, interval: Optional[float] = None):
+        self.total = total
+        self.skipped = list(skipped or [])  # Ссылки сверх bulk_max_links или не влезшие в очередь
+        self.interval = settings.bulk_progress_interval if interval is None else interval
+        self.done = 0
+        self.drafts = 0
+        self.failed: List[Tuple[str, str]] = []
+        self.started = time.monotonic()
+        self._last_edit = self.started  # Первое сообщение о прогрессе отправляется при старте
+
+    def record(self, url: str, error: Optional[str] = None):
+        self.done += 1
+        if error is None:
+            self.drafts += 1
+            BULK_LINKS.inc(result="ok")
+        else:
+            self.failed.append((url, error))
+            BULK_LINKS.inc(result="error")
+
+    def due(self) -> bool:
+        """Пора править сообщение: не чаще interval и не на последней странице (там итоговый отчет)"""
+        now = time.monotonic()
+        if self.done >= self.total or now - self._last_edit < self.interval:
+            return False
+        self._last_edit = now
+        return True
+
+    def text(self, action: str = "Разбор ссылок") -> str:
+        filled = round(10 * self.done / self.total) if self.total else 10
+        return (f"{action}: {self.done}/{self.total} [{'#' * filled}{'.' * (10 - filled)}]\n"
+                f"Готово: {self.drafts}, ошибок: {len(self.failed)}")
+
+    def failures(self, header: str) -> List[str]:
+        return _bounded(header, [f"- {url}: {error}" for url, error in self.failed])
+
+    def report(self, queued: int) -> str:
+        lines = [f"Разобрано {self.drafts} из {self.total} ссылок за {time.monotonic() - self.started:.0f} сек."]
+        lines += self.failures("Не удалось разобрать:")
+        lines += _bounded(f"Не добавлены (не больше {settings.bulk_max_links} ссылок за раз "
+                          f"и {settings.bulk_max_drafts} черновиков в очереди):",
+                          [f"- {url}" for url in self.skipped])
+        lines.append(f"Черновиков в очереди: {queued}")
+        return "\n".join(lines)
+
+
+def _bounded(header: str, lines: List[str]) -> List[str]:
+    """Первые MAX_REPORTED_ERRORS строк - отчет должен влезть в одно сообщение"""
+    if not lines:
+        return []
+    bounded = [header] + lines[:MAX_REPORTED_ERRORS]
+    if len(lines) > MAX_REPORTED_ERRORS:
+        bounded.append(f"...и еще {len(lines) - MAX_REPORTED_ERRORS}")
+    return bounded
+
+
+def limit_links(links: List[str], queued: int = 0) -> Tuple[List[str], List[str]]:
+    """
+    Не больше settings.bulk_max_links ссылок за раз и не больше, чем осталось места в очереди
+    (queued черновиков уже есть); второе значение - отброшенные ссылки для отчета.
+    """
+    limit = max(min(settings.bulk_max_links, settings.bulk_max_drafts - queued), 0)
+    return links[:limit], links[limit:]
+
+
+def result_draft(session: UserSession, parser, url: str, result: Union[Tuple[str, List[str]], Exception],
+                 progress: BulkProgress) -> Optional[Dict[str, Any]]:
+    """Результат разбора одной ссылки: черновик или None (ошибка уходит в отчет)"""
+    if isinstance(result, Exception):
+        logger.warning(f"Bulk parse failed for {url}: {result}")
+        progress.record(url, str(result) or type(result).__name__)
+        return None
+    text, photos = result
+    if not session.validate_text_length(text):
+        progress.record(url, f"текст длиннее {settings.max_text_length} символов")
+        return None
+    progress.record(url)
+    return make_draft(url, text, photos, parser.get_custom_photos(), parser.get_custom_videos())
+
+
+def queue_drafts(session: UserSession, drafts: List[Optional[Dict[str, Any]]], progress: BulkProgress):
+    """
+    Черновики в очередь сессии в порядке ссылок (страницы готовы в произвольном порядке).
+    Сверх settings.bulk_max_drafts не добавляются - попадают в отчет как пропущенные.
+    """
+    for draft in drafts:
+        if draft is None:
+            continue
+        if len(session.drafts) >= settings.bulk_max_drafts:
+            progress.skipped.append(draft["url"])
+            continue
+        session.drafts.append(draft)
+
+
+def parse_links(parser, urls: List[str], on_done: Callable[[int, Any], None],
+                workers: Optional[int] = None) -> None:
+    """
+    Синхронный аналог LombardParser.parse_many для TeleBot: страницы грузятся в пуле,
+    on_done(index, result или исключение) вызывается в потоке обработчика по мере готовности;
+    index - позиция в urls, по ней результаты раскладываются в исходном порядке.
+    """
+    with ThreadPoolExecutor(max_workers=workers or settings.parser_concurrency,
+                            thread_name_prefix="bulk-parse") as pool:
+        futures = {pool.submit(propagate(parser.parse), url): index for index, url in enumerate(urls)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            on_done(futures[future], result)
@@ -0,0 +1,222 @@
+"""
+Реестр каналов: название, username, тип и право бота публиковать для всех settings.all_channels.
+Заполняется при старте (все каналы параллельно) и обновляется в фоне раз в settings.channel_cache_ttl / 2,
+поэтому /settings, /where, /debug_channels и меню отправки отвечают из памяти, без get_chat.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChannelInfo:
+    name: str  # Имя из настроек
+    channel_id: str  # Как указан в настройках: @username или числовой id
+    id: Optional[int] = None
+    title: Optional[str] = None
+    username: Optional[str] = None
+    type: Optional[str] = None
+    can_post: Optional[bool] = None  # None - права бота узнать не удалось
+    error: Optional[str] = None
+    resolved_at: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.id is not None
+
+    @property
+    def display_title(self) -> str:
+        return self.title or self.name
+
+
+def can_post(chat_type: Optional[str], member: Any) -> Optional[bool]:
+    """Может ли бот с таким ChatMember публиковать в чат этого типа"""
+    if member is None:
+        return None
+    status = getattr(member, "status", None)
+    if status == "creator":
+        return True
+    if chat_type == "channel":
+        return status == "administrator" and getattr(member, "can_post_messages", None) is not False
+    if status in ("administrator", "member"):
+        return True
+    return status == "restricted" and bool(getattr(member, "can_send_messages", False))
+
+
+class ChannelRegistry:
+    """Кэш ChannelInfo по channel_id из настроек; устаревшие записи отдаются, пока идет обновление"""
+
+    def __init__(self, ttl: float = 900, channels: Optional[List[Tuple[str, str]]] = None):
+        self.ttl = ttl
+        self._channels = channels
+        self._entries: Dict[str, ChannelInfo] = {}
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.bot_username: Optional[str] = None
+        self.refreshes = 0
+        self.refreshed_at = 0.0
+
+    @property
+    def channels(self) -> List[Tuple[str, str]]:
+        return self._channels if self._channels is not None else settings.all_channels
+
+    def get(self, channel_id: Any) -> Optional[ChannelInfo]:
+        """Запись по channel_id из настроек или по числовому id канала"""
+        key = str(channel_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = next((item for item in self._entries.values() if str(item.id) == key), None)
+            return entry
+
+    def all(self) -> List[ChannelInfo]:
+        """Все каналы в порядке настроек; еще не опрошенные - без названия и с error=None"""
+        with self._lock:
+            return [self._entries.get(str(channel_id)) or ChannelInfo(name, str(channel_id))
+                    for name, channel_id in self.channels]
+
+    def age(self) -> Optional[float]:
+        """Сколько секунд назад закончилось последнее обновление"""
+        return time.time() - self.refreshed_at if self.refreshed_at else None
+
+    @property
+    def stale(self) -> bool:
+        age = self.age()
+        return age is None or age > self.ttl
+
+    def _store(self, entries: List[ChannelInfo], bot_username: Optional[str]):
+        with self._lock:
+            for entry in entries:
+                previous = self._entries.get(entry.channel_id)
+                # Разовая ошибка сети не должна стирать то, что уже известно о канале
+                if not entry.ok and previous is not None and previous.ok:
+                    logger.warning(f"Keeping cached info for {entry.channel_id}: {entry.error}")
+                    continue
+                self._entries[entry.channel_id] = entry
+            if bot_username:
+                self.bot_username = bot_username
+            self.refreshes += 1
+            self.refreshed_at = time.time()
+        failed = [entry.name for entry in entries if not entry.ok]
+        logger.info(f"Channel registry refreshed: {len(entries)} channel(s), failed: {failed or 'none'}")
+
+    @staticmethod
+    def _resolved(name: str, channel_id: str, chat: Any, member: Any) -> ChannelInfo:
+        return ChannelInfo(
+            name=name, channel_id=channel_id, id=chat.id, title=chat.title, username=chat.username,
+            type=chat.type, can_post=can_post(chat.type, member), resolved_at=time.time(),
+        )
+
+    def _resolve(self, bot, me, name: str, channel_id: str) -> ChannelInfo:
+        try:
+            chat = bot.get_chat(channel_id)
+        except Exception as e:
+            return ChannelInfo(name, channel_id, error=str(e), resolved_at=time.time())
+        try:
+            member = bot.get_chat_member(chat.id, me.id) if me is not None else None
+        except Exception as e:
+            logger.warning(f"Could not check bot rights in {channel_id}: {e}")
+            member = None
+        return self._resolved(name, channel_id, chat, member)
+
+    def refresh(self, bot) -> List[ChannelInfo]:
+        """Опросить все каналы параллельно (TeleBot)"""
+        channels = [(name, str(channel_id)) for name, channel_id in self.channels]
+        try:
+            me = bot.get_me()
+        except Exception as e:
+            logger.warning(f"get_me failed during channel refresh: {e}")
+            me = None
+        with ThreadPoolExecutor(max_workers=max(len(channels), 1), thread_name_prefix="channels") as pool:
+            entries = list(pool.map(lambda item: self._resolve(bot, me, *item), channels))
+        self._store(entries, getattr(me, "username", None))
+        return entries
+
+    def refresh_in_background(self, bot) -> bool:
+        """refresh в отдельном потоке, чтобы не держать планировщик; False - обновление уже идет"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh(bot)
+            except Exception as e:
+                logger.error(f"Channel refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="channel-refresh", daemon=True).start()
+        return True
+
+    async def _resolve_async(self, bot, me, name: str, channel_id: str) -> ChannelInfo:
+        try:
+            chat = await bot.get_chat(channel_id)
+        except Exception as e:
+            return ChannelInfo(name, channel_id, error=str(e), resolved_at=time.time())
+        try:
+            member = await bot.get_chat_member(chat.id, me.id) if me is not None else None
+        except Exception as e:
+            logger.warning(f"Could not check bot rights in {channel_id}: {e}")
+            member = None
+        return self._resolved(name, channel_id, chat, member)
+
+    async def refresh_async(self, bot) -> List[ChannelInfo]:
+        """То же для AsyncTeleBot: все каналы одним gather"""
+        with self._lock:
+            if self._refreshing:
+                return []
+            self._refreshing = True
+        try:
+            channels = [(name, str(channel_id)) for name, channel_id in self.channels]
+            try:
+                me = await bot.get_me()
+            except Exception as e:
+                logger.warning(f"get_me failed during channel refresh: {e}")
+                me = None
+            entries = list(await asyncio.gather(*(self._resolve_async(bot, me, *item) for item in channels)))
+            self._store(entries, getattr(me, "username", None))
+            return entries
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def stats(self) -> Dict[str, float]:
+        entries = self.all()
+        age = self.age()
+        return {
+            "channels": len(entries),
+            "resolved": sum(1 for entry in entries if entry.ok),
+            "cannot_post": sum(1 for entry in entries if entry.can_post is False),
+            "age": age if age is not None else -1,
+            "refreshes": self.refreshes,
+        }
+
+
+def describe_channel(entry: ChannelInfo) -> str:
+    """Блок о канале для /where и /debug_channels"""
+    if entry.error:
+        return f"Канал: {entry.name}\nID: {entry.channel_id}\nОшибка: {entry.error}\n"
+    if not entry.ok:
+        return f"Канал: {entry.name}\nID: {entry.channel_id}\nДанные еще загружаются\n"
+    rights = {True: "да", False: "НЕТ", None: "неизвестно"}[entry.can_post]
+    return (
+        f"Канал: {entry.title}\n"
+        f"ID: {entry.id}\n"
+        f"Username: @{entry.username if entry.username else 'нет'}\n"
+        f"Тип: {entry.type}\n"
+        f"Бот может публиковать: {rights}\n"
+    )
+
+
+channel_registry = ChannelRegistry(ttl=settings.channel_cache_ttl)
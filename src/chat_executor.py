@@ -0,0 +1,267 @@
+"""
+Обработка обновлений Telegram: разные чаты - параллельно, обновления одного чата - строго по порядку.
+
+Обработчики меняют UserSession (списки фото, confirm_data) без блокировок: два быстрых нажатия
+"Up F2" / "Remove F3" в пуле TeleBot могли выполняться одновременно. Здесь у каждого чата своя очередь,
+и в пул попадает не больше одной задачи чата за раз, поэтому число потоков можно увеличивать.
+
+Ограничения:
+    chat_queue_limit    - необработанных обновлений одного чата; лишние отклоняются (on_reject);
+    max_pending_updates - всего в очереди; дальше submit ждет, и polling/webhook перестает забирать
+                          обновления, пока обработчики не догонят.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+
+from telebot import TeleBot
+from telebot.async_telebot import AsyncTeleBot
+
+from .metrics import UPDATE_WAIT_SECONDS, UPDATES_REJECTED
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[Callable, Tuple, Dict[str, Any], float]
+
+
+def update_chat_id(update: Any) -> Optional[int]:
+    """Чат обновления: Message.chat, CallbackQuery.message.chat или пользователь (inline-запросы)"""
+    chat = getattr(update, "chat", None)
+    if chat is None:
+        chat = getattr(getattr(update, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "from_user", None)
+    return user.id if user is not None else None
+
+
+class ChatExecutor:
+    def __init__(self, workers: int = 8, chat_queue_limit: int = 20, max_pending: int = 500,
+                 on_reject: Optional[Callable[[int, Tuple, bool], None]] = None,
+                 on_error: Optional[Callable[[Exception], bool]] = None,
+                 name: str = "chat-worker"):
+        self.workers = workers
+        self.chat_queue_limit = chat_queue_limit
+        self.on_reject = on_reject  # (chat_id, args задачи, первое ли отклонение с последнего опустошения очереди)
+        self.on_error = on_error  # True - исключение обработано
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Очередь есть, пока у чата есть задача в работе или в пуле; в ней - еще не начатые
+        self._queues: Dict[Hashable, Deque[Task]] = {}
+        self._overflowed: Set[Hashable] = set()
+        self._pending = 0
+        self.executed = 0
+        self.rejected = 0
+
+    def submit(self, chat_id: Optional[Hashable], fn: Callable, *args, **kwargs) -> bool:
+        """
+        Поставить задачу в очередь чата; chat_id=None - без порядка (например, listener'ы TeleBot).
+        False - очередь чата переполнена, задача отклонена.
+        """
+        if chat_id is not None:
+            with self._lock:
+                queue = self._queues.get(chat_id)
+                overflow = queue is not None and len(queue) >= self.chat_queue_limit
+                if overflow:
+                    self.rejected += 1
+                    first = chat_id not in self._overflowed
+                    self._overflowed.add(chat_id)
+            if overflow:
+                UPDATES_REJECTED.inc()
+                logger.warning(f"Update queue for chat {chat_id} is full ({self.chat_queue_limit}), update dropped")
+                if self.on_reject is not None:
+                    try:
+                        self.on_reject(chat_id, args, first)
+                    except Exception as e:
+                        logger.warning(f"Reject callback for chat {chat_id} failed: {e}")
+                return False
+
+        # Общий лимит: ждем здесь, вызывающий (polling, webhook) не берет новые обновления
+        self._slots.acquire()
+        task: Task = (fn, args, kwargs, time.monotonic())
+        with self._lock:
+            self._pending += 1
+            if chat_id is None:
+                start = True
+            else:
+                queue = self._queues.get(chat_id)
+                start = queue is None
+                if start:
+                    queue = self._queues[chat_id] = deque()
+                queue.append(task)
+        if chat_id is None:
+            self._pool.submit(self._run, task)
+        elif start:
+            self._pool.submit(self._drain, chat_id)
+        return True
+
+    def _drain(self, chat_id: Hashable):
+        """Одна задача чата; следующая снова идет через пул, чтобы занятый чат не держал поток"""
+        with self._lock:
+            task = self._queues[chat_id].popleft()
+        try:
+            self._run(task)
+        finally:
+            with self._lock:
+                queue = self._queues[chat_id]
+                if not queue:
+                    del self._queues[chat_id]
+                    self._overflowed.discard(chat_id)
+            if queue:
+                self._pool.submit(self._drain, chat_id)
+
+    def _run(self, task: Task):
+        fn, args, kwargs, queued_at = task
+        UPDATE_WAIT_SECONDS.observe(time.monotonic() - queued_at)
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            handled = False
+            if self.on_error is not None:
+                try:
+                    handled = bool(self.on_error(e))
+                except Exception:
+                    logger.exception("Update error handler failed")
+            if not handled:
+                logger.exception(f"Unhandled error in update handler: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.executed += 1
+                if not self._pending:
+                    self._idle.notify_all()
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "active_chats": len(self._queues),
+                "executed": self.executed,
+                "rejected": self.rejected,
+            }
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться, пока очереди опустеют; False - не успели за timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def shutdown(self, timeout: float = 30):
+        """Доработать принятые обновления и остановить пул"""
+        if not self.join(timeout):
+            logger.warning(f"{self.stats()['pending']} updates still pending at shutdown")
+        self._pool.shutdown(wait=False)
+
+
+class ChatOrderedTeleBot(TeleBot):
+    """
+    TeleBot, который отдает обработчики в ChatExecutor вместо своего пула.
+    Собственный ThreadPool TeleBot нужен циклу polling (проверка ошибок), поэтому оставлен с одним потоком.
+    """
+
+    def __init__(self, token: str, executor: ChatExecutor, **kwargs):
+        kwargs.setdefault("num_threads", 1)
+        super().__init__(token, **kwargs)
+        self.chat_executor = executor
+        # Ошибки обработчиков - в bot.exception_handler, как у обычного TeleBot
+        if executor.on_error is None:
+            executor.on_error = self._handle_exception
+
+    def _exec_task(self, task, *args, **kwargs):
+        if not self.threaded:
+            return super()._exec_task(task, *args, **kwargs)
+        # Обработчики вызываются как task(message|call, ...), listener'ы - task([messages])
+        chat_id = update_chat_id(args[0]) if args and not isinstance(args[0], list) else None
+        self.chat_executor.submit(chat_id, task, *args, **kwargs)
+
+
+class ChatOrderedAsyncTeleBot(AsyncTeleBot):
+    """
+    То же для режима asyncio. AsyncTeleBot запускает обработчики всей пачки обновлений разом (gather),
+    и два нажатия в одном чате перемежаются на каждом await. Здесь у чата свой asyncio.Lock (FIFO):
+    обработчики чата идут по очереди, разные чаты - конкурентно; ждущих в чате не больше chat_queue_limit.
+    """
+
+    def __init__(self, token: str, chat_queue_limit: int = 20,
+                 on_reject: Optional[Callable[[int, Any, bool], Awaitable]] = None, **kwargs):
+        super().__init__(token, **kwargs)
+        self.chat_queue_limit = chat_queue_limit
+        self.on_reject = on_reject
+        self._chat_locks: Dict[Hashable, asyncio.Lock] = {}
+        self._waiting: Dict[Hashable, int] = {}
+        self._overflowed: Set[Hashable] = set()
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self.executed = 0
+        self.rejected = 0
+
+    async def _run_middlewares_and_handlers(self, message, handlers, middlewares, update_type):
+        chat_id = update_chat_id(message)
+        if chat_id is None:
+            return await super()._run_middlewares_and_handlers(message, handlers, middlewares, update_type)
+        if self._waiting.get(chat_id, 0) >= self.chat_queue_limit:
+            self.rejected += 1
+            first = chat_id not in self._overflowed
+            self._overflowed.add(chat_id)
+            UPDATES_REJECTED.inc()
+            logger.warning(f"Update queue for chat {chat_id} is full ({self.chat_queue_limit}), update dropped")
+            if self.on_reject is not None:
+                try:
+                    await self.on_reject(chat_id, message, first)
+                except Exception as e:
+                    logger.warning(f"Reject callback for chat {chat_id} failed: {e}")
+            return
+
+        queued_at = time.monotonic()
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        self._waiting[chat_id] = self._waiting.get(chat_id, 0) + 1
+        self._track(1)
+        try:
+            async with lock:
+                self._waiting[chat_id] -= 1
+                UPDATE_WAIT_SECONDS.observe(time.monotonic() - queued_at)
+                await super()._run_middlewares_and_handlers(message, handlers, middlewares, update_type)
+        finally:
+            self.executed += 1
+            self._track(-1)
+            if not self._waiting.get(chat_id) and not lock.locked():
+                self._waiting.pop(chat_id, None)
+                self._chat_locks.pop(chat_id, None)
+                self._overflowed.discard(chat_id)
+
+    def _track(self, delta: int):
+        self._in_flight += delta
+        if self._idle is None:
+            self._idle = asyncio.Event()
+        if self._in_flight:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться обработчиков, которые уже начались или ждут своей очереди"""
+        if not self._in_flight:
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": 0,  # потоков нет - обработчики идут задачами в цикле событий
+            "pending": self._in_flight,
+            "active_chats": len(self._chat_locks),
+            "executed": self.executed,
+            "rejected": self.rejected,
+        }
@@ -40,9 +40,93 @@ class Settings(BaseSettings):
    
     
 
+    # Кэш file_id загруженных локальных медиа (переживает перезапуск)
+    media_cache_path: str = "data/media_cache.json"
+
+    # Параллельная рассылка по каналам (Publish Everywhere).
+    # Лимиты Telegram: ~30 сообщений/сек на бота и ~20 сообщений/мин в одну группу/канал,
+    # поэтому одновременно обслуживаем не больше fanout_max_workers каналов.
+    fanout_max_workers: int = 3
+    fanout_timeout: int = 120  # Время на отправку поста в один канал (все запросы одной попытки), сек
+    fanout_retries: int = 2  # Повторы при ошибке отправки в канал
+    fanout_mode: str = "copy"  # copy - пост грузится в первый канал, остальные получают copyMessages; send - полная отправка в каждый
+
+    # Реестр каналов (src/channels.py): названия и права бота опрашиваются при старте и в фоне
+    channel_cache_ttl: int = 900  # сек; обновление раз в channel_cache_ttl / 2
+
+    # HTTP-пул для lombard-perspectiva.ru и проверки картинок
+    http_pool_size: int = 10
+    parser_concurrency: int = 5  # Одновременных загрузок в LombardParser.parse_many
+    parser_engine: str = "lxml"  # lxml (XPath, один проход) или bs4 (прежний движок)
+    parser_state_fast_path: bool = True  # Сначала искать товар во встроенном JSON (JSON-LD, Nuxt)
+
+    # Массовая загрузка ссылок (src/bulk.py): из сообщения или текстового файла
+    bulk_max_links: int = 50  # Больше ссылок за раз не берем
+    bulk_max_drafts: int = 100  # Черновиков в очереди чата; лишние ссылки не разбираются
+    bulk_max_file_bytes: int = 262144  # Максимальный размер загружаемого файла со ссылками
+    bulk_progress_interval: float = 2.0  # сек между правками сообщения о прогрессе
+
+    # Кэш результатов парсинга страниц
+    listing_cache_size: int = 128
+    listing_cache_ttl: int = 600  # сек, после истечения - условный GET (ETag/Last-Modified)
+
+    # Проверка ссылок на веб-фото (HEAD)
+    image_check_ttl: int = 300  # сек, сколько хранить вердикт по ссылке
+    image_check_concurrency: int = 8
+    image_check_max_entries: int = 5000  # Вердиктов в памяти; старые вытесняются
+
+    # Подготовка локальных фото перед загрузкой (Telegram все равно сжимает до 1280 px)
+    image_preprocess: bool = True
+    image_max_side: int = 1280  # 1280 или 2560 для HD
+    image_quality: int = 87
+    image_format: str = "JPEG"  # JPEG или WEBP
+    media_derivatives_dir: str = "data/derivatives"
+    upload_bandwidth_mbps: float = 10.0  # Для оценки сэкономленного времени загрузки
+
+    # Хранилище сессий
+    session_backend: str = "memory"  # memory | sqlite (переживает перезапуск; только одна реплика бота)
+    session_db_path: str = "data/sessions.sqlite3"
+    session_idle_ttl: int = 3600  # сек без активности, после которых сессия удаляется
+    session_max: int = 200  # Максимум сессий в памяти, лишние вытесняются (LRU)
+    session_flush_interval: int = 30  # сек между сбросами сессий в хранилище
+
+    # Фоновая отправка медиа превью
+    preview_workers: int = 4
+
+    # Режим webhook (src/webhook.py)
+    webhook_url: str = ""  # Публичный https-адрес сервиса, например https://bot.example.com
+    webhook_secret: str = ""  # Проверяется по заголовку X-Telegram-Bot-Api-Secret-Token
+    webhook_port: int = 8080
+    webhook_drop_pending_updates: bool = False  # Сбросить накопленные обновления при регистрации (теряются посты, присланные во время выкатки)
+
+    # Исходящие лимиты Telegram (src/ratelimit.py)
+    telegram_global_rate: float = 30.0  # сообщений в секунду на бота
+    telegram_chat_rate: float = 1.0  # сообщений в секунду в личный чат
+    telegram_group_rate_per_minute: float = 20.0  # сообщений в минуту в группу/канал
+    telegram_flood_retries: int = 3  # Повторов после 429 (retry_after)
+
+    # Метрики Prometheus (/metrics). В режиме webhook они же отдаются на webhook_port
+    metrics_port: int = 9100  # 0 - не поднимать отдельный HTTP-сервер
+
+    # Трассировка постов: JSON-записи span'ов (src/tracing.py)
+    tracing_enabled: bool = True
+    trace_log_path: str = ""  # пусто - в stdout вместе с остальными логами
+
+    # Обработка обновлений: чаты параллельно, обновления одного чата по порядку (src/chat_executor.py)
+    runtime: str = "sync"  # sync - TeleBot и пул потоков, async - AsyncTeleBot и aiohttp (src/async_main.py)
+    bot_workers: int = 8  # Потоков для обработчиков
+    chat_queue_limit: int = 20  # Необработанных обновлений одного чата, лишние отклоняются
+    max_pending_updates: int = 500  # Всего в очередях; дальше polling/webhook ждет обработчиков
+
+    # Профилирование по команде /profile (src/profiling.py)
+    profile_sample_interval_ms: int = 5  # Период снятия стеков в режиме sample
+    profile_max_seconds: int = 600  # Дольше профиль не идет, даже если не набрано N обработчиков
+    profile_top: int = 40  # Строк в каждой таблице отчета
+    profile_trace_frames: int = 10  # Глубина стека tracemalloc в режиме memory
+
     # Безопасность
-    rate_limit_per_minute: int = 10
-    
+    rate_limit_per_minute: int = 10  # Входящих ссылок от одного пользователя в минуту
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,303 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+from telebot import TeleBot
+
+from . import metrics
+from .albums import post_cost
+from .config import settings
+from .session import UserSession
+from .sync_bridge import AwaitableBot, call_sync, run_sync
+from .tracing import propagate, span
+from .utils import send_photos_to_destination, has_uncached_local_media, validate_session_media
+from . import async_utils
+
+logger = logging.getLogger(__name__)
+
+# Строка отчета: (название, id назначения, успех, статус)
+DeliveryResult = Tuple[str, str, bool, str]
+
+# Общий пул на весь процесс: даже при нескольких одновременных публикациях
+# в Telegram уходит не больше settings.fanout_max_workers рассылок сразу.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.fanout_max_workers,
+    thread_name_prefix="fanout",
+)
+
+
+def _partial_status(status_msg: str, sent: List[int]) -> str:
+    return f"{status_msg} (отправлено частично: {len(sent)} сообщ., повтор отменен)"
+
+
+COPIED = "Успешно (копия)"
+
+
+@dataclass
+class FanoutSavings:
+    """Что сэкономило копирование по сравнению с полной отправкой в каждый канал"""
+    copies: int = 0
+    calls: int = 0
+    bytes: int = 0
+
+
+def _copy_payload(destination_id, from_chat_id, message_ids: List[int]) -> int:
+    """Размер запроса copyMessages: только id чатов и сообщений"""
+    return len(str(destination_id)) + len(str(from_chat_id)) + len(json.dumps(message_ids))
+
+
+def _record_copies(savings: FanoutSavings, copied: List[int], full_calls: int, full_bytes: int):
+    """
+    copied - размеры запросов copyMessages, по одному на канал, куда пост скопирован.
+    Экономия прибавляется: одни savings можно передать в рассылку нескольких постов.
+    """
+    calls = len(copied) * max(full_calls - 1, 0)
+    saved_bytes = sum(max(full_bytes - size, 0) for size in copied)
+    savings.copies += len(copied)
+    savings.calls += calls
+    savings.bytes += saved_bytes
+    metrics.FANOUT_CALLS_SAVED.inc(calls)
+    metrics.FANOUT_BYTES_SAVED.inc(saved_bytes)
+    logger.info(f"Copied post to {len(copied)} channel(s): saved {calls} call(s), {saved_bytes} bytes")
+
+
+_fanout_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _fanout_limit() -> asyncio.Semaphore:
+    """Общий на цикл событий предел рассылок (семафор привязан к циклу, в котором создан)"""
+    loop = asyncio.get_running_loop()
+    semaphore = _fanout_limits.get(loop)
+    if semaphore is None:
+        semaphore = _fanout_limits[loop] = asyncio.Semaphore(settings.fanout_max_workers)
+    return semaphore
+
+
+class _SyncTransport:
+    """
+    Рассылка на TeleBot: корутины ниже выполняются без цикла событий (run_sync),
+    паузы - time.sleep, параллельные отправки - в общем пуле потоков _executor.
+    """
+
+    def __init__(self, bot: TeleBot, send: Callable[..., bool]):
+        self.raw_bot = bot
+        self.bot = AwaitableBot(bot)
+        self._send = send
+
+    async def send(self, destination_id: str, session: UserSession, timeout, sent: List[int]) -> bool:
+        return self._send(self.raw_bot, destination_id, session, timeout=timeout, sent=sent)
+
+    async def validate(self, session: UserSession) -> dict:
+        return validate_session_media(session)
+
+    async def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    async def limited(self, coroutine_function, *args):
+        # Первое назначение идет в потоке публикации: он все равно ждет результат
+        return await coroutine_function(*args)
+
+    async def gather(self, coroutine_function, calls: List[tuple]) -> list:
+        futures = [_executor.submit(propagate(call_sync), coroutine_function, *args) for args in calls]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+
+class _AsyncTransport:
+    """
+    Рассылка на AsyncTeleBot: задачи вместо пула потоков, но тот же общий предел -
+    не больше settings.fanout_max_workers рассылок одновременно на процесс.
+    """
+
+    def __init__(self, bot, send: Callable[..., Any]):
+        self.bot = bot
+        self._send = send
+
+    async def send(self, destination_id: str, session: UserSession, timeout, sent: List[int]) -> bool:
+        return await self._send(self.bot, destination_id, session, timeout=timeout, sent=sent)
+
+    async def validate(self, session: UserSession) -> dict:
+        return await async_utils.validate_session_media(session)
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    async def limited(self, coroutine_function, *args):
+        async with _fanout_limit():
+            return await coroutine_function(*args)
+
+    async def gather(self, coroutine_function, calls: List[tuple]) -> list:
+        return await asyncio.gather(*(self.limited(coroutine_function, *args) for args in calls),
+                                    return_exceptions=True)
+
+
+# ==================== ОБЩАЯ ЛОГИКА РАССЫЛКИ ==================
+# Одна реализация для обоих режимов: transport - _SyncTransport или _AsyncTransport.
+
+async def _deliver(transport, name: str, destination_id: str, session: UserSession,
+                   sent: Optional[List[int]] = None) -> DeliveryResult:
+    sent = sent if sent is not None else []
+    attempts = settings.fanout_retries + 1
+    status_msg = "Ошибка"
+    for attempt in range(1, attempts + 1):
+        started = time.monotonic()
+        try:
+            with span("deliver", destination=name, destination_id=str(destination_id), attempt=attempt):
+                delivered = await transport.send(str(destination_id), session, settings.fanout_timeout, sent)
+            if delivered:
+                logger.info(f"Delivered to {name} ({destination_id}) in {time.monotonic() - started:.2f}s, attempt {attempt}")
+                return name, destination_id, True, "Успешно"
+            status_msg = "Ошибка"
+        except Exception as e:
+            status_msg = f"Ошибка: {e}"
+        if sent:
+            logger.error(f"Delivery to {name} ({destination_id}) failed after {len(sent)} message(s), not retrying: {status_msg}")
+            return name, destination_id, False, _partial_status(status_msg, sent)
+        logger.warning(f"Delivery to {name} ({destination_id}) failed, attempt {attempt}/{attempts}: {status_msg}")
+        if attempt < attempts:
+            await transport.sleep(2 ** (attempt - 1))
+    return name, destination_id, False, status_msg
+
+
+async def _fan_out(transport, destinations: List[Tuple[str, str]], session: UserSession) -> List[DeliveryResult]:
+    if not destinations:
+        return []
+
+    results: List[DeliveryResult] = []
+    pending = list(destinations)
+
+    # Ссылки на фото проверяются один раз на всю рассылку, а не в каждом канале
+    await transport.validate(session)
+
+    # Если локальные файлы еще не загружались, первое назначение отправляем отдельно:
+    # остальные каналы получат уже закэшированные file_id вместо повторной загрузки
+    if len(pending) > 1 and has_uncached_local_media(session):
+        name, destination_id = pending.pop(0)
+        results.append(await transport.limited(_deliver, transport, name, destination_id, session))
+
+    deliver_one = functools.partial(_deliver, transport)
+    outcomes = await transport.gather(deliver_one, [(name, cid, session) for name, cid in pending])
+    for (name, destination_id), outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            outcome = (name, destination_id, False, f"Ошибка: {outcome}")
+        results.append(outcome)
+    return results
+
+
+async def _copy_post(bot, destination_id: str, from_chat_id: str, message_ids: List[int]) -> bool:
+    copied = await bot.copy_messages(destination_id, from_chat_id, message_ids)
+    return len(copied or []) == len(message_ids)
+
+
+async def _copy_fan_out(transport, destinations: List[Tuple[str, str]], session: UserSession,
+                        savings: Optional[FanoutSavings] = None) -> List[DeliveryResult]:
+    if not destinations:
+        return []
+    savings = savings if savings is not None else FanoutSavings()
+    verdicts = await transport.validate(session)
+    (primary_name, primary_id), rest = destinations[0], list(destinations[1:])
+
+    message_ids: List[int] = []
+    primary = await transport.limited(_deliver, transport, primary_name, primary_id, session, message_ids)
+    if not primary[2] or not message_ids:
+        # Копировать нечего - остальные каналы обычной рассылкой
+        return [primary] + await _fan_out(transport, rest, session)
+    full_calls, full_bytes = post_cost(session, verdicts)
+
+    async def replicate(name: str, destination_id: str) -> Tuple[DeliveryResult, Optional[int]]:
+        try:
+            with span("copy", destination=name, destination_id=str(destination_id), messages=len(message_ids)):
+                if await _copy_post(transport.bot, destination_id, primary_id, message_ids):
+                    metrics.FANOUT_COPIES.inc(result="copied")
+                    return (name, destination_id, True, COPIED), _copy_payload(destination_id, primary_id, message_ids)
+        except Exception as e:
+            logger.warning(f"Copy to {name} ({destination_id}) failed, sending in full: {e}")
+        metrics.FANOUT_COPIES.inc(result="fallback")
+        return await _deliver(transport, name, destination_id, session), None
+
+    outcomes = await transport.gather(replicate, rest)
+    results: List[DeliveryResult] = [primary]
+    copied: List[int] = []
+    for (name, destination_id), outcome in zip(rest, outcomes):
+        if isinstance(outcome, Exception):
+            outcome = (name, destination_id, False, f"Ошибка: {outcome}"), None
+        result, copy_size = outcome
+        results.append(result)
+        if copy_size is not None:
+            copied.append(copy_size)
+    _record_copies(savings, copied, full_calls, full_bytes)
+    return results
+
+
+# ==================== СИНХРОННЫЙ РЕЖИМ =======================
+
+def deliver(bot: TeleBot, name: str, destination_id: str, session: UserSession,
+            send: Callable[..., bool] = send_photos_to_destination,
+            sent: Optional[List[int]] = None) -> DeliveryResult:
+    """
+    Отправка в одно назначение с таймаутом и повторами. Отправка поста не идемпотентна:
+    повтор только если в канал еще ничего не ушло (`sent` пуст), иначе пост задвоится.
+    """
+    return run_sync(_deliver(_SyncTransport(bot, send), name, destination_id, session, sent))
+
+
+def fan_out(bot: TeleBot, destinations: List[Tuple[str, str]], session: UserSession,
+            send: Callable[..., bool] = send_photos_to_destination) -> List[DeliveryResult]:
+    """
+    Параллельная отправка поста во все назначения.
+    Результаты возвращаются в порядке destinations.
+    """
+    return run_sync(_fan_out(_SyncTransport(bot, send), destinations, session))
+
+
+def copy_post(bot: TeleBot, destination_id: str, from_chat_id: str, message_ids: List[int]) -> bool:
+    """Серверная копия опубликованных сообщений (альбомы и подписи сохраняются)"""
+    return run_sync(_copy_post(AwaitableBot(bot), destination_id, from_chat_id, message_ids))
+
+
+def copy_fan_out(bot: TeleBot, destinations: List[Tuple[str, str]], session: UserSession,
+                 send: Callable[..., bool] = send_photos_to_destination,
+                 savings: Optional[FanoutSavings] = None) -> List[DeliveryResult]:
+    """
+    Публикация копированием: пост целиком уходит в первое назначение, остальные получают его
+    через copyMessages - один небольшой запрос без медиа на канал. Если копия не удалась,
+    в этот канал пост отправляется полностью. К `savings` прибавляется экономия для отчета.
+    """
+    return run_sync(_copy_fan_out(_SyncTransport(bot, send), destinations, session, savings))
+
+
+# ==================== РЕЖИМ ASYNCIO ==========================
+
+async def deliver_async(bot, name: str, destination_id: str, session: UserSession,
+                        send: Callable[..., Any] = async_utils.send_photos_to_destination,
+                        sent: Optional[List[int]] = None) -> DeliveryResult:
+    """deliver для режима asyncio (AsyncTeleBot): те же повторы, пауза - asyncio.sleep"""
+    return await _deliver(_AsyncTransport(bot, send), name, destination_id, session, sent)
+
+
+async def fan_out_async(bot, destinations: List[Tuple[str, str]], session: UserSession,
+                        send: Callable[..., Any] = async_utils.send_photos_to_destination) -> List[DeliveryResult]:
+    """fan_out для режима asyncio: не больше settings.fanout_max_workers рассылок одновременно на процесс"""
+    return await _fan_out(_AsyncTransport(bot, send), destinations, session)
+
+
+async def copy_post_async(bot, destination_id: str, from_chat_id: str, message_ids: List[int]) -> bool:
+    return await _copy_post(bot, destination_id, from_chat_id, message_ids)
+
+
+async def copy_fan_out_async(bot, destinations: List[Tuple[str, str]], session: UserSession,
+                             send: Callable[..., Any] = async_utils.send_photos_to_destination,
+                             savings: Optional[FanoutSavings] = None) -> List[DeliveryResult]:
+    """copy_fan_out для режима asyncio"""
+    return await _copy_fan_out(_AsyncTransport(bot, send), destinations, session, savings)
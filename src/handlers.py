@@ -0,0 +1,1077 @@
+"""
+Обработчики бота - один набор для обоих режимов (settings.runtime).
+
+Обработчики написаны корутинами. Что в режимах различается - загрузка страниц, превью, рассылка,
+отложенные действия - дает режим (runtime), установленный через install():
+    src/main.py       - SyncRuntime: TeleBot и пул потоков, корутина выполняется без цикла событий (sync_bridge.run_sync);
+    src/async_main.py - AsyncRuntime: AsyncTeleBot и aiohttp, корутины идут в цикле событий.
+
+Режим предоставляет:
+    bot                                       - Bot API; методы - корутины;
+    raw_bot                                   - TeleBot/AsyncTeleBot, у которого регистрируются обработчики;
+    name, profile_modes                       - для /settings и /profile;
+    adapt(handler)                            - обработчик в том виде, в котором его вызывает бот режима;
+    parse(parser, url), parse_many(parser, urls, on_done)
+    update_preview(session), start_preview_pipeline(session, on_ready, started_at)
+    fan_out(destinations, session), copy_fan_out(destinations, session, savings), deliver(name, id, session)
+    offload(fn, *args)                        - работа CPU и диска вне цикла событий;
+    refresh_channels(), refresh_channels_in_background()
+    schedule(delay, coroutine_function, *args), call_soon(coroutine_function, *args) - из любого потока;
+    update_stats()                            - очередь обновлений для /settings.
+"""
+import io
+import logging
+import time
+from typing import Callable, List, Set, Tuple
+
+from telebot import types
+
+from src.config import settings
+from src.parser import LombardParser, extraction_stats
+from src.http_pool import get_http_session
+from src.listing_cache import listing_cache
+from src.media_prep import image_preprocessor
+from src.scheduler import scheduler
+from src.instrumentation import instrumented, recent_seconds, FIRST_PREVIEW
+from src.tracing import bind_trace
+from src.preview import preview_stats
+from src.profiling import profiler
+from src import metrics
+from src.ratelimit import outbound_governor, inbound_limiter
+from src.session import UserSession
+from src.session_store import create_session_store
+from src.media_cache import media_cache
+from src.channels import channel_registry, describe_channel
+from src.bulk import (
+    BulkProgress,
+    draft_session,
+    draft_title,
+    drafts_text,
+    extract_links,
+    is_links_file,
+    limit_links,
+    load_draft,
+    queue_drafts,
+    result_draft,
+)
+from src.dispatcher import FanoutSavings
+from src.utils import (
+    is_valid_lombard_url,
+    create_photo_markup,
+    create_multi_channel_markup,
+    create_main_menu_markup,
+    create_confirmation_markup,
+    create_drafts_markup,
+    create_bulk_confirmation_markup,
+)
+
+logger = logging.getLogger(__name__)
+
+# Режим и его Bot API - задаются install()
+runtime = None
+bot = None
+
+# Глобальные данные
+user_sessions = create_session_store()
+metrics.ACTIVE_SESSIONS.set_function(lambda: len(user_sessions))
+
+# Чаты, от которых ждем новый текст поста
+awaiting_text_edit: Set[int] = set()
+
+# (тип обработчика, обработчик, фильтры) в порядке объявления: первый подходящий и выполняется
+HANDLERS: List[Tuple[str, Callable, dict]] = []
+
+
+def message_handler(**filters):
+    filters.setdefault("content_types", ["text"])  # как у @bot.message_handler
+
+    def decorator(handler):
+        HANDLERS.append(("message", handler, filters))
+        return handler
+    return decorator
+
+def callback_query_handler(**filters):
+    def decorator(handler):
+        HANDLERS.append(("callback_query", handler, filters))
+        return handler
+    return decorator
+
+def install(selected_runtime):
+    """Зарегистрировать обработчики у бота режима; режим становится текущим для всех обработчиков"""
+    global runtime, bot
+    if runtime is not None:
+        raise RuntimeError(f"Обработчики уже зарегистрированы в режиме {runtime.name}")
+    runtime, bot = selected_runtime, selected_runtime.bot
+    register = {"message": runtime.raw_bot.register_message_handler,
+                "callback_query": runtime.raw_bot.register_callback_query_handler}
+    for kind, handler, filters in HANDLERS:
+        register[kind](instrumented(runtime.adapt(handler)), **filters)
+    metrics.PENDING_UPDATES.set_function(lambda: runtime.update_stats()["pending"])
+
+
+# ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==============
+def get_or_create_session(chat_id: int) -> UserSession:
+    """Получить или создать сессию пользователя; ее trace становится текущим для обработчика"""
+    session = user_sessions.get_or_create(chat_id)
+    bind_trace(session.trace_id, chat_id)
+    return session
+
+def start_background_jobs():
+    """Периодическая очистка брошенных сессий, сброс сессий в хранилище и обновление реестра каналов"""
+    scheduler.every(settings.session_flush_interval, user_sessions.maintain)
+    # Все каналы опрашиваются параллельно сразу при старте, дальше - в фоне
+    runtime.refresh_channels_in_background()
+    scheduler.every(max(settings.channel_cache_ttl / 2, 1), runtime.refresh_channels_in_background)
+
+def session_memory_report() -> str:
+    """Что держат сессии и кэши в памяти - контекст для /profile memory"""
+    cache_stats = media_cache.stats()
+    listing_stats = listing_cache.stats()
+    return (
+        f"{user_sessions.memory_report()}\n"
+        f"Кэш медиа: {cache_stats['entries']} файлов, кэш страниц: {listing_stats['size']}/{listing_stats['max_size']}"
+    )
+
+profiler.memory_context = session_memory_report
+
+async def send_profile_report(chat_id: int, report: str, file_name: str):
+    """Отчет профиля - файлом администратору"""
+    document = types.InputFile(io.BytesIO(report.encode("utf-8")), file_name=file_name)
+    await bot.send_document(chat_id, document, caption=report.split("\n", 1)[0])
+
+async def reject_update(chat_id: int, update, first: bool):
+    """Очередь чата переполнена: снять часики с кнопки и один раз предупредить пользователя"""
+    if isinstance(update, types.CallbackQuery):
+        await bot.answer_callback_query(update.id, "Подождите, обрабатываю предыдущие действия")
+    elif first:
+        await bot.send_message(chat_id, "Слишком много сообщений подряд, подождите немного")
+
+async def safe_delete_message(chat_id: int, message_id: int):
+    """Безопасное удаление сообщения"""
+    try:
+        await bot.delete_message(chat_id, message_id)
+    except Exception:
+        pass
+
+async def send_temp_message(chat_id: int, text: str, duration: int = 3):
+    """Отправить временное сообщение (удаляется планировщиком, обработчик не ждет)"""
+    msg = await bot.send_message(chat_id, text)
+    runtime.schedule(duration, safe_delete_message, chat_id, msg.message_id)
+
+async def edit_progress(chat_id: int, message_id: int, text: str, reply_markup=None):
+    """Правка сообщения о прогрессе; ошибка правки не должна останавливать загрузку"""
+    try:
+        await bot.edit_message_text(text, chat_id, message_id, reply_markup=reply_markup)
+    except Exception as e:
+        logger.debug(f"Не удалось обновить прогресс в {chat_id}: {e}")
+
+async def publish_everywhere(session: UserSession, savings: FanoutSavings):
+    """Публикация во все каналы: копированием или полной отправкой (settings.fanout_mode)"""
+    if settings.fanout_mode == "copy":
+        # Загрузка один раз в первый канал, остальным - серверная копия
+        return await runtime.copy_fan_out(settings.all_channels, session, savings)
+    return await runtime.fan_out(settings.all_channels, session)
+
+async def ingest_links(chat_id: int, links):
+    """Массовая загрузка: все ссылки разбираются параллельно, готовые посты - в очередь черновиков"""
+    session = get_or_create_session(chat_id)
+    links, skipped = limit_links(links, len(session.drafts))
+    if not links:
+        await bot.send_message(chat_id, f"Очередь черновиков заполнена ({len(session.drafts)}). "
+                                        f"Опубликуйте или очистите ее: /drafts")
+        return
+    progress = BulkProgress(len(links), skipped)
+    progress_msg = await bot.send_message(chat_id, progress.text())
+    parser = LombardParser(http=get_http_session(), cache=listing_cache)
+    drafts = [None] * len(links)  # По позиции ссылки: в очередь - в порядке вставки, не готовности
+
+    async def on_done(index, result):
+        drafts[index] = result_draft(session, parser, links[index], result, progress)
+        if progress.due():
+            await edit_progress(chat_id, progress_msg.message_id, progress.text())
+
+    await runtime.parse_many(parser, links, on_done)
+    queue_drafts(session, drafts, progress)
+    logger.info(f"Массовая загрузка для {chat_id}: {progress.drafts}/{progress.total} черновиков")
+    await edit_progress(chat_id, progress_msg.message_id, progress.report(len(session.drafts)),
+                        reply_markup=create_drafts_markup(len(session.drafts)))
+
+
+# ==================== РЕДАКТИРОВАНИЕ ТЕКСТА =================
+# Раньше всех обработчиков сообщений: новый текст поста не должен уйти в handle_link
+
+@message_handler(func=lambda m: m.chat.id in awaiting_text_edit and m.text is not None)
+async def process_text_edit(message):
+    """Простая версия - всегда добавляем ссылку"""
+    chat_id = message.chat.id
+    awaiting_text_edit.discard(chat_id)
+    session = get_or_create_session(chat_id)
+    
+    if not session.validate_text_length(message.text):
+        await bot.send_message(chat_id, f"Текст слишком длинный. Максимум {settings.max_text_length} символов.")
+        return
+    
+    # Всегда создаем HTML с ссылкой (БЕЗ дублирования)
+    lines = message.text.split('\n')
+    first_line = lines[0] if lines else "Часы"
+    rest_of_text = '\n'.join(lines[1:]) if len(lines) > 1 else ""
+    
+    html_text = f'<a href="{session.url}">{first_line}</a>'
+    if rest_of_text:
+        html_text += f'\n{rest_of_text}'
+    
+    session.text = html_text
+    await runtime.update_preview(session)
+    await bot.send_message(
+        chat_id, 
+        "Текст обновлен. Выберите действие:", 
+        reply_markup=create_main_menu_markup()
+    )
+
+# ==================== ОБРАБОТЧИКИ КОМАНД ====================
+
+@message_handler(commands=["start"])
+async def start(message):
+    """Обработчик команды /start"""
+    logger.info(f"Команда /start от {message.chat.id}")
+    try:
+        session = get_or_create_session(message.chat.id)
+        session.clear()
+        
+        welcome_msg = await bot.send_message(
+            message.chat.id,
+            "Welcome to ...!\nF***ing way, it works!\n"
+            "Drop me a watch link from lombard-perspectiva.ru\n"
+            "e.g. https://lombard-perspectiva.ru/clock/...\n\n"
+            "I'll grab the data and set up your post automatically.\n"
+            "Several links or a .txt file with links go to the draft queue (/drafts)."
+        )
+        session.message_history.append(welcome_msg.message_id)
+        
+    except Exception as e:
+        logger.error(f"Ошибка в /start: {e}")
+        metrics.record_error("start", e)
+        await bot.send_message(message.chat.id, "Произошла ошибка. Попробуйте позже.")
+
+@message_handler(commands=["settings", "status"])
+async def show_settings(message):
+    """Показать настройки и статус"""
+    try:
+        main_channel = channel_registry.get(settings.channel_id)
+        channel_stats = channel_registry.stats()
+        session_stats = user_sessions.stats()
+        
+        channels_info = "\n".join([f"- {name}" for name, _ in settings.all_channels])
+        cache_stats = media_cache.stats()
+        listing_stats = listing_cache.stats()
+        parse_paths = extraction_stats()
+        prep_stats = image_preprocessor.stats
+        scheduler_stats = scheduler.stats()
+        governor_stats = outbound_governor.stats()
+        update_stats = runtime.update_stats()
+        first_preview = sorted(recent_seconds(FIRST_PREVIEW))
+        first_preview_median = first_preview[len(first_preview) // 2] if first_preview else 0.0
+        preview = preview_stats()
+        
+        await bot.send_message(
+            message.chat.id,
+            f"Статус бота ({runtime.name}):\n"
+            f"Бот: @{channel_registry.bot_username or 'неизвестно'}\n"
+            f"Основной канал: {main_channel.display_title if main_channel else settings.channel_id}\n"
+            f"ID канала: {settings.channel_id}\n"
+            f"Username: @{main_channel.username if main_channel and main_channel.username else 'нет'}\n"
+            f"Админ: {settings.admin_id}\n"
+            f"Активных сессий: {session_stats['active']}/{session_stats['max_sessions']} "
+            f"(удалено по простою: {session_stats['evicted_idle']}, по лимиту: {session_stats['evicted_lru']})\n"
+            f"Всего каналов: {len(settings.all_channels)}\n"
+            f"Каналы:\n{channels_info}\n"
+            f"Реестр каналов: опрошено {channel_stats['resolved']}/{channel_stats['channels']}, "
+            f"без права публикации {channel_stats['cannot_post']}, обновлен {channel_stats['age']:.0f} сек назад\n"
+            f"Макс. фото: {settings.max_photos}\n"
+            f"Макс. текст: {settings.max_text_length} символов\n"
+            f"Кэш медиа: {cache_stats['entries']} файлов, "
+            f"попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}\n"
+            f"Кэш страниц: {listing_stats['size']}/{listing_stats['max_size']}, "
+            f"попаданий {listing_stats['hit_rate']:.0%}, вытеснено {listing_stats['evictions']}\n"
+            f"Разбор страниц: из JSON {parse_paths['state']}, по разметке {parse_paths['dom']}\n"
+            f"Сжатие фото: -{prep_stats.bytes_saved / 1_000_000:.1f} МБ, "
+            f"~{prep_stats.upload_seconds_saved:.0f} сек загрузки\n"
+            f"Отложенных действий: {scheduler_stats['queue_depth']}, "
+            f"задержка {scheduler_stats['last_lag'] * 1000:.0f} мс (макс. {scheduler_stats['max_lag'] * 1000:.0f} мс)\n"
+            f"Первое превью (медиана): {first_preview_median:.2f} сек\n"
+            f"Правок превью на месте: {preview['edits']:.0f}, заново: {preview['resends']:.0f}, "
+            f"сэкономлено {preview['bytes_saved'] / 1_000_000:.1f} МБ\n"
+            f"Лимиты Telegram: задержано {governor_stats['throttled']} запросов "
+            f"({governor_stats['waited_seconds']:.0f} сек), 429: {governor_stats['flood_errors']}, "
+            f"отклонено входящих: {inbound_limiter.rejected}\n"
+            f"Очередь обновлений: {update_stats['pending']} в {update_stats['active_chats']} чатах, "
+            f"потоков {update_stats['workers']}, отклонено {update_stats['rejected']}\n"
+            f"{metrics.summary()}"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка показа настроек: {e}")
+        metrics.record_error("show_settings", e)
+        await bot.send_message(message.chat.id, f"Ошибка получения настроек: {e}")
+
+@message_handler(commands=["profile"])
+async def profile_command(message):
+    """
+    /profile cpu|sample|memory [N | Ns] - профиль следующих N обработчиков или T секунд,
+    /profile stop - закончить раньше, /profile - состояние. Только для администратора.
+    cpu - только в синхронном режиме: в цикле asyncio обработчики перемешаны, их не разделить.
+    """
+    if not message.from_user or message.from_user.id != settings.admin_id:
+        await bot.send_message(message.chat.id, "Команда доступна только администратору")
+        return
+    args = (message.text or "").split()[1:]
+    try:
+        if not args:
+            await bot.send_message(
+                message.chat.id,
+                f"{profiler.status()}\n\n"
+                "/profile sample 60s - стеки всех потоков 60 секунд\n"
+                + ("/profile cpu 20 - cProfile для следующих 20 обработчиков\n" if "cpu" in runtime.profile_modes else "")
+                + "/profile memory 300s - рост памяти за 5 минут\n"
+                "/profile stop - остановить и получить отчет",
+            )
+            return
+        if args[0] == "stop":
+            if profiler.stop() is None:
+                await bot.send_message(message.chat.id, "Профилирование не запущено")
+            return
+        mode = args[0]
+        limit = args[1] if len(args) > 1 else "60s"
+        if mode not in runtime.profile_modes or not limit.rstrip("s").isdigit() or int(limit.rstrip("s")) <= 0:
+            await bot.send_message(message.chat.id, f"Формат: /profile {'|'.join(runtime.profile_modes)} <N | Ns>")
+            return
+        if limit.endswith("s"):
+            invocations, seconds = None, int(limit[:-1])
+        else:
+            invocations, seconds = int(limit), None
+        chat_id = message.chat.id
+        profiler.start(mode, invocations=invocations, seconds=seconds,
+                       on_done=lambda report, file_name: runtime.call_soon(send_profile_report, chat_id, report, file_name))
+        scope = f"{invocations} обработчиков" if invocations else f"{seconds} сек"
+        await bot.send_message(chat_id, f"Профилирование {mode} запущено: {scope}. Отчет придет файлом.")
+    except RuntimeError as e:
+        await bot.send_message(message.chat.id, f"{e}. /profile stop - остановить")
+    except Exception as e:
+        logger.error(f"Ошибка /profile: {e}")
+        metrics.record_error("profile_command", e)
+        await bot.send_message(message.chat.id, f"Ошибка профилирования: {e}")
+
+@message_handler(commands=["clear", "cancel"])
+async def clear_session(message):
+    """Очистить текущую сессию"""
+    chat_id = message.chat.id
+    awaiting_text_edit.discard(chat_id)
+    # Сессия может быть только в хранилище: вытеснена из памяти или бот перезапускался
+    session = user_sessions.get(chat_id)
+    if session is not None:
+        session.clear()
+        logger.info(f"Сессия очищена для {chat_id}")
+        await send_temp_message(chat_id, "Сессия очищена")
+    else:
+        await send_temp_message(chat_id, "Нет активной сессии")
+
+@message_handler(commands=['find_channel'])
+async def find_channel(message):
+    """Найти канал по username"""
+    try:
+        chat_info = await bot.get_chat('perspectivaural')
+        
+        await bot.send_message(
+            message.chat.id,
+            f"Найден канал!\n"
+            f"Название: {chat_info.title}\n"
+            f"Числовой ID: {chat_info.id}\n"
+            f"Username: @{chat_info.username}\n"
+            f"Тип: {chat_info.type}"
+        )
+        
+        await bot.send_message(
+            message.chat.id,
+            f"Вставьте в .env:\nCHANNEL_ID={chat_info.id}"
+        )
+        
+    except Exception as e:
+        await bot.send_message(
+            message.chat.id,
+            f"Не удалось найти канал 'perspectivaural': {e}\n\n"
+            f"Проверьте:\n"
+            f"Бот добавлен в канал как администратор\n"
+            f"Username канала правильный\n"
+            f"Канал публичный"
+        )
+
+# ==================== ОБРАБОТЧИКИ СООБЩЕНИЙ =================
+
+@message_handler(func=lambda m: m.text and m.text.startswith("http"))
+async def handle_link(message):
+    """Обработчик ссылок"""
+    chat_id = message.chat.id
+    url = message.text.strip()
+    started_at = time.monotonic()
+    
+    try:
+        # Несколько ссылок в одном сообщении - массовая загрузка в очередь черновиков
+        links = extract_links(message.text)
+        if len(links) > 1:
+            if not inbound_limiter.allow(message.from_user.id if message.from_user else chat_id):
+                await bot.send_message(chat_id, f"Слишком много ссылок. Не больше {settings.rate_limit_per_minute} в минуту, подождите немного.")
+                return
+            await ingest_links(chat_id, links)
+            return
+        
+        if not is_valid_lombard_url(url):
+            await bot.send_message(chat_id, "Неверная ссылка. Используйте ссылку на часы с lombard-perspectiva.ru")
+            return
+        
+        if not inbound_limiter.allow(message.from_user.id if message.from_user else chat_id):
+            await bot.send_message(chat_id, f"Слишком много ссылок. Не больше {settings.rate_limit_per_minute} в минуту, подождите немного.")
+            return
+        
+        session = get_or_create_session(chat_id)
+        session.clear()  # новый пост - новый trace
+        bind_trace(session.trace_id, chat_id)
+        session.url = url
+        
+        parsing_msg = await bot.send_message(chat_id, "Парсим ссылку...")
+        session.message_history.append(parsing_msg.message_id)
+        
+        parser = LombardParser(http=get_http_session(), cache=listing_cache)
+        text, web_photos = await runtime.parse(parser, url)
+        custom_photos = parser.get_custom_photos()
+        custom_videos = parser.get_custom_videos()
+        
+        if not session.validate_text_length(text):
+            await bot.send_message(chat_id, f"Текст слишком длинный. Максимум {settings.max_text_length} символов.")
+            return
+        
+        session.text = text
+        session.add_web_photos(web_photos)
+        # Сжатие локальных фото - работа CPU и диска, не для цикла событий
+        await runtime.offload(session.add_custom_photos, custom_photos)
+        session.add_custom_videos(custom_videos)
+        
+        # Логируем информацию о медиа
+        web_photos_count = len(web_photos)
+        custom_photos_count = len(custom_photos)
+        custom_videos_count = len(custom_videos)
+        total_photos = len(session.selected_photos)
+        total_videos = len(session.selected_videos)
+        
+        logger.info(f"Спаршено: {web_photos_count} веб-фото, {custom_photos_count} кастомных фото, {custom_videos_count} видео для {chat_id}")
+        
+        await safe_delete_message(chat_id, parsing_msg.message_id)
+        
+        # Текст превью уходит сразу, медиа догружаются в фоне, меню - после медиа
+        await runtime.start_preview_pipeline(
+            session,
+            on_ready=lambda: bot.send_message(
+                chat_id, 
+                f"Готово! Получено {total_photos + total_videos} медиа (веб-фото: {web_photos_count}, пользовательских фото: {custom_photos_count}, видео: {custom_videos_count}).\nВыберите действие:", 
+                reply_markup=create_main_menu_markup()
+            ),
+            started_at=started_at,
+        )
+        
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка для {chat_id}: {e}")
+        metrics.record_error("handle_link", e)
+        await bot.send_message(chat_id, "Произошла непредвиденная ошибка. Попробуйте позже.")
+
+@message_handler(regexp=r'https://lombard-perspectiva\.ru/.*')
+async def handle_auto_parse(message):
+    """Автоматический парсинг ссылок из чата"""
+    await handle_link(message)
+
+@message_handler(content_types=["document"])
+async def handle_links_file(message):
+    """Текстовый файл со ссылками - массовая загрузка"""
+    chat_id = message.chat.id
+    document = message.document
+    
+    try:
+        if not is_links_file(document.file_name, document.mime_type):
+            await bot.send_message(chat_id, "Пришлите текстовый файл (.txt) со ссылками на lombard-perspectiva.ru")
+            return
+        
+        if document.file_size and document.file_size > settings.bulk_max_file_bytes:
+            await bot.send_message(chat_id, f"Файл слишком большой. Максимум {settings.bulk_max_file_bytes // 1024} КБ.")
+            return
+        
+        file_info = await bot.get_file(document.file_id)
+        content = await bot.download_file(file_info.file_path)
+        links = extract_links(content.decode("utf-8", errors="replace"))
+        if not links:
+            await bot.send_message(chat_id, "В файле нет ссылок на часы с lombard-perspectiva.ru")
+            return
+        
+        if not inbound_limiter.allow(message.from_user.id if message.from_user else chat_id):
+            await bot.send_message(chat_id, f"Слишком много ссылок. Не больше {settings.rate_limit_per_minute} в минуту, подождите немного.")
+            return
+        
+        await ingest_links(chat_id, links)
+        
+    except Exception as e:
+        logger.error(f"Ошибка загрузки файла ссылок для {chat_id}: {e}")
+        metrics.record_error("handle_links_file", e)
+        await bot.send_message(chat_id, "Не удалось обработать файл. Попробуйте позже.")
+
+@message_handler(commands=["drafts"])
+async def show_drafts(message):
+    """Очередь черновиков из массовой загрузки"""
+    session = get_or_create_session(message.chat.id)
+    await bot.send_message(message.chat.id, drafts_text(session), reply_markup=create_drafts_markup(len(session.drafts)))
+
+@callback_query_handler(func=lambda call: call.data == "bulk_next")
+async def bulk_next_callback(call):
+    """Открыть следующий черновик как обычный пост: превью, правки, выбор каналов"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    if not session.drafts:
+        await bot.answer_callback_query(call.id, "Очередь черновиков пуста")
+        return
+    
+    try:
+        draft = session.drafts.pop(0)
+        await runtime.offload(load_draft, session, draft)  # новый пост - новый trace
+        bind_trace(session.trace_id, chat_id)
+        await bot.answer_callback_query(call.id, draft_title(draft))
+        
+        await runtime.start_preview_pipeline(
+            session,
+            on_ready=lambda: bot.send_message(
+                chat_id,
+                f"Черновик открыт, в очереди еще {len(session.drafts)}.\nВыберите действие:",
+                reply_markup=create_main_menu_markup()
+            ),
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка открытия черновика для {chat_id}: {e}")
+        metrics.record_error("bulk_next_callback", e)
+        await bot.send_message(chat_id, "Не удалось открыть черновик. Попробуйте позже.")
+
+@callback_query_handler(func=lambda call: call.data in ("bulk_publish_all", "bulk_publish_cancel", "bulk_clear"))
+async def bulk_queue_callback(call):
+    """Публикация всей очереди (с подтверждением) и очистка очереди"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    if call.data == "bulk_publish_all" and session.drafts:
+        text = f"Опубликовать {len(session.drafts)} черновик(ов) ВО ВСЕ КАНАЛЫ?\n\n{drafts_text(session)}"
+        markup = create_bulk_confirmation_markup()
+    else:
+        if call.data == "bulk_clear":
+            session.drafts.clear()
+        text, markup = drafts_text(session), create_drafts_markup(len(session.drafts))
+    
+    await edit_progress(chat_id, call.message.message_id, text, reply_markup=markup)
+    await bot.answer_callback_query(call.id)
+
+@callback_query_handler(func=lambda call: call.data == "bulk_publish_confirm")
+async def bulk_publish_callback(call):
+    """Публикация всех черновиков по очереди; неудачные остаются в очереди"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    drafts = list(session.drafts)
+    
+    if not drafts:
+        await bot.answer_callback_query(call.id, "Очередь черновиков пуста")
+        return
+    
+    await bot.answer_callback_query(call.id, "Публикуем...")
+    progress = BulkProgress(len(drafts))
+    savings = FanoutSavings()
+    await edit_progress(chat_id, call.message.message_id, progress.text("Публикация"))
+    
+    for draft in drafts:
+        post = await runtime.offload(draft_session, chat_id, draft)
+        bind_trace(post.trace_id, chat_id)
+        try:
+            results = await publish_everywhere(post, savings)
+            failed = [f"{name}: {status}" for name, _, success, status in results if not success]
+        except Exception as e:
+            logger.error(f"Ошибка публикации черновика {draft['url']} для {chat_id}: {e}")
+            metrics.record_error("bulk_publish_callback", e)
+            failed = [str(e)]
+        if failed:
+            progress.record(draft["url"], "; ".join(failed))
+        else:
+            session.drafts.remove(draft)
+            progress.record(draft["url"])
+        if progress.due():
+            await edit_progress(chat_id, call.message.message_id, progress.text("Публикация"))
+    
+    report = "\n".join([f"Опубликовано {progress.drafts} из {progress.total} черновиков."]
+                       + progress.failures("Не удалось (остались в очереди):"))
+    if savings.copies:
+        report += (f"\nСкопировано в {savings.copies} канал(а): сэкономлено {savings.calls} запрос(ов), "
+                   f"{savings.bytes / 1000:.0f} КБ")
+    await edit_progress(chat_id, call.message.message_id, report, reply_markup=create_drafts_markup(len(session.drafts)))
+
+
+# ==================== ОБРАБОТЧИКИ CALLBACK ===================
+
+@callback_query_handler(func=lambda call: call.data == "edit_text")
+async def edit_text_callback(call):
+    """Редактирование текста"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    logger.info(f"function cancel_send_callback {session}")
+
+    # Следующее текстовое сообщение чата заберет process_text_edit
+    awaiting_text_edit.add(chat_id)
+    await bot.send_message(chat_id, "Отправьте новый текст для поста:")
+    await bot.answer_callback_query(call.id)
+
+@callback_query_handler(func=lambda call: call.data == "select_photos")
+async def select_photos_callback(call):
+    """Управление медиа"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    total_media = len(session.selected_photos) + len(session.selected_videos)
+    logger.info(f"Управление медиа для {chat_id}: {total_media} выбрано (фото: {len(session.selected_photos)}, видео: {len(session.selected_videos)})")
+    
+    markup = create_photo_markup(session)
+    await bot.edit_message_text(
+        chat_id=chat_id,
+        message_id=call.message.message_id,
+        text=f"Управление медиа (выбрано: {total_media}):",
+        reply_markup=markup,
+    )
+    await bot.answer_callback_query(call.id)
+
+@callback_query_handler(func=lambda call: call.data.startswith(("move_up_", "move_down_", "remove_")))
+async def handle_media_actions(call):
+    """Обработка действий с медиа (фото и видео)"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    try:
+        cd = call.data
+        
+        if cd.startswith("remove_"):
+            parts = cd.split("_")
+            if len(parts) >= 3:
+                media_type = parts[1]  # "photo" или "video"
+                media_index = int(parts[2])
+                
+                confirm_markup = types.InlineKeyboardMarkup()
+                confirm_markup.add(
+                    types.InlineKeyboardButton("Удалить", callback_data=f"confirm_remove_{media_type}_{media_index}"),
+                    types.InlineKeyboardButton("Оставить", callback_data=f"cancel_remove_{media_type}_{media_index}"),
+                )
+                
+                media_type_text = "видео" if media_type == "video" else "фото"
+                await bot.send_message(
+                    chat_id,
+                    f"Удалить {media_type_text} №{media_index+1}?",
+                    reply_markup=confirm_markup,
+                )
+                
+                await bot.answer_callback_query(call.id)
+                return
+        
+        elif cd.startswith("move_up_"):
+            parts = cd.split("_")
+            if len(parts) >= 4:
+                media_type = parts[2]
+                media_index = int(parts[3])
+                
+                if media_type == "photo":
+                    session.move_photo_up(media_index)
+                elif media_type == "video":
+                    session.move_video_up(media_index)
+                await bot.answer_callback_query(call.id, "Медиа перемещено вверх")
+                
+        elif cd.startswith("move_down_"):
+            parts = cd.split("_")
+            if len(parts) >= 4:
+                media_type = parts[2]
+                media_index = int(parts[3])
+                
+                if media_type == "photo":
+                    session.move_photo_down(media_index)
+                elif media_type == "video":
+                    session.move_video_down(media_index)
+                await bot.answer_callback_query(call.id, "Медиа перемещено вниз")
+        
+        # Обновляем клавиатуру
+        new_markup = create_photo_markup(session)
+        await bot.edit_message_reply_markup(
+            chat_id=chat_id,
+            message_id=call.message.message_id,
+            reply_markup=new_markup,
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка обработки медиа для {chat_id}: {e}")
+        metrics.record_error("handle_media_actions", e)
+        await bot.answer_callback_query(call.id, f"Ошибка: {str(e)}")
+
+@callback_query_handler(func=lambda call: call.data.startswith(("confirm_remove_", "cancel_remove_")))
+async def handle_remove_confirmation(call):
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    try:
+        parts = call.data.split("_")
+        action = "_".join(parts[:2])  # confirm_remove или cancel_remove
+        media_type = parts[2]
+        *_, media_index_str = parts
+        media_index = int(media_index_str)
+
+        logger.info(f"Callback remove → action={action}, type={media_type}, index={media_index}")
+
+        if action == "confirm_remove":
+            if media_type == "photo" and media_index < len(session.selected_photos):
+                removed = session.remove_photo(media_index)
+                media_type_text = "фото"
+            elif media_type == "video" and media_index < len(session.selected_videos):
+                removed = session.remove_video(media_index)
+                media_type_text = "видео"
+            else:
+                await bot.answer_callback_query(call.id, "Медиа не найдено")
+                return
+            
+            if removed:
+                logger.info(f"Удалено {media_type_text} №{media_index+1}: {removed.url}")
+                await bot.answer_callback_query(call.id, f"{media_type_text.capitalize()} удалено")
+            else:
+                await bot.answer_callback_query(call.id, "Ошибка удаления")
+        else:
+            await bot.answer_callback_query(call.id, "Удаление отменено")
+
+        # Обновляем клавиатуру
+        new_markup = create_photo_markup(session)
+        total_media = len(session.selected_photos) + len(session.selected_videos)
+        
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=call.message.message_id,
+            text=f"Обновленный список медиа (осталось: {total_media}):",
+            reply_markup=new_markup,
+        )
+
+        await safe_delete_message(chat_id, call.message.message_id)
+
+    except Exception as e:
+        logger.error(f"Ошибка удаления для {chat_id}: {e}")
+        metrics.record_error("handle_remove_confirmation", e)
+        await bot.answer_callback_query(call.id, f"Ошибка: {str(e)}")
+
+@callback_query_handler(func=lambda call: call.data == "confirm_photos")
+async def confirm_photos_callback(call):
+    """Подтверждение выбора медиа"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    await runtime.update_preview(session)
+    total_media = len(session.selected_photos) + len(session.selected_videos)
+    await bot.send_message(
+        chat_id, 
+        f"Выбор медиа подтвержден ({total_media} медиа). Выберите действие:", 
+        reply_markup=create_main_menu_markup()
+    )
+    await bot.answer_callback_query(call.id)
+
+@callback_query_handler(func=lambda call: call.data == "send_to_channel")
+async def send_to_channel_callback(call):
+    """Начало процесса отправки с выбором опций"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    try:
+        markup = create_multi_channel_markup()
+        
+        channels_info = "\n".join([f"- {name}" for name, _ in settings.all_channels])
+        total_media = len(session.selected_photos) + len(session.selected_videos)
+        
+        msg = await bot.send_message(
+            chat_id,
+            f"Куда отправить пост? ({total_media} медиа)\n\n"
+            f"ОПУБЛИКОВАТЬ ВЕЗДЕ - во все каналы:\n{channels_info}\n"
+            f"ТОЛЬКО СЕБЕ - для теста\n"
+            f"КОНКРЕТНЫЙ КАНАЛ - выберите ниже",
+            reply_markup=markup,
+        )
+        
+        session.choose_send_msg_id = msg.message_id
+        await bot.answer_callback_query(call.id)
+        
+    except Exception as e:
+        logger.error(f"Ошибка отправки для {chat_id}: {e}")
+        metrics.record_error("send_to_channel_callback", e)
+        await bot.answer_callback_query(call.id, f"Ошибка: {e}")
+
+@callback_query_handler(func=lambda call: call.data.startswith(("send_everywhere", "send_self_only", "send_to_")))
+async def choose_send_option_callback(call):
+    """Обработка выбора варианта отправки"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    try:
+        if session.choose_send_msg_id:
+            await safe_delete_message(chat_id, session.choose_send_msg_id)
+        
+        total_media = len(session.selected_photos) + len(session.selected_videos)
+        
+        if call.data == "send_everywhere":
+            session.confirm_data = {"type": "everywhere"}
+            preview_msg = await bot.send_message(
+                chat_id,
+                f"Отправить пост ВО ВСЕ КАНАЛЫ? ({total_media} медиа)\n\n"
+                "Это опубликует пост во всех настроенных каналах и отправит вам копию для проверки.",
+                reply_markup=create_confirmation_markup(),
+            )
+            
+        elif call.data == "send_self_only":
+            session.confirm_data = {"type": "self_only"}
+            preview_msg = await bot.send_message(
+                chat_id,
+                f"Отправить пост только себе для проверки? ({total_media} медиа)",
+                reply_markup=create_confirmation_markup(),
+            )
+            
+        else:
+            channel_id = call.data.replace("send_to_", "")
+            # Название и права бота - из реестра каналов, без запросов к Bot API
+            channel = channel_registry.get(channel_id)
+            if channel is None:
+                logger.warning(f"Канал channel_id={channel_id} не найден в реестре, используем основной")
+                channel_id = str(settings.channel_id)
+                channel = channel_registry.get(channel_id)
+            channel_name = channel.display_title if channel else channel_id
+            warning = "\n\nВнимание: у бота нет права публиковать в этот канал" if channel and channel.can_post is False else ""
+                
+            session.confirm_data = {
+                "type": "single_channel", 
+                "channel_id": channel_id,
+                "channel_name": channel_name
+            }
+            
+            preview_msg = await bot.send_message(
+                chat_id,
+                f"Отправить пост в канал:\n{channel_name}? ({total_media} медиа){warning}",
+                reply_markup=create_confirmation_markup(),
+            )
+        
+        session.message_history.append(preview_msg.message_id)
+        await bot.answer_callback_query(call.id)
+        
+    except Exception as e:
+        logger.error(f"Ошибка выбора отправки для {chat_id}: {e}")
+        metrics.record_error("choose_send_option_callback", e)
+        await bot.answer_callback_query(call.id, f"Ошибка: {e}")
+
+@callback_query_handler(func=lambda call: call.data in ("confirm_send", "cancel_send"))
+async def confirm_send_callback(call):
+    """Подтверждение отправки"""
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    
+    if not session.confirm_data:
+        await bot.answer_callback_query(call.id, "Данные отправки не найдены")
+        return
+    
+    try:
+        await safe_delete_message(chat_id, call.message.message_id)
+        
+        if call.data == "cancel_send":
+            await bot.answer_callback_query(call.id, "Отправка отменена")
+            await bot.send_message(
+                chat_id, 
+                "Отправка отменена. Выберите действие:", 
+                reply_markup=create_main_menu_markup()
+            )
+            return
+        
+        send_type = session.confirm_data.get("type")
+        results = []
+        savings = FanoutSavings()
+
+        if send_type == "everywhere":
+            results = await publish_everywhere(session, savings)
+
+        elif send_type == "self_only":
+            results = [await runtime.deliver("Личные сообщения", chat_id, session)]
+
+        elif send_type == "single_channel":
+            channel_id = session.confirm_data["channel_id"]
+            channel_name = session.confirm_data["channel_name"]
+            results = [await runtime.deliver(channel_name, channel_id, session)]
+
+        # Формируем отчет
+        report_text = "\n".join([f"{name} ({cid}): {status}" for name, cid, success, status in results])
+        if savings.copies:
+            report_text += (f"\nСкопировано в {savings.copies} канал(а): сэкономлено {savings.calls} запрос(ов), "
+                            f"{savings.bytes / 1000:.0f} КБ")
+        confirmation = await bot.send_message(chat_id, report_text)
+
+        # Авто-удаление сообщения через 8 секунд
+        runtime.schedule(8, safe_delete_message, chat_id, confirmation.message_id)
+        
+        # Очистка сессии; очередь черновиков остается до следующего поста
+        session.clear()
+        if session.drafts:
+            await bot.send_message(chat_id, drafts_text(session), reply_markup=create_drafts_markup(len(session.drafts)))
+        else:
+            user_sessions.delete(chat_id)
+        
+        await bot.answer_callback_query(call.id, "Готово")
+        
+    except Exception as e:
+        logger.error(f"Ошибка отправки для {chat_id}: {e}")
+        metrics.record_error("confirm_send_callback", e)
+        await bot.answer_callback_query(call.id, f"Ошибка: {str(e)}")
+
+@callback_query_handler(func=lambda call: call.data == "bulk_remove")
+async def bulk_remove_callback(call):
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+
+    total_media = len(session.selected_photos) + len(session.selected_videos)
+    if total_media == 0:
+        await bot.answer_callback_query(call.id, "Нет медиа для удаления")
+        return
+
+    markup = types.InlineKeyboardMarkup()
+    
+    # Добавляем фото
+    for i, photo in enumerate(session.selected_photos):
+        checked = "выбрано" if i in session.photos_to_remove else "не выбрано"
+        markup.add(
+            types.InlineKeyboardButton(f"{checked} ФОТО {i+1}", callback_data=f"toggle_remove_photo_{i}")
+        )
+    
+    # Добавляем видео
+    for i, video in enumerate(session.selected_videos):
+        checked = "выбрано" if i in session.videos_to_remove else "не выбрано"
+        markup.add(
+            types.InlineKeyboardButton(f"{checked} ВИДЕО {i+1}", callback_data=f"toggle_remove_video_{i}")
+        )
+    
+    markup.row(
+        types.InlineKeyboardButton("Удалить выбранные", callback_data="confirm_bulk_remove"),
+        types.InlineKeyboardButton("Отмена", callback_data="cancel_bulk_remove")
+    )
+
+    total_selected = len(session.photos_to_remove) + len(session.videos_to_remove)
+    await bot.edit_message_text(
+        chat_id=chat_id,
+        message_id=call.message.message_id,
+        text=f"Выберите медиа для удаления (выбрано {total_selected}):",
+        reply_markup=markup
+    )
+    await bot.answer_callback_query(call.id)
+
+@callback_query_handler(func=lambda call: call.data.startswith("toggle_remove_"))
+async def toggle_media_remove(call):
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    parts = call.data.split("_")
+    
+    if len(parts) >= 4:
+        media_type = parts[2]  # "photo" или "video"
+        index = int(parts[3])
+        
+        if media_type == "photo":
+            if index in session.photos_to_remove:
+                session.photos_to_remove.remove(index)
+            else:
+                session.photos_to_remove.append(index)
+        elif media_type == "video":
+            if index in session.videos_to_remove:
+                session.videos_to_remove.remove(index)
+            else:
+                session.videos_to_remove.append(index)
+    
+    await bulk_remove_callback(call)
+
+@callback_query_handler(func=lambda call: call.data == "confirm_bulk_remove")
+async def confirm_bulk_remove(call):
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+
+    # Удаляем выбранные фото
+    for index in sorted(session.photos_to_remove, reverse=True):
+        removed = session.remove_photo(index)
+        if removed:
+            logger.info(f"Массово удалено фото №{index+1}: {removed.url}")
+
+    # Удаляем выбранные видео
+    for index in sorted(session.videos_to_remove, reverse=True):
+        removed = session.remove_video(index)
+        if removed:
+            logger.info(f"Массово удалено видео №{index+1}: {removed.url}")
+
+    session.photos_to_remove.clear()
+    session.videos_to_remove.clear()
+
+    total_remaining = len(session.selected_photos) + len(session.selected_videos)
+    await bot.edit_message_text(
+        chat_id=chat_id,
+        message_id=call.message.message_id,
+        text=f"Удаление завершено. Осталось {total_remaining} медиа.",
+        reply_markup=create_photo_markup(session)
+    )
+    await bot.answer_callback_query(call.id)
+
+@callback_query_handler(func=lambda call: call.data == "cancel_bulk_remove")
+async def cancel_bulk_remove(call):
+    chat_id = call.message.chat.id
+    session = get_or_create_session(chat_id)
+    session.photos_to_remove.clear()
+    session.videos_to_remove.clear()
+    await bot.edit_message_text(
+        chat_id=chat_id,
+        message_id=call.message.message_id,
+        text="Массовое удаление отменено.",
+        reply_markup=create_photo_markup(session)
+    )
+    await bot.answer_callback_query(call.id)
+
+@message_handler(commands=["where"])
+async def where_to_send(message):
+    """Показать куда будут отправляться посты"""
+    try:
+        channels_info = [describe_channel(channel) for channel in channel_registry.all()]
+        await bot.send_message(
+            message.chat.id,
+            "Посты будут отправляться в:\n\n" + "\n".join(channels_info)
+        )
+        
+    except Exception as e:
+        await bot.send_message(
+            message.chat.id,
+            f"Ошибка проверки каналов: {e}"
+        )
+
+@message_handler(commands=["debug_channels"])
+async def debug_channels(message):
+    """Диагностика каналов; /debug_channels refresh - опросить каналы заново"""
+    try:
+        if "refresh" in (message.text or "").split()[1:]:
+            await runtime.refresh_channels()
+        age = channel_registry.age()
+        await bot.send_message(
+            message.chat.id,
+            f"Проверка настроек каналов:\n"
+            f"CHANNEL_ID: '{settings.channel_id}'\n"
+            f"MY_CHANNEL_ID: '{settings.my_channel_id}'\n"
+            f"ADMIN_ID: {settings.admin_id}\n"
+            f"Все каналы из настроек: {settings.all_channels}\n"
+            f"Реестр обновлен: {f'{age:.0f} сек назад' if age is not None else 'еще нет'}"
+        )
+        
+        # Доступ к каждому каналу - по данным реестра
+        for channel in channel_registry.all():
+            await bot.send_message(message.chat.id, f"{channel.name} ({channel.channel_id}):\n{describe_channel(channel)}")
+                
+    except Exception as e:
+        await bot.send_message(message.chat.id, f"Ошибка диагностики: {e}")
@@ -0,0 +1,46 @@
+import logging
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def create_http_session(pool_size: Optional[int] = None) -> requests.Session:
+    """Сессия requests с keep-alive пулом соединений и повтором на 502/503/504"""
+    pool_size = pool_size or settings.http_pool_size
+    session = requests.Session()
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """Общая на процесс HTTP-сессия: соединения к сайту переиспользуются между запросами"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = create_http_session()
+                logger.info(f"HTTP pool created (size={settings.http_pool_size})")
+    return _session
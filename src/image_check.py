@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import aiohttp
+import requests
+
+from .async_http import get_async_http_session
+from .config import settings
+from .http_pool import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# Общий пул HEAD-проверок на процесс, а не новый на каждый validate_many
+_pool = ThreadPoolExecutor(
+    max_workers=settings.image_check_concurrency,
+    thread_name_prefix="imgcheck",
+)
+
+
+class ImageUrlValidator:
+    """
+    Проверка ссылок на картинки через HEAD с кэшем вердиктов.
+    Превью и все каналы одной публикации переиспользуют один ответ на ссылку.
+    """
+
+    def __init__(self, ttl: float = 300, http: Optional[requests.Session] = None,
+                 concurrency: int = 8, max_entries: int = 5000):
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.max_entries = max_entries
+        self._http = http
+        # Порядок - по времени вердикта: в начале самые старые, они и истекают первыми
+        self._verdicts: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def http(self) -> requests.Session:
+        return self._http if self._http is not None else get_http_session()
+
+    def _cached(self, url: str) -> Optional[bool]:
+        with self._lock:
+            verdict = self._verdicts.get(url)
+            if verdict and time.monotonic() - verdict[1] < self.ttl:
+                self.hits += 1
+                return verdict[0]
+            self.misses += 1
+            return None
+
+    def _store(self, url: str, valid: bool):
+        now = time.monotonic()
+        with self._lock:
+            self._verdicts[url] = (valid, now)
+            self._verdicts.move_to_end(url)
+            # Истекшие и лишние сверх max_entries удаляются сразу, кэш не растет все время жизни пода
+            while self._verdicts:
+                oldest_url, (_, checked_at) = next(iter(self._verdicts.items()))
+                if now - checked_at < self.ttl and len(self._verdicts) <= self.max_entries:
+                    break
+                del self._verdicts[oldest_url]
+
+    def check(self, url: str) -> Optional[bool]:
+        """HEAD-запрос без кэша. None - сетевая ошибка, такой ответ не кэшируется"""
+        try:
+            resp = self.http.head(url, timeout=5, allow_redirects=True)
+            content_type = resp.headers.get('content-type', '')
+            if resp.status_code == 200 and 'image' in content_type:
+                return True
+            logger.warning(f"URL does not point to a valid image: {url} (status: {resp.status_code}, content-type: {content_type})")
+            return False
+        except Exception as e:
+            logger.warning(f"Error checking image URL {url}: {e}")
+            return None
+
+    def is_valid(self, url: str) -> bool:
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+        valid = self.check(url)
+        if valid is not None:
+            self._store(url, valid)
+        return bool(valid)
+
+    def validate_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """Проверить все ссылки параллельно, уже проверенные берутся из кэша"""
+        results: Dict[str, bool] = {}
+        to_check = []
+        for url in dict.fromkeys(urls):
+            cached = self._cached(url)
+            if cached is None:
+                to_check.append(url)
+            else:
+                results[url] = cached
+
+        for url, valid in zip(to_check, _pool.map(self.check, to_check)):
+            if valid is not None:
+                self._store(url, valid)
+            results[url] = bool(valid)
+        return results
+
+    async def check_async(self, url: str) -> Optional[bool]:
+        """check для режима asyncio: HEAD через aiohttp"""
+        try:
+            http = await get_async_http_session()
+            async with http.head(url, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=True) as resp:
+                content_type = resp.headers.get('content-type', '')
+                if resp.status == 200 and 'image' in content_type:
+                    return True
+                logger.warning(f"URL does not point to a valid image: {url} (status: {resp.status}, content-type: {content_type})")
+                return False
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Error checking image URL {url}: {e}")
+            return None
+
+    async def is_valid_async(self, url: str) -> bool:
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+        valid = await self.check_async(url)
+        if valid is not None:
+            self._store(url, valid)
+        return bool(valid)
+
+    async def validate_many_async(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """validate_many без пула потоков: не больше concurrency HEAD-запросов одновременно"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(url: str) -> Tuple[str, bool]:
+            cached = self._cached(url)
+            if cached is not None:
+                return url, cached
+            async with semaphore:
+                valid = await self.check_async(url)
+            if valid is not None:
+                self._store(url, valid)
+            return url, bool(valid)
+
+        return dict(await asyncio.gather(*(check(url) for url in dict.fromkeys(urls))))
+
+    def clear(self):
+        with self._lock:
+            self._verdicts.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._verdicts), "hits": self.hits, "misses": self.misses}
+
+
+image_validator = ImageUrlValidator(
+    ttl=settings.image_check_ttl,
+    concurrency=settings.image_check_concurrency,
+    max_entries=settings.image_check_max_entries,
+)
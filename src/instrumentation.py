@@ -0,0 +1,126 @@
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, List
+
+from .metrics import HANDLER_SECONDS, STAGE_SECONDS, record_error
+from .profiling import profiler
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Имена событий
+FIRST_PREVIEW = "first_preview"  # Текст превью отправлен: chat_id, seconds
+PREVIEW_READY = "preview_ready"  # Медиа превью отправлены: chat_id, seconds
+
+_subscribers: Dict[str, List[Callable[..., None]]] = defaultdict(list)
+_recent: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=100))
+_lock = threading.Lock()
+
+
+def subscribe(event: str, callback: Callable[..., None]):
+    """Подписаться на событие: callback(**fields)"""
+    with _lock:
+        _subscribers[event].append(callback)
+
+
+def emit(event: str, **fields):
+    """Сообщить о событии всем подписчикам; ошибки подписчиков не ломают обработчики"""
+    if "seconds" in fields:
+        with _lock:
+            _recent[event].append(fields["seconds"])
+    for callback in list(_subscribers.get(event, ())):
+        try:
+            callback(**fields)
+        except Exception as e:
+            logger.warning(f"Instrumentation hook for {event} failed: {e}")
+
+
+def recent_seconds(event: str) -> List[float]:
+    """Последние значения seconds для события (до 100)"""
+    with _lock:
+        return list(_recent[event])
+
+
+def instrumented(handler: Callable) -> Callable:
+    """
+    Декоратор обработчика Telegram: время работы в mybot_handler_duration_seconds,
+    необработанные исключения - в mybot_errors_total, span с именем обработчика,
+    профиль по /profile (src/profiling.py).
+    Обработчик идет в своей копии контекста: trace_id, привязанный в нем,
+    не переходит к следующему обновлению в том же потоке пула.
+    Ставится под @bot.message_handler/@bot.callback_query_handler; async-обработчики
+    (AsyncTeleBot) и так идут в своей задаче asyncio, со своим контекстом.
+    """
+    name = handler.__name__
+
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                with span(name):
+                    return await profiler.run_async(handler, *args, count_invocation=True, **kwargs)
+            except Exception as e:
+                record_error(name, e)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.monotonic() - started, handler=name)
+
+        return async_wrapper
+
+    def run(*args, **kwargs):
+        started = time.monotonic()
+        try:
+            with span(name):
+                return profiler.run(handler, *args, count_invocation=True, **kwargs)
+        except Exception as e:
+            record_error(name, e)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.monotonic() - started, handler=name)
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        return contextvars.copy_context().run(run, *args, **kwargs)
+
+    return wrapper
+
+
+def timed_stage(stage: str) -> Callable[[Callable], Callable]:
+    """
+    Декоратор этапа публикации (превью, отправка в канал): mybot_stage_duration_seconds и span.
+    Этапы идут в своих потоках, поэтому в режиме cpu профилируются отдельно от обработчика.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with STAGE_SECONDS.time(stage=stage), span(stage):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage), span(stage):
+                return profiler.run(function, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _log_timing(event: str):
+    def callback(chat_id=None, seconds=0.0, **fields):
+        logger.info(f"{event} for {chat_id}: {seconds:.3f}s")
+    return callback
+
+
+subscribe(FIRST_PREVIEW, _log_timing(FIRST_PREVIEW))
+subscribe(PREVIEW_READY, _log_timing(PREVIEW_READY))
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedListing:
+    html: str
+    photos: List[str] = field(default_factory=list)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Заголовки условного GET для проверки, не изменилась ли страница"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def normalize_url(url: str) -> str:
+    """Ключ кэша: без фрагмента, utm-меток, завершающего слэша, с отсортированным query"""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+class ListingCache:
+    """LRU-кэш результатов парсинга с TTL"""
+
+    def __init__(self, max_size: int = 128, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedListing]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # Запись устарела, нужна проверка на сервере
+        self.revalidated = 0  # Из них ответ 304 - страница не изменилась
+        self.evictions = 0
+
+    def lookup(self, url: str) -> Tuple[Optional[CachedListing], bool]:
+        """Вернуть (запись, свежая ли она). Устаревшая запись нужна для условного GET"""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            if time.monotonic() - entry.fetched_at < self.ttl:
+                self.hits += 1
+                return entry, True
+            self.stale += 1
+            return entry, False
+
+    def put(self, url: str, entry: CachedListing):
+        key = normalize_url(url)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"Listing cache evicted {evicted}")
+
+    def mark_not_modified(self, url: str):
+        """Сервер ответил 304: продлеваем запись на еще один TTL"""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.fetched_at = time.monotonic()
+                self.revalidated += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+listing_cache = ListingCache(settings.listing_cache_size, settings.listing_cache_ttl)
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedMedia:
+    file_id: str
+    mtime: float
+    size: int
+    media_type: str = "photo"
+
+
+class MediaFileCache:
+    """Персистентный кэш file_id Telegram для локальных медиа.
+
+    Ключ - путь к файлу и тип медиа, запись действительна, пока
+    у файла на диске не изменились mtime и размер.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._entries: Dict[str, CachedMedia] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._load()
+
+    @staticmethod
+    def _key(file_path: str, media_type: str) -> str:
+        return f"{media_type}:{os.path.abspath(file_path)}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self._entries = {key: CachedMedia(**value) for key, value in raw.items()}
+            logger.info(f"Media cache loaded: {len(self._entries)} entries from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load media cache {self.path}: {e}")
+            self._entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = None
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            # Уникальный временный файл: два процесса/потока не пишут в один и тот же .tmp
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".tmp",
+                                             prefix=os.path.basename(self.path) + ".", delete=False) as f:
+                tmp_path = f.name
+                json.dump({key: asdict(value) for key, value in self._entries.items()}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not save media cache {self.path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def get(self, file_path: str, media_type: str = "photo") -> Optional[str]:
+        """Вернуть file_id, если файл не менялся с момента загрузки"""
+        key = self._key(file_path, media_type)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+                self.hits += 1
+                return entry.file_id
+            if entry:
+                # Файл изменился на диске - старый file_id больше не валиден
+                del self._entries[key]
+                self.invalidations += 1
+                self._save()
+            self.misses += 1
+            return None
+
+    def contains(self, file_path: str, media_type: str = "photo") -> bool:
+        """Проверка без учета в счетчиках попаданий/промахов"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        with self._lock:
+            entry = self._entries.get(self._key(file_path, media_type))
+            return bool(entry and entry.mtime == stat.st_mtime and entry.size == stat.st_size)
+
+    def put(self, file_path: str, file_id: str, media_type: str = "photo"):
+        """Запомнить file_id, полученный после первой загрузки"""
+        if not isinstance(file_id, str) or not file_id:
+            logger.warning(f"Media cache: not a file_id for {file_path}: {file_id!r}")
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[self._key(file_path, media_type)] = CachedMedia(
+                file_id=file_id,
+                mtime=stat.st_mtime,
+                size=stat.st_size,
+                media_type=media_type,
+            )
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+media_cache = MediaFileCache(settings.media_cache_path)
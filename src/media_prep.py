@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Без Pillow фото отправляются как есть
+    Image = None
+    ImageOps = None
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+HEIC_EXTENSIONS = {".heic", ".heif"}
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+
+@dataclass
+class PrepStats:
+    files: int = 0
+    cache_hits: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    @property
+    def upload_seconds_saved(self) -> float:
+        """Оценка по settings.upload_bandwidth_mbps"""
+        bytes_per_second = settings.upload_bandwidth_mbps * 1_000_000 / 8
+        return self.bytes_saved / bytes_per_second if bytes_per_second else 0.0
+
+
+class ImagePreprocessor:
+    """
+    Готовит локальные фото к отправке в Telegram: применяет EXIF-поворот,
+    конвертирует HEIC, уменьшает до max_side и пережимает с заданным качеством.
+    Результат кэшируется на диске по хэшу содержимого исходника.
+    """
+
+    def __init__(self, cache_dir: str, max_side: int = 1280, quality: int = 87,
+                 image_format: str = "JPEG"):
+        self.cache_dir = cache_dir
+        self.max_side = max_side
+        self.quality = quality
+        self.image_format = image_format.upper()
+        self.stats = PrepStats()
+        self._lock = threading.Lock()
+        # (путь, mtime, размер) -> путь производного файла, чтобы не хэшировать файл повторно
+        self._known: Dict[Tuple[str, float, int], str] = {}
+
+    @staticmethod
+    def _content_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _derivative_path(self, digest: str) -> str:
+        extension = FORMAT_EXTENSIONS.get(self.image_format, ".jpg")
+        name = f"{digest[:32]}_{self.max_side}_q{self.quality}{extension}"
+        return os.path.join(self.cache_dir, name)
+
+    def _render(self, source: str, target: str):
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Свое временное имя у каждого вызова: параллельные prepare одного фото не пишут в один файл
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+                tmp_path = tmp.name
+            try:
+                img.save(tmp_path, self.image_format, quality=self.quality, optimize=True,
+                         **({"progressive": True} if self.image_format == "JPEG" else {}))
+                os.replace(tmp_path, target)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def prepare(self, file_path: str) -> str:
+        """Вернуть путь к оптимизированной копии фото (или исходный путь, если оптимизация не помогла)"""
+        if Image is None:
+            return file_path
+        try:
+            stat = os.stat(file_path)
+            known_key = (os.path.abspath(file_path), stat.st_mtime, stat.st_size)
+            target = self._known.get(known_key)
+            if target == file_path:
+                return file_path
+            if target is None:
+                target = self._derivative_path(self._content_hash(file_path))
+
+            is_heic = os.path.splitext(file_path)[1].lower() in HEIC_EXTENSIONS
+            cache_hit = os.path.exists(target)
+            if not cache_hit:
+                self._render(file_path, target)
+
+            out_size = os.path.getsize(target)
+            if out_size >= stat.st_size and not is_heic:
+                # Исходник уже достаточно мал - отправляем его без изменений
+                os.remove(target)
+                with self._lock:
+                    self._known[known_key] = file_path
+                return file_path
+
+            with self._lock:
+                self._known[known_key] = target
+                self.stats.files += 1
+                self.stats.cache_hits += int(cache_hit)
+                # Экономия - только от реального пережатия, повторное использование ее не увеличивает
+                if not cache_hit:
+                    self.stats.bytes_in += stat.st_size
+                    self.stats.bytes_out += out_size
+            logger.info(f"Prepared photo {file_path}: {stat.st_size} -> {out_size} bytes{' (cached)' if cache_hit else ''}")
+            return target
+        except Exception as e:
+            logger.warning(f"Photo preprocessing failed for {file_path}, sending original: {e}")
+            return file_path
+
+
+image_preprocessor = ImagePreprocessor(
+    cache_dir=settings.media_derivatives_dir,
+    max_side=settings.image_max_side,
+    quality=settings.image_quality,
+    image_format=settings.image_format,
+)
@@ -0,0 +1,309 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы по умолчанию: от 5 мс до 2 минут (публикация с видео идет долго)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def total(self) -> float:
+        return sum(self.values().values())
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class Gauge(_Metric):
+    """Значение считается при каждом сборе метрик (set_function)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} failed: {e}")
+        return self._value
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name} {self.get():g}"]
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[List[int], float, int]]:
+        with self._lock:
+            return {key: (list(s.counts), s.total, s.count) for key, s in self._series.items()}
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Оценка квантиля по границам корзин (верхняя граница корзины, как histogram_quantile)"""
+        series = self.snapshot().get(self._key(labels))
+        if not series or not series[2]:
+            return None
+        counts, _, count = series
+        rank, seen = q * count, 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound if bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.register(Histogram(
+    "mybot_handler_duration_seconds", "Время работы обработчика Telegram-обновления", ["handler"]))
+STAGE_SECONDS = registry.register(Histogram(
+    "mybot_stage_duration_seconds", "Время этапа публикации (превью, отправка в канал)", ["stage"]))
+PARSE_SECONDS = registry.register(Histogram(
+    "mybot_parse_duration_seconds", "Разбор страницы объявления без загрузки", ["path"]))
+FETCH_SECONDS = registry.register(Histogram(
+    "mybot_fetch_duration_seconds", "Загрузка страницы объявления", ["status"]))
+API_SECONDS = registry.register(Histogram(
+    "mybot_telegram_request_duration_seconds", "Время запроса к Bot API", ["method"]))
+API_BYTES = registry.register(Histogram(
+    "mybot_telegram_request_bytes", "Размер запроса к Bot API (параметры и файлы)", ["method"], BYTES_BUCKETS))
+UPLOAD_BYTES = registry.register(Histogram(
+    "mybot_upload_bytes", "Загружено файлов за запрос по получателю", ["destination"], BYTES_BUCKETS))
+API_RESPONSES = registry.register(Counter(
+    "mybot_telegram_responses_total", "Ответы Bot API по методу и HTTP-коду", ["method", "code"]))
+ERRORS = registry.register(Counter(
+    "mybot_errors_total", "Ошибки по месту и типу исключения", ["where", "type"]))
+ACTIVE_SESSIONS = registry.register(Gauge(
+    "mybot_active_sessions", "Активные сессии пользователей"))
+PENDING_UPDATES = registry.register(Gauge(
+    "mybot_pending_updates", "Обновления в очередях чатов, еще не обработанные"))
+UPDATE_WAIT_SECONDS = registry.register(Histogram(
+    "mybot_update_wait_seconds", "Ожидание обновления в очереди чата до обработчика"))
+UPDATES_REJECTED = registry.register(Counter(
+    "mybot_updates_rejected_total", "Обновления, отклоненные из-за переполненной очереди чата"))
+SEND_API_CALLS = registry.register(Histogram(
+    "mybot_send_api_calls", "Запросов к Bot API на одну публикацию в канал", (), (1, 2, 3, 4, 5, 7, 10, 15, 20)))
+FANOUT_COPIES = registry.register(Counter(
+    "mybot_fanout_copies_total", "Публикации в канал копированием (copyMessages) и откаты на полную отправку", ["result"]))
+FANOUT_CALLS_SAVED = registry.register(Counter(
+    "mybot_fanout_calls_saved_total", "Запросов к Bot API сэкономлено копированием поста"))
+FANOUT_BYTES_SAVED = registry.register(Counter(
+    "mybot_fanout_bytes_saved_total", "Байт не отправлено в Bot API благодаря копированию поста"))
+BULK_LINKS = registry.register(Counter(
+    "mybot_bulk_links_total", "Ссылки из массовой загрузки: черновик готов или ошибка разбора", ["result"]))
+PREVIEW_UPDATES = registry.register(Counter(
+    "mybot_preview_updates_total", "Обновления превью: правка на месте, медиа заново или все заново", ["mode"]))
+PREVIEW_BYTES_SAVED = registry.register(Histogram(
+    "mybot_preview_bytes_saved", "Байт не отправлено благодаря правке превью на месте", (), BYTES_BUCKETS))
+
+
+def record_error(where: str, error: BaseException):
+    ERRORS.inc(where=where, type=type(error).__name__)
+
+
+def _payload_size(params, files) -> Tuple[int, int]:
+    """(байт параметров, байт файлов) запроса к Bot API"""
+    params_size = sum(len(str(key)) + len(str(value)) + 2 for key, value in (params or {}).items())
+    files_size = 0
+    for value in (files or {}).values():
+        file_obj = value[1] if isinstance(value, tuple) else value
+        if isinstance(file_obj, (bytes, bytearray)):
+            files_size += len(file_obj)
+        elif hasattr(file_obj, "seek") and hasattr(file_obj, "tell"):
+            try:
+                position = file_obj.tell()
+                file_obj.seek(0, 2)
+                files_size += file_obj.tell()
+                file_obj.seek(position)
+            except (OSError, ValueError):
+                pass
+    return params_size, files_size
+
+
+def destination_label(chat_id) -> str:
+    """Каналы и группы - по id, личные чаты - одной меткой (иначе метрик будет по числу пользователей)"""
+    text = str(chat_id)
+    return text if text.startswith(("@", "-")) else "private"
+
+
+def observe_api_call(method: str, seconds: float, status_code: int, chat_id=None, params=None, files=None):
+    params_size, files_size = _payload_size(params, files)
+    API_SECONDS.observe(seconds, method=method)
+    API_BYTES.observe(params_size + files_size, method=method)
+    API_RESPONSES.inc(method=method, code=str(status_code))
+    if files_size:
+        UPLOAD_BYTES.observe(files_size, destination=destination_label(chat_id))
+
+
+def summary() -> str:
+    """Короткая сводка для /status"""
+
+    def p95(histogram: Histogram, **labels) -> str:
+        value = histogram.quantile(0.95, **labels)
+        return f"{value:g} с" if value is not None else "-"
+
+    handlers = sorted(HANDLER_SECONDS.snapshot().items(), key=lambda item: -item[1][1])[:3]
+    slowest = ", ".join(f"{key[0]} p95 {p95(HANDLER_SECONDS, handler=key[0])}" for key, _ in handlers) or "-"
+    api_calls = sum(count for _, _, count in API_SECONDS.snapshot().values())
+    uploaded = sum(total for _, total, _ in UPLOAD_BYTES.snapshot().values())
+    send_calls, sends = next(((total, count) for _, total, count in SEND_API_CALLS.snapshot().values()), (0.0, 0))
+    return (
+        f"Больше всего времени: {slowest}\n"
+        f"Запросов к Bot API: {api_calls}, загружено {uploaded / 1_000_000:.1f} МБ, "
+        f"на публикацию в канал: {send_calls / sends if sends else 0:.1f}, "
+        f"ошибок: {ERRORS.total():.0f}"
+    )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """HTTP /metrics в фоновом потоке (режим long polling; в webhook-режиме есть маршрут Flask)"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Metrics available on :{port}/metrics")
+    return server
@@ -0,0 +1,169 @@
+import json
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# <script type="application/ld+json">...</script> - разметка schema.org
+_LD_JSON_RE = re.compile(
+    rb"""<script[^>]*type\s*=\s*["']application/ld\+json["'][^>]*>(.*?)</script>""",
+    re.IGNORECASE | re.DOTALL,
+)
+# Состояние Nuxt/Vue, если оно записано обычным JSON:
+# window.__NUXT__ = {...}; window.__INITIAL_STATE__ = {...}; <script id="__NUXT_DATA__">...</script>
+_STATE_ASSIGN_RE = re.compile(rb"window\.(?:__NUXT__|__INITIAL_STATE__)\s*=\s*")
+_NUXT_DATA_RE = re.compile(
+    rb"""<script[^>]*id\s*=\s*["']__NUXT_DATA__["'][^>]*>(.*?)</script>""",
+    re.IGNORECASE | re.DOTALL,
+)
+_MARKERS = (b"application/ld+json", b"__NUXT__", b"__INITIAL_STATE__", b"__NUXT_DATA__")
+_DEVALUE_WRAPPERS = {"Reactive", "ShallowReactive", "Ref", "ShallowRef"}
+
+_decoder = json.JSONDecoder()
+
+
+def _to_bytes(text: Union[str, bytes], encoding: Optional[str]) -> bytes:
+    if isinstance(text, bytes):
+        return text
+    return text.encode(encoding or "utf-8", errors="replace")
+
+
+def _decode(raw: bytes, encoding: Optional[str]) -> str:
+    return raw.decode(encoding or "utf-8", errors="replace").strip()
+
+
+def _walk(node: Any) -> Iterator[Dict[str, Any]]:
+    """Все словари внутри JSON, включая @graph и вложенные списки"""
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            yield item
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+
+def _is_product(node: Dict[str, Any]) -> bool:
+    kind = node.get("@type")
+    kinds = kind if isinstance(kind, list) else [kind]
+    return "Product" in kinds and bool(node.get("name") or node.get("brand"))
+
+
+def _title(value: Any) -> str:
+    if isinstance(value, dict):
+        value = value.get("title") or value.get("name")
+    return value if isinstance(value, str) else ""
+
+
+def _is_listing(node: Dict[str, Any]) -> bool:
+    """
+    Объявление в состоянии Nuxt: схемы schema.org там нет, узнаем по тем же полям, что читает
+    разбор разметки - бренд (catalog-item--brand-title), фото (catalog-item--photos) и модель,
+    референс или характеристики (option-label/option-value).
+    """
+    photos = node.get("photos")
+    return (bool(_title(node.get("brand"))) and isinstance(photos, list) and bool(photos)
+            and any(node.get(key) for key in ("model", "reference", "options")))
+
+
+def _listing_product(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Объявление из состояния Nuxt в виде schema.org Product - дальше разбирается как JSON-LD"""
+    brand, model = _title(node.get("brand")), _title(node.get("model"))
+    photos = [photo if isinstance(photo, str) else (photo.get("full") or photo.get("url") or photo.get("src"))
+              for photo in node["photos"] if isinstance(photo, (str, dict))]
+    options = [option for option in node.get("options") or [] if isinstance(option, dict)]
+    return {
+        "@type": "Product",
+        "name": " ".join(filter(None, (brand, model))),
+        "brand": brand,
+        "model": model,
+        "sku": node.get("reference"),
+        "image": [photo for photo in photos if isinstance(photo, str)],
+        "offers": {"price": node.get("price"), "priceCurrency": node.get("currency") or "RUB"},
+        "itemCondition": node.get("condition"),
+        "additionalProperty": [{"name": option.get("label") or option.get("name"), "value": option.get("value")}
+                               for option in options],
+    }
+
+
+def _find_product(data: Any) -> Optional[Dict[str, Any]]:
+    for node in _walk(data):
+        if _is_product(node):
+            return node
+        if _is_listing(node):
+            return _listing_product(node)
+    return None
+
+
+def _unflatten(values: List[Any]) -> Any:
+    """
+    __NUXT_DATA__ (Nuxt 3) записан через devalue: плоский массив, корень - values[0],
+    числа внутри объектов и списков - индексы в массиве. Обертки ["Reactive", i], ["Ref", i]
+    и т.п. раскрываются, остальные типы (Set, Map, Date...) для поиска товара не нужны.
+    """
+    hydrated: Dict[int, Any] = {}
+
+    def hydrate(index: Any) -> Any:
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(values):
+            return None  # -1 undefined, -2 дырка, -3 NaN и т.п.
+        if index in hydrated:
+            return hydrated[index]
+        value = values[index]
+        if isinstance(value, dict):
+            result = hydrated[index] = {}
+            result.update((key, hydrate(item)) for key, item in value.items())
+        elif isinstance(value, list) and value and isinstance(value[0], str):
+            hydrated[index] = None
+            if value[0] in _DEVALUE_WRAPPERS and len(value) > 1:
+                hydrated[index] = hydrate(value[1])
+            result = hydrated[index]
+        elif isinstance(value, list):
+            result = hydrated[index] = []
+            result.extend(hydrate(item) for item in value)
+        else:
+            result = hydrated[index] = value
+        return result
+
+    return hydrate(0)
+
+
+def _json_blobs(raw: bytes, encoding: Optional[str]) -> Iterator[Any]:
+    for match in _LD_JSON_RE.finditer(raw):
+        try:
+            yield json.loads(_decode(match.group(1), encoding))
+        except ValueError as e:
+            logger.debug(f"Битый JSON-LD на странице: {e}")
+
+    for match in _NUXT_DATA_RE.finditer(raw):
+        try:
+            data = json.loads(_decode(match.group(1), encoding))
+        except ValueError:
+            continue
+        yield _unflatten(data) if isinstance(data, list) else data
+
+    for match in _STATE_ASSIGN_RE.finditer(raw):
+        # Дальше идет объектный литерал; если это не чистый JSON (например, IIFE Nuxt 2) - пропускаем
+        tail = _decode(raw[match.end():match.end() + 2_000_000], encoding)
+        try:
+            value, _ = _decoder.raw_decode(tail)
+            yield value
+        except ValueError:
+            pass
+
+
+def extract_product(text: Union[str, bytes], encoding: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Запись о товаре (schema.org Product) из встроенного в страницу JSON или None.
+    Объявление из состояния Nuxt приводится к тому же виду (см. _listing_product).
+    Сначала дешевая проверка подстрок, чтобы на страницах без JSON не запускать регулярки.
+    """
+    raw = _to_bytes(text, encoding)
+    if not any(marker in raw for marker in _MARKERS):
+        return None
+    for blob in _json_blobs(raw, encoding):
+        product = _find_product(blob)
+        if product is not None:
+            return product
+    return None
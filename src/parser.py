@@ -1,161 +1,562 @@
+import asyncio
+import aiohttp
 import requests
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
 from urllib.parse import urljoin
-from typing import List
-from config import settings, CONTACTS
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from .config import settings, CONTACTS
+from .http_pool import DEFAULT_HEADERS
+from .async_http import get_async_http_session
+from .listing_cache import ListingCache, CachedListing
+from .page_state import extract_product
+from .metrics import FETCH_SECONDS, PARSE_SECONDS
+from .tracing import span
 import re
+import threading
+import time
+from collections import Counter
 
 
 
 
 logger = logging.getLogger(__name__)
 
+ParseResult = Tuple[str, List[str]]
+
+CHARACTERISTIC_KEYS = (
+    "Тип",
+    "Материал корпуса",
+    "Водонепроницаемость",
+    "Диаметр корпуса",
+    "Цвет циферблата",
+    "Безель",
+    "Механизм",
+    "Функции",
+    "Запас хода",
+    "Калибр",
+    "Материал ремешка",
+    "Комплектация",
+    "Состояние",
+    "Стекло",
+)
+_LOWER_KEYS = tuple((key, key.lower()) for key in CHARACTERISTIC_KEYS)
+
+
+def default_characteristics() -> Dict[str, str]:
+    return {key: "Нет данных" for key in CHARACTERISTIC_KEYS}
+
+
+@lru_cache(maxsize=1024)
+def match_characteristics(label_text: str) -> Tuple[str, ...]:
+    """
+    Какие характеристики соответствуют метке (метка в нижнем регистре).
+    Метки повторяются от страницы к странице, поэтому ответ кэшируется.
+    """
+    return tuple(key for key, lower in _LOWER_KEYS if lower in label_text)
+
+
+@dataclass
+class ListingFields:
+    title: str = "Название не найдено"
+    subtitle: str = ""
+    reference: str = "Нет данных"
+    price: str = "По запросу"
+    condition: str = "Состояние неизвестно"
+    characteristics: Dict[str, str] = field(default_factory=default_characteristics)
+    photos: List[str] = field(default_factory=list)
+
+
+def _class_test(name: str) -> str:
+    """XPath-аналог CSS-селектора .name"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_XP_TITLE = etree.XPath(f"(//a[{_class_test('catalog-item--brand-title')}])[1]")
+_XP_SUBTITLE = etree.XPath(f"(//div[{_class_test('catalog-item--model')}])[1]")
+_XP_REFERENCE = etree.XPath(f"(//div[{_class_test('text-gray')}])[1]")
+_XP_PRICE = etree.XPath(f"(//p[{_class_test('item-price--text')}])[1]")
+_XP_CONDITION = etree.XPath(f"(//div[{_class_test('flex-shrink-0')}])[1]")
+_XP_OPTION_ROWS = etree.XPath("//div[" + " and ".join(
+    _class_test(name)
+    for name in ("d-block", "d-sm-flex", "flex-nowrap", "justify-space-between", "align-baseline", "my-2")
+) + "]")
+_XP_OPTION_LABEL = etree.XPath(f"(.//div[{_class_test('option-label')}])[1]")
+_XP_OPTION_VALUE = etree.XPath(f"(.//div[{_class_test('option-value')}])[1]")
+_XP_PHOTO_SRC = etree.XPath(f"//div[{_class_test('catalog-item--photos__grid')}]//img/@src", smart_strings=False)
+
+# Текст этих тегов BeautifulSoup не включает в get_text()
+_SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+
+def _first(nodes):
+    return nodes[0] if nodes else None
+
+
+def _node_text(element) -> str:
+    """Аналог Tag.get_text(strip=True) из BeautifulSoup"""
+    strings = []
+
+    def visit(node):
+        if node.text:
+            strings.append(node.text)
+        for child in node:
+            # Комментарии пропускаем, но их tail - обычный текст
+            if isinstance(child.tag, str) and child.tag not in _SKIP_TEXT_TAGS:
+                visit(child)
+            if child.tail:
+                strings.append(child.tail)
+
+    visit(element)
+    return "".join(s.strip() for s in strings if s.strip())
+
+
+def _build_tree(text: Union[str, bytes], encoding: Optional[str] = None):
+    if isinstance(text, bytes):
+        return lxml.html.document_fromstring(text, parser=lxml.html.HTMLParser(encoding=encoding))
+    try:
+        return lxml.html.document_fromstring(text)
+    except ValueError:
+        # Строка с XML-объявлением кодировки - lxml принимает такие только байтами
+        return lxml.html.document_fromstring(text.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+
+def _response_body(response: requests.Response) -> Tuple[Union[str, bytes], Optional[str]]:
+    """
+    Тело ответа для разбора: байты и кодировка, если кодировка известна из заголовков,
+    иначе уже декодированный response.text (requests угадывает кодировку сам)
+    """
+    content = getattr(response, "content", None)
+    encoding = getattr(response, "encoding", None)
+    if isinstance(content, bytes) and isinstance(encoding, str):
+        return content, encoding
+    return response.text, None
+
+
+def collect_photos(sources: Iterable[Optional[str]], url: str) -> List[str]:
+    """Абсолютные ссылки на фото без дублей, заглушек и data:image, не больше 10"""
+    photos = []
+    seen_urls = set()
+    for src_attr in sources:
+        if src_attr:
+            src_str = str(src_attr).split("?")[0].strip()
+            if (src_str and 
+                "noimage" not in src_str.lower() and 
+                not src_str.startswith("data:image")):
+                
+                # Преобразуем относительный URL в абсолютный
+                full_url = urljoin(url, src_str)
+                
+                if full_url not in seen_urls:
+                    seen_urls.add(full_url)
+                    photos.append(full_url)
+                    logger.debug(f"Добавлено фото: {full_url}")
+
+    # Ограничиваем количество фото
+    return photos[:10]
+
+
+def render_listing(url: str, fields: ListingFields) -> ParseResult:
+    """Текст поста в HTML по извлеченным полям, возврат (html, photos)"""
+    characteristics = fields.characteristics
+    safe_reference = fields.reference.replace('.', '.\u200B')
+
+    if fields.price == "По запросу":
+        match = re.search(r'(\d[\d\s,.]*\s?\$)', characteristics.get('Состояние', ''))
+        price_to_use = match.group(1) if match else fields.price
+    else:
+        price_to_use = fields.price
+
+    # Формируем список важных характеристик, пропуская пустые и "Нет данных"
+    important_chars = [
+        ("Материал корпуса", characteristics["Материал корпуса"]),
+        ("Водонепроницаемость", characteristics["Водонепроницаемость"]),
+        ("Диаметр", characteristics["Диаметр корпуса"]),
+        ("Материал ремешка", characteristics["Материал ремешка"]),
+    ]
+
+    # Фильтруем только заполненные характеристики
+    char_line = [
+        f'<b>{key}:</b> {value}'
+        for key, value in important_chars
+        if value and value.strip() and value != "Нет данных"
+    ]
+
+    # Добавляем блок характеристик, если есть данные
+    characteristics_block = [*char_line, ""] if char_line else []
+
+    # Формируем HTML
+    lines = [
+        f'<a href="{url}"><b>{fields.title}</b>  <b>{fields.subtitle.upper()}</b></a>',
+        f'<code>{safe_reference}</code>\n',
+        f'<b>Состояние:</b> {fields.condition}',
+        *characteristics_block,
+    ]
+    for c in CONTACTS:
+        lines.append(c["address"])
+        if "tel" in c:
+            lines.append(f'tel:{c["tel"]} | <a href="{c["wa_link"]}">WhatsApp</a>')
+        lines.append("")
+
+    html = "\n".join(lines)
+    return html.strip(), list(fields.photos)
+
+
+# Состояние товара в schema.org -> текст, как на странице
+_ITEM_CONDITIONS = {
+    "NewCondition": "Новое",
+    "UsedCondition": "Б/у",
+    "RefurbishedCondition": "После восстановления",
+    "DamagedCondition": "Требует ремонта",
+}
+
+# Какой путь обслужил разбор: "state" - встроенный JSON, "dom" - разбор разметки
+extraction_paths: Counter = Counter()
+_paths_lock = threading.Lock()
+
+
+def _count_path(path: str):
+    with _paths_lock:
+        extraction_paths[path] += 1
+
+
+def extraction_stats() -> Dict[str, int]:
+    with _paths_lock:
+        return {"state": extraction_paths["state"], "dom": extraction_paths["dom"]}
+
+
+_REFERENCE_PREFIX_RE = re.compile(r"^(?:ref|референс|артикул)\.?\s*:?\s*", re.IGNORECASE)
+
+
+def normalize_reference(text: str) -> str:
+    """Референс из встроенного JSON ("124060") в том виде, как он написан на странице ("Ref. 124060")"""
+    reference = _REFERENCE_PREFIX_RE.sub("", " ".join(text.split()))
+    return f"Ref. {reference}" if reference else ""
+
+
+def _state_text(value) -> str:
+    """Строка из значения JSON: {"name": ...}, список или скаляр"""
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return _state_text(value.get("name") or value.get("value"))
+    if isinstance(value, list):
+        return ", ".join(filter(None, (_state_text(item) for item in value)))
+    return " ".join(str(value).split())
+
+
+def _state_images(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [value.get("contentUrl") or value.get("url") or ""]
+    if isinstance(value, list):
+        return [src for item in value for src in _state_images(item)]
+    return []
+
+
+def _state_price(offers) -> Optional[str]:
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if not isinstance(offers, dict) or offers.get("price") in (None, ""):
+        return None
+    price, currency = offers["price"], offers.get("priceCurrency", "RUB")
+    try:
+        amount = f"{int(float(price)):,}".replace(",", " ")
+    except (TypeError, ValueError):
+        return _state_text(price)
+    return f"{amount} {'₽' if currency == 'RUB' else currency}"
+
+
+def fields_from_product(product: Dict, url: str) -> Optional[ListingFields]:
+    """
+    Поля объявления из встроенной записи о товаре (см. src.page_state).
+    None, если записи не хватает для поста - тогда разбираем разметку.
+    """
+    brand = _state_text(product.get("brand"))
+    name = _state_text(product.get("name"))
+    photos = collect_photos(_state_images(product.get("image")), url)
+    if not (brand or name) or not photos:
+        return None
+
+    fields = ListingFields(title=brand or name, photos=photos)
+    model = _state_text(product.get("model"))
+    if model:
+        fields.subtitle = model
+    elif brand and name.lower().startswith(brand.lower()):
+        fields.subtitle = name[len(brand):].strip()
+    elif brand and name != brand:
+        fields.subtitle = name
+
+    reference = normalize_reference(_state_text(product.get("sku") or product.get("mpn")))
+    if reference:
+        fields.reference = reference
+
+    price = _state_price(product.get("offers"))
+    if price:
+        fields.price = price
+
+    for prop in product.get("additionalProperty") or []:
+        if not isinstance(prop, dict):
+            continue
+        value_text = _state_text(prop.get("value"))
+        for key in match_characteristics(_state_text(prop.get("name")).lower()):
+            fields.characteristics[key] = value_text
+
+    condition = _state_text(product.get("itemCondition")).rsplit("/", 1)[-1]
+    if fields.characteristics["Состояние"] != "Нет данных":
+        fields.condition = fields.characteristics["Состояние"]
+    elif condition:
+        fields.condition = _ITEM_CONDITIONS.get(condition, condition)
+    return fields
+
+
 class LombardParser:
-    def parse(self, url: str):
+    def __init__(self, http: Optional[requests.Session] = None, cache: Optional[ListingCache] = None,
+                 engine: Optional[str] = None):
+        # http - общая сессия с пулом соединений (src.http_pool.get_http_session);
+        # без нее каждый запрос идет через requests.get с новым соединением.
+        # cache - кэш результатов парсинга (src.listing_cache.listing_cache).
+        # engine - "lxml" (по умолчанию) или "bs4", см. settings.parser_engine
+        self.http = http
+        self.cache = cache
+        self.engine = engine or settings.parser_engine
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Загрузка страницы"""
+        get = self.http.get if self.http is not None else requests.get
+        response = get(url, headers={**DEFAULT_HEADERS, **(headers or {})}, timeout=30)
+        response.raise_for_status()
+        return response
+
+    def parse(self, url: str) -> ParseResult:
         """Парсинг страницы, возврат (html, photos)"""
-        html, photos = "", []
+        cached, result = self._lookup(url)
+        if result is not None:
+            return result
+
+        fetch_started = time.monotonic()
         try:
             logger.info(f"Парсинг страницы: {url}")
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "lxml")
-
-            # Основные данные
-            title_tag = soup.find("a", class_="catalog-item--brand-title")
-            title = title_tag.get_text(strip=True) if title_tag else "Название не найдено"
-
-            subtitle_tag = soup.select_one("div.catalog-item--model")
-            subtitle = subtitle_tag.get_text(strip=True) if subtitle_tag else ""
-
-            ref_tag = soup.find("div", class_="text-gray")
-            reference = ref_tag.get_text(strip=True) if ref_tag else "Нет данных"
-            safe_reference = reference.replace('.', '.\u200B')
-
-            price_tag = soup.find("p", class_="item-price--text")
-            price = "По запросу"
-            if price_tag:
-                price_text = price_tag.get_text(strip=True)
-                if price_text and price_text.strip():
-                    price = price_text
-
-            condition_tag = soup.find("div", class_="flex-shrink-0")
-            condition = (
-                condition_tag.get_text(strip=True)
-                if condition_tag
-                else "Состояние неизвестно"
-            )
-
-            # Характеристики
-            characteristics = {
-                "Тип": "Нет данных",
-                "Материал корпуса": "Нет данных",
-                "Водонепроницаемость": "Нет данных",
-                "Диаметр корпуса": "Нет данных",
-                "Цвет циферблата": "Нет данных",
-                "Безель": "Нет данных",
-                "Механизм": "Нет данных",
-                "Функции": "Нет данных",
-                "Запас хода": "Нет данных",
-                "Калибр": "Нет данных",
-                "Материал ремешка": "Нет данных",
-                "Комплектация": "Нет данных",
-                "Состояние": "Нет данных",
-                "Стекло": "Нет данных",
-            }
-
-            # Парсим характеристики
-            for row in soup.select(
-                "div.d-block.d-sm-flex.flex-nowrap.justify-space-between.align-baseline.my-2"
-            ):
-                label = row.find("div", class_="option-label")
-                value = row.find("div", class_="option-value")
-                if label and value:
-                    label_text = label.get_text(strip=True).lower()
-                    value_text = value.get_text(strip=True)
-                    for key in characteristics:
-                        if key.lower() in label_text:
-                            characteristics[key] = value_text
-
-            # Собираем фото
-            img_tags = soup.select("div.catalog-item--photos__grid img")
-            seen_urls = set()
-            
-            for img in img_tags:
-                src_attr = img.get("src")
-                if src_attr:
-                    src_str = str(src_attr).split("?")[0].strip()
-                    if (src_str and 
-                        "noimage" not in src_str.lower() and 
-                        not src_str.startswith("data:image")):
-                        
-                        # Преобразуем относительный URL в абсолютный
-                        full_url = urljoin(url, src_str)
-                        
-                        if full_url not in seen_urls:
-                            seen_urls.add(full_url)
-                            photos.append(full_url)
-                            logger.debug(f"Добавлено фото: {full_url}")
-
-            # Ограничиваем количество фото
-            photos = photos[:10]
-            # убираем дубликаты без custom_photos
-            # photos = list(dict.fromkeys(photos))[:3]
-
-            if price == "По запросу":
-                match = re.search(r'(\d[\d\s,.]*\s?\$)', characteristics.get('Состояние', ''))
-                price_to_use = match.group(1) if match else price
-            else:
-                price_to_use = price
-
-            # Формируем список важных характеристик, пропуская пустые и "Нет данных"
-            important_chars = [
-                ("Материал корпуса", characteristics["Материал корпуса"]),
-                ("Водонепроницаемость", characteristics["Водонепроницаемость"]),
-                ("Диаметр", characteristics["Диаметр корпуса"]),
-                ("Материал ремешка", characteristics["Материал ремешка"]),
-            ]
-
-            # Фильтруем только заполненные характеристики
-            char_line = [
-                f'<b>{key}:</b> {value}'
-                for key, value in important_chars
-                if value and value.strip() and value != "Нет данных"
-            ]
-
-            # Добавляем блок характеристик, если есть данные
-            characteristics_block = [*char_line, ""] if char_line else []
-
-            # Формируем HTML
-            lines = [
-                f'<a href="{url}"><b>{title}</b>  <b>{subtitle.upper()}</b></a>',
-                f'<code>{safe_reference}</code>\n',
-                f'<b>Состояние:</b> {condition}',
-                *characteristics_block,
-            ]
-            for c in CONTACTS:
-                lines.append(c["address"])
-                if "tel" in c:
-                    lines.append(f'tel:{c["tel"]} | <a href="{c["wa_link"]}">WhatsApp</a>')
-                lines.append("")
-                
-    
+            conditional = cached.conditional_headers() if cached else None
+            with span("fetch", url=url, conditional=bool(conditional)) as fields:
+                response = self.fetch(url, headers=conditional)
+                fields["status_code"] = response.status_code
+        except requests.exceptions.RequestException as e:
+            FETCH_SECONDS.observe(time.monotonic() - fetch_started, status="error")
+            logger.error(f"Ошибка сети при парсинге {url}: {e}")
+            raise
+        FETCH_SECONDS.observe(time.monotonic() - fetch_started, status=str(response.status_code))
 
-            html = "\n".join(lines)
-            
+        if cached and response.status_code == 304:
+            return self._not_modified(url, cached)
+        body, encoding = _response_body(response)
+        return self._complete(url, body, encoding, response.headers)
 
+    async def parse_async(self, url: str) -> ParseResult:
+        """
+        То же, что parse, но загрузка через aiohttp (режим asyncio): ожидание сайта не держит поток.
+        Сам разбор короткий (lxml, единицы мс) и идет в цикле событий.
+        """
+        cached, result = self._lookup(url)
+        if result is not None:
+            return result
 
-        except requests.exceptions.RequestException as e:
+        fetch_started = time.monotonic()
+        try:
+            logger.info(f"Парсинг страницы: {url}")
+            conditional = cached.conditional_headers() if cached else None
+            http = await get_async_http_session()
+            with span("fetch", url=url, conditional=bool(conditional)) as fields:
+                async with http.get(url, headers=conditional, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                    fields["status_code"] = response.status
+                    response.raise_for_status()
+                    encoding = response.charset
+                    body = await response.read() if encoding else await response.text(errors="replace")
+                    status, headers = response.status, response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            FETCH_SECONDS.observe(time.monotonic() - fetch_started, status="error")
             logger.error(f"Ошибка сети при парсинге {url}: {e}")
             raise
+        FETCH_SECONDS.observe(time.monotonic() - fetch_started, status=str(status))
+
+        if cached and status == 304:
+            return self._not_modified(url, cached)
+        return self._complete(url, body, encoding, headers)
+
+    def _lookup(self, url: str) -> Tuple[Optional[CachedListing], Optional[ParseResult]]:
+        """Запись кэша для условного запроса и готовый результат, если она еще свежая"""
+        if self.cache is None:
+            return None, None
+        cached, fresh = self.cache.lookup(url)
+        if cached and fresh:
+            logger.info(f"Страница из кэша: {url}")
+            return cached, (cached.html, list(cached.photos))
+        return cached, None
+
+    def _not_modified(self, url: str, cached: CachedListing) -> ParseResult:
+        logger.info(f"Страница не изменилась (304): {url}")
+        self.cache.mark_not_modified(url)
+        return cached.html, list(cached.photos)
+
+    def _complete(self, url: str, body: Union[str, bytes], encoding: Optional[str], headers) -> ParseResult:
+        with span("parse", engine=self.engine, bytes=len(body)):
+            html, photos = self.parse_html(body, url, encoding)
+        if self.cache is not None:
+            self.cache.put(url, CachedListing(
+                html=html,
+                photos=list(photos),
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
+            ))
+        return html, photos
+
+    async def parse_many(self, urls: List[str], concurrency: Optional[int] = None,
+                         on_done: Optional[Callable[[int, Union[ParseResult, Exception]], Awaitable[None]]] = None,
+                         ) -> List[Union[ParseResult, Exception]]:
+        """
+        Параллельный парсинг нескольких страниц через parse_async (общая aiohttp-сессия).
+        Одновременно выполняется не больше concurrency загрузок; результат для каждой
+        ссылки - (html, photos) или исключение, порядок совпадает с urls.
+        on_done(index, result) вызывается по мере готовности страниц (прогресс массовой загрузки).
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.parser_concurrency)
+
+        async def parse_one(index: int, url: str) -> ParseResult:
+            async with semaphore:
+                try:
+                    result = await self.parse_async(url)
+                except Exception as e:
+                    result = e
+            if on_done:
+                await on_done(index, result)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return await asyncio.gather(*(parse_one(i, url) for i, url in enumerate(urls)), return_exceptions=True)
+
+    def parse_html(self, text: Union[str, bytes], url: str, encoding: Optional[str] = None) -> ParseResult:
+        """
+        Разбор уже загруженной страницы, возврат (html, photos).
+        text - строка или байты ответа (тогда декодируются один раз внутри lxml по encoding)
+        """
+        started = time.monotonic()
+        try:
+            if settings.parser_state_fast_path:
+                product = extract_product(text, encoding)
+                fields = fields_from_product(product, url) if product else None
+                if fields is not None:
+                    _count_path("state")
+                    logger.debug(f"Данные из встроенного JSON: {url}")
+                    result = render_listing(url, fields)
+                    PARSE_SECONDS.observe(time.monotonic() - started, path="state")
+                    return result
+            _count_path("dom")
+            if self.engine == "bs4":
+                if isinstance(text, bytes):
+                    text = text.decode(encoding or "utf-8", errors="replace")
+                fields = self._extract_soup(text, url)
+            else:
+                fields = self._extract_lxml(text, url, encoding)
+            result = render_listing(url, fields)
+            PARSE_SECONDS.observe(time.monotonic() - started, path=f"dom_{self.engine}")
+            return result
         except Exception as e:
             logger.error(f"Неожиданная ошибка при парсинге {url}: {e}")
             raise
 
-        return html.strip(), photos
+    def _extract_soup(self, text: str, url: str) -> ListingFields:
+        """Исходный движок на BeautifulSoup (settings.parser_engine = "bs4")"""
+        fields = ListingFields()
+        soup = BeautifulSoup(text, "lxml")
+
+        # Основные данные
+        title_tag = soup.find("a", class_="catalog-item--brand-title")
+        if title_tag:
+            fields.title = title_tag.get_text(strip=True)
+
+        subtitle_tag = soup.select_one("div.catalog-item--model")
+        if subtitle_tag:
+            fields.subtitle = subtitle_tag.get_text(strip=True)
+
+        ref_tag = soup.find("div", class_="text-gray")
+        if ref_tag:
+            fields.reference = ref_tag.get_text(strip=True)
+
+        price_tag = soup.find("p", class_="item-price--text")
+        if price_tag:
+            price_text = price_tag.get_text(strip=True)
+            if price_text and price_text.strip():
+                fields.price = price_text
+
+        condition_tag = soup.find("div", class_="flex-shrink-0")
+        if condition_tag:
+            fields.condition = condition_tag.get_text(strip=True)
+
+        # Парсим характеристики
+        for row in soup.select(
+            "div.d-block.d-sm-flex.flex-nowrap.justify-space-between.align-baseline.my-2"
+        ):
+            label = row.find("div", class_="option-label")
+            value = row.find("div", class_="option-value")
+            if label and value:
+                label_text = label.get_text(strip=True).lower()
+                value_text = value.get_text(strip=True)
+                for key in fields.characteristics:
+                    if key.lower() in label_text:
+                        fields.characteristics[key] = value_text
+
+        # Собираем фото
+        fields.photos = collect_photos((img.get("src") for img in soup.select("div.catalog-item--photos__grid img")), url)
+        return fields
+
+    def _extract_lxml(self, text: Union[str, bytes], url: str, encoding: Optional[str] = None) -> ListingFields:
+        """
+        Движок на lxml: одно дерево, заранее скомпилированные XPath,
+        характеристики через таблицу соответствия меток.
+        Результат совпадает с _extract_soup байт в байт.
+        """
+        fields = ListingFields()
+        root = _build_tree(text, encoding)
+
+        title = _first(_XP_TITLE(root))
+        if title is not None:
+            fields.title = _node_text(title)
+
+        subtitle = _first(_XP_SUBTITLE(root))
+        if subtitle is not None:
+            fields.subtitle = _node_text(subtitle)
+
+        reference = _first(_XP_REFERENCE(root))
+        if reference is not None:
+            fields.reference = _node_text(reference)
+
+        price = _first(_XP_PRICE(root))
+        if price is not None:
+            price_text = _node_text(price)
+            if price_text and price_text.strip():
+                fields.price = price_text
+
+        condition = _first(_XP_CONDITION(root))
+        if condition is not None:
+            fields.condition = _node_text(condition)
+
+        for row in _XP_OPTION_ROWS(root):
+            label = _first(_XP_OPTION_LABEL(row))
+            value = _first(_XP_OPTION_VALUE(row))
+            if label is not None and value is not None:
+                value_text = _node_text(value)
+                for key in match_characteristics(_node_text(label).lower()):
+                    fields.characteristics[key] = value_text
+
+        fields.photos = collect_photos(_XP_PHOTO_SRC(root), url)
+        return fields
+
     def get_custom_photos(self) -> List[str]:
         """Получить список кастомных фото"""
         return settings.custom_photos.copy()
@@ -0,0 +1,146 @@
+"""
+Превью поста правится на месте: после правки текста, перестановки или удаления медиа бот
+редактирует уже отправленные сообщения превью, а не шлет весь пост заново.
+Здесь общая для синхронного и asyncio режимов часть: подписи, план правок и учет сэкономленных байт.
+Сами вызовы Bot API делает publishing.update_preview (в обоих режимах).
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from telebot.types import InputFile, InputMediaPhoto, InputMediaVideo
+
+from .albums import is_postable, media_payload
+from .metrics import PREVIEW_BYTES_SAVED, PREVIEW_UPDATES
+from .session import MediaData, UserSession
+
+logger = logging.getLogger(__name__)
+
+# (метод бота, аргументы, медиа, file_id которого нужно запомнить после загрузки)
+PreviewCall = Tuple[str, Dict[str, Any], Optional[MediaData]]
+
+
+def preview_text(session: UserSession) -> str:
+    text = f"TEXT PREVIEW:\n\n{session.text}\n\n"
+    return text + f"Media: {len(session.selected_photos)} photo(s), {len(session.selected_videos)} video(s)"
+
+
+def photo_caption(index: int, total: int) -> str:
+    return f"PHOTO {index + 1}/{total}" if index == 0 and total > 1 else ""
+
+
+def video_caption(index: int, total: int) -> str:
+    return f"VIDEO {index + 1}/{total}" if total > 1 else "VIDEO"
+
+
+def media_key(media: MediaData) -> str:
+    return media.file_path or media.url
+
+
+def preview_item(message_id: int, media: MediaData, caption: str) -> Dict[str, Any]:
+    """Запись о сообщении превью в session.preview_items"""
+    return {"message_id": message_id, "media_type": media.media_type, "key": media_key(media), "caption": caption}
+
+
+def preview_media(session: UserSession, verdicts: Dict[str, bool]) -> Tuple[List[MediaData], List[MediaData]]:
+    """Фото и видео, которые попадут в превью: локальные файлы на месте, ссылки прошли проверку"""
+    photos = [photo for photo in session.selected_photos if is_postable(photo, verdicts)]
+    videos = [video for video in session.selected_videos if is_postable(video, verdicts)]
+    return photos, videos
+
+
+@dataclass
+class PreviewPlan:
+    text: str = ""
+    calls: List[PreviewCall] = field(default_factory=list)
+    items: List[Dict[str, Any]] = field(default_factory=list)  # preview_items после правок
+    resend_media: bool = False  # медиа стало больше - в альбом не добавить, шлем медиа заново
+    full_bytes: int = 0  # ушло бы при повторной отправке всего превью
+    sent_bytes: int = 0  # уходит при правке
+
+    @property
+    def saved_bytes(self) -> int:
+        return max(self.full_bytes - self.sent_bytes, 0)
+
+
+def plan_preview_update(session: UserSession, photos: List[MediaData], videos: List[MediaData],
+                        media_input: Callable[[MediaData], Union[str, InputFile]]) -> Optional[PreviewPlan]:
+    """
+    Правки, которые приводят отправленное превью к текущей сессии.
+    None - превью еще не отправлялось, править нечего.
+    """
+    if session.preview_message_id is None:
+        return None
+    chat_id = session.chat_id
+    plan = PreviewPlan(text=preview_text(session))
+    captioned = [(video, video_caption(i, len(videos))) for i, video in enumerate(videos)]
+    captioned += [(photo, photo_caption(i, len(photos))) for i, photo in enumerate(photos)]
+    plan.full_bytes = len(plan.text) + sum(media_payload(media) + len(caption) for media, caption in captioned)
+
+    if plan.text != session.preview_text:
+        plan.calls.append(("edit_message_text", {
+            "text": plan.text, "chat_id": chat_id, "message_id": session.preview_message_id, "parse_mode": "HTML"}, None))
+        plan.sent_bytes += len(plan.text)
+
+    current_videos = [item for item in session.preview_items if item["media_type"] == "video"]
+    current_photos = [item for item in session.preview_items if item["media_type"] == "photo"]
+    if len(videos) > len(current_videos) or len(photos) > len(current_photos):
+        plan.resend_media = True
+        plan.calls += [("delete_message", {"chat_id": chat_id, "message_id": item["message_id"]}, None)
+                       for item in session.preview_items]
+        plan.sent_bytes += sum(media_payload(media) + len(caption) for media, caption in captioned)
+        return plan
+
+    # Видео идут отдельными сообщениями, фото - альбомом: и то и другое правится по позициям
+    for current, desired, caption_for in ((current_videos, videos, video_caption),
+                                          (current_photos, photos, photo_caption)):
+        for index, item in enumerate(current):
+            target = {"chat_id": chat_id, "message_id": item["message_id"]}
+            if index >= len(desired):
+                plan.calls.append(("delete_message", target, None))
+                continue
+            media = desired[index]
+            caption = caption_for(index, len(desired))
+            if item["key"] != media_key(media):
+                source = media_input(media) if media.is_local_file else media.url
+                input_media = (InputMediaVideo if media.media_type == "video" else InputMediaPhoto)(source, caption=caption)
+                upload = media if isinstance(source, InputFile) else None
+                plan.calls.append(("edit_message_media", {"media": input_media, **target}, upload))
+                plan.sent_bytes += media_payload(media) + len(caption)
+            elif item["caption"] != caption:
+                plan.calls.append(("edit_message_caption", {"caption": caption, **target}, None))
+                plan.sent_bytes += len(caption)
+            plan.items.append(preview_item(item["message_id"], media, caption))
+    return plan
+
+
+def commit_preview_plan(session: UserSession, plan: PreviewPlan):
+    """Правки прошли - запоминаем, что теперь показано в чате"""
+    session.preview_text = plan.text
+    session.preview_items = plan.items
+
+
+def is_not_modified(error: Exception) -> bool:
+    """Telegram отвечает 400, если правка ничего не меняет - это не ошибка"""
+    return "message is not modified" in str(error)
+
+
+def record_preview_update(session: UserSession, plan: Optional[PreviewPlan], mode: str):
+    """mode: edit - правка на месте, media - заново только медиа, resend - все превью заново"""
+    PREVIEW_UPDATES.inc(mode=mode)
+    if plan is None or mode == "resend":
+        return
+    PREVIEW_BYTES_SAVED.observe(plan.saved_bytes)
+    logger.info(f"Preview of chat {session.chat_id} updated ({mode}): {len(plan.calls)} call(s), "
+                f"{plan.sent_bytes} bytes instead of {plan.full_bytes}")
+
+
+def preview_stats() -> Dict[str, float]:
+    """Для /status: сколько раз превью правилось и сколько байт это сэкономило"""
+    updates = {key[0]: value for key, value in PREVIEW_UPDATES.values().items()}
+    saved = sum(total for _, total, _ in PREVIEW_BYTES_SAVED.snapshot().values())
+    return {
+        "edits": updates.get("edit", 0) + updates.get("media", 0),
+        "resends": updates.get("resend", 0),
+        "bytes_saved": saved,
+    }
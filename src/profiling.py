@@ -0,0 +1,335 @@
+"""
+Профилирование по команде администратора (/profile) - без отладчика в поде.
+
+Режимы:
+    sample - поток-сэмплер раз в profile_sample_interval_ms снимает стеки всех потоков
+             (sys._current_frames): видны и пул рассылки, и превью, и ожидание сети;
+    cpu    - cProfile на время обработчиков. В процессе может работать только один профилировщик,
+             и потоки, запущенные раньше него, он не видит - поэтому обработчики профилируются
+             по одному, а пришедшие в это время идут без профиля (считаются в skipped);
+    memory - tracemalloc: снимок в начале и в конце, что выросло по строкам кода
+             и сколько занимают сессии и их списки медиа.
+
+Профиль снимается для следующих N обработчиков или T секунд; отчет передается в on_done(text, file_name).
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Optional, Tuple
+
+from .config import settings
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cpu", "sample", "memory")
+
+# Кадры, на которых поток ждет работу, а не работает: в отчет сэмплера не попадают
+_IDLE_FILES = (
+    os.sep + "threading.py",
+    os.sep + "selectors.py",
+    os.sep + "queue.py",
+    os.sep + "socketserver.py",
+    os.path.join("concurrent", "futures", "thread.py"),
+)
+
+FunctionKey = Tuple[str, int, str]
+
+
+def _function_key(frame) -> FunctionKey:
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name)
+
+
+def _format_function(key: FunctionKey) -> str:
+    filename, lineno, name = key
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def _rss_mib() -> Optional[float]:
+    """Текущий RSS процесса (лимит пода - 128Mi); None вне Linux"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cpu_lock = threading.Lock()  # один cProfile в процессе
+        self._local = threading.local()
+        self.memory_context: Optional[Callable[[], str]] = None  # что держат сессии (регистрирует main)
+        self._reset()
+
+    def _reset(self):
+        self.mode: Optional[str] = None
+        self.remaining: Optional[int] = None
+        self.started_at = 0.0
+        self.invocations = 0
+        self.skipped = 0
+        self._on_done: Optional[Callable[[str, str], None]] = None
+        self._timer = None
+        self._stats: Optional[pstats.Stats] = None
+        self._self_samples: Counter = Counter()
+        self._total_samples: Counter = Counter()
+        self._samples = 0
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling = threading.Event()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str, invocations: Optional[int] = None, seconds: Optional[float] = None,
+              on_done: Optional[Callable[[str, str], None]] = None):
+        """Начать профилирование на invocations обработчиков или seconds секунд (что наступит раньше)"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if not invocations and not seconds:
+            raise ValueError("Either invocations or seconds is required")
+        seconds = min(seconds or settings.profile_max_seconds, settings.profile_max_seconds)
+        with self._lock:
+            if self.mode is not None:
+                raise RuntimeError(f"Profiling already running ({self.mode})")
+            self._reset()
+            self.mode = mode
+            self.remaining = invocations
+            self.started_at = time.monotonic()
+            self._on_done = on_done
+            if mode == "sample":
+                self._sampling.set()
+                self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+                self._sampler.start()
+            elif mode == "memory":
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(settings.profile_trace_frames)
+                    self._started_tracemalloc = True
+                self._snapshot = _take_snapshot()
+            # Таймер снимается по ссылке, чтобы старый не остановил следующий профиль
+            self._timer = scheduler.schedule(seconds, self._finish_by_timer, self.started_at)
+        logger.info(f"Profiling started: mode={mode}, invocations={invocations}, seconds={seconds:.0f}")
+
+    def _finish_by_timer(self, started_at: float):
+        if self.started_at == started_at:
+            self.stop()
+
+    def stop(self) -> Optional[str]:
+        """Остановить профилирование, собрать отчет и передать его в on_done"""
+        with self._lock:
+            mode, on_done = self.mode, self._on_done
+            if mode is None:
+                return None
+            self.mode = None
+            if self._timer is not None:
+                scheduler.cancel(self._timer)
+        # Обработчик, который сейчас под cProfile, допишет статистику до отчета
+        with self._cpu_lock:
+            pass
+        self._sampling.clear()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+        report = self._report(mode)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self._snapshot = None
+        logger.info(f"Profiling finished: mode={mode}, invocations={self.invocations}, skipped={self.skipped}")
+        if on_done is not None:
+            file_name = f"profile-{mode}-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+            try:
+                on_done(report, file_name)
+            except Exception as e:
+                logger.error(f"Failed to deliver profile report: {e}")
+        return report
+
+    def status(self) -> str:
+        if self.mode is None:
+            return "Профилирование не запущено"
+        left = f", осталось обработчиков: {self.remaining}" if self.remaining is not None else ""
+        return (f"Профилирование: {self.mode}, идет {time.monotonic() - self.started_at:.0f} сек, "
+                f"обработчиков: {self.invocations}{left}")
+
+    # ---------- хук обработчиков ----------
+
+    def run(self, function: Callable, *args, count_invocation: bool = False, **kwargs):
+        """
+        Выполнить обработчик (count_invocation=True) или этап публикации под профилем, если он включен.
+        Обработчики, начатые до /profile (в том числе сама команда), не засчитываются.
+        """
+        mode = self.mode
+        if mode is None:
+            return function(*args, **kwargs)
+        try:
+            if mode == "cpu":
+                return self._run_cpu(function, *args, **kwargs)
+            return function(*args, **kwargs)
+        finally:
+            if count_invocation:
+                self._count_invocation()
+
+    async def run_async(self, function: Callable, *args, count_invocation: bool = False, **kwargs):
+        """
+        run для корутин (режим asyncio). cProfile на время одной корутины не снять - в цикле событий
+        перемешаны все обработчики, поэтому для asyncio нужен режим sample; здесь только счет обработчиков.
+        """
+        counted = count_invocation and self.mode is not None
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            if counted:
+                self._count_invocation()
+
+    def _count_invocation(self):
+        with self._lock:
+            if self.mode is None:
+                return
+            self.invocations += 1
+            if self.remaining is None:
+                return
+            self.remaining -= 1
+            done = self.remaining <= 0
+        if done:
+            # Отчет отправляется из потока планировщика, а не из обработчика пользователя
+            scheduler.schedule(0, self._finish_by_timer, self.started_at)
+
+    def _run_cpu(self, function: Callable, *args, **kwargs):
+        if getattr(self._local, "profiling", False):
+            return function(*args, **kwargs)  # этап внутри профилируемого обработчика
+        if not self._cpu_lock.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return function(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            try:
+                profile.enable()
+            except ValueError:  # профилировщик уже включен кем-то еще (отладчик, coverage)
+                with self._lock:
+                    self.skipped += 1
+                return function(*args, **kwargs)
+            self._local.profiling = True
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._local.profiling = False
+                self._add_stats(profile)
+        finally:
+            self._cpu_lock.release()
+
+    def _add_stats(self, profile: cProfile.Profile):
+        try:
+            stats = pstats.Stats(profile)
+        except TypeError:  # пустой профиль
+            return
+        with self._lock:
+            if self._stats is None:
+                self._stats = stats
+            else:
+                self._stats.add(stats)
+
+    # ---------- сэмплер ----------
+
+    def _sample_loop(self):
+        interval = settings.profile_sample_interval_ms / 1000
+        own = threading.get_ident()
+        while self._sampling.is_set():
+            self._take_sample(own)
+            time.sleep(interval)
+
+    def _take_sample(self, own_ident: int):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                continue
+            stack = set()
+            leaf = _function_key(frame)
+            while frame is not None:
+                stack.add(_function_key(frame))
+                frame = frame.f_back
+            with self._lock:
+                self._samples += 1
+                self._self_samples[leaf] += 1
+                self._total_samples.update(stack)
+
+    # ---------- отчеты ----------
+
+    def _header(self, mode: str) -> str:
+        rss = _rss_mib()
+        return (
+            f"Профиль: {mode}, {time.monotonic() - self.started_at:.1f} сек, "
+            f"обработчиков: {self.invocations}, без профиля: {self.skipped}\n"
+            f"RSS: {f'{rss:.1f} MiB' if rss is not None else '-'}\n\n"
+        )
+
+    def _report(self, mode: str) -> str:
+        if mode == "cpu":
+            return self._header(mode) + self._cpu_report()
+        if mode == "sample":
+            return self._header(mode) + self._sample_report()
+        return self._header(mode) + self._memory_report()
+
+    def _cpu_report(self) -> str:
+        if self._stats is None:
+            return "Ни один обработчик не попал под профиль\n"
+        out = io.StringIO()
+        self._stats.stream = out
+        self._stats.sort_stats("cumulative").print_stats(settings.profile_top)
+        self._stats.sort_stats("tottime").print_stats(settings.profile_top)
+        return out.getvalue()
+
+    def _sample_report(self) -> str:
+        if not self._samples:
+            return "Ни одного занятого потока за время профиля\n"
+        lines = [f"Сэмплов: {self._samples}, интервал {settings.profile_sample_interval_ms} мс", ""]
+        for title, counter in (("Собственное время (на вершине стека)", self._self_samples),
+                               ("Вместе с вызванными", self._total_samples)):
+            lines.append(title)
+            for key, count in counter.most_common(settings.profile_top):
+                lines.append(f"{count / self._samples:7.1%} {count:7d}  {_format_function(key)}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def _memory_report(self) -> str:
+        lines = []
+        if self.memory_context is not None:
+            try:
+                lines += [self.memory_context(), ""]
+            except Exception as e:
+                lines += [f"Нет данных о сессиях: {e}", ""]
+        if self._snapshot is None or not tracemalloc.is_tracing():
+            return "\n".join(lines + ["tracemalloc не запущен"])
+        current = _take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        lines.append(f"tracemalloc: сейчас {traced / 2**20:.1f} MiB, пик {peak / 2**20:.1f} MiB")
+        for title, key_type in (("Рост по файлам", "filename"), ("Рост по строкам", "lineno")):
+            lines += ["", title]
+            for diff in current.compare_to(self._snapshot, key_type)[:settings.profile_top]:
+                lines.append(str(diff))
+        lines += ["", "Самые большие места выделения (стек)"]
+        for diff in current.compare_to(self._snapshot, "traceback")[:5]:
+            lines.append(f"{diff.size_diff / 1024:+.1f} KiB, {diff.count_diff:+d} блоков")
+            lines += [f"    {line}" for line in diff.traceback.format()]
+        return "\n".join(lines) + "\n"
+
+
+profiler = Profiler()
@@ -0,0 +1,300 @@
+"""
+Sending and preview logic shared by both runtimes (settings.runtime), written once as coroutines.
+Planning lives in src/albums.py and src/preview.py; this module makes the Bot API calls for a plan.
+The runtimes only adapt the transport: src/utils.py runs these coroutines on TeleBot without
+an event loop (sync_bridge.run_sync), src/async_utils.py awaits them on AsyncTeleBot.
+"""
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from telebot import apihelper, asyncio_helper
+from telebot.types import InputFile, InputMedia, InputMediaPhoto, InputMediaVideo, Message
+
+from .albums import build_post
+from .instrumentation import timed_stage
+from .media_cache import media_cache
+from .metrics import SEND_API_CALLS
+from .preview import (
+    commit_preview_plan,
+    is_not_modified,
+    photo_caption,
+    plan_preview_update,
+    preview_item,
+    preview_media,
+    preview_text,
+    record_preview_update,
+    video_caption,
+)
+from .session import MediaData, UserSession
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# TeleBot and AsyncTeleBot raise different classes for the same Bot API error
+API_ERRORS = (apihelper.ApiTelegramException, asyncio_helper.ApiTelegramException)
+
+
+@dataclass
+class Transport:
+    """
+    What the shared code needs from a runtime. `bot` methods are awaited: an AsyncTeleBot,
+    or a TeleBot behind sync_bridge.AwaitableBot, whose awaits complete at once.
+    """
+    bot: Any
+    # Checks all web photo URLs of a session in one pass (validate_session_media)
+    validate: Callable[[UserSession], Awaitable[Dict[str, bool]]]
+    # Verdicts for the URLs of a channel send, normally cache hits after validate
+    check_urls: Callable[[List[str]], Awaitable[Dict[str, bool]]]
+
+
+def local_media_input(media: MediaData) -> Union[str, InputFile]:
+    """
+    Returns the cached Telegram file_id for a local file, or an InputFile to upload it.
+    """
+    file_id = media_cache.get(media.file_path, media.media_type)
+    if file_id:
+        logger.debug(f"Reusing file_id for {media.file_path}")
+        return file_id
+    return InputFile(media.file_path)
+
+
+def extract_file_id(message: Message, media_type: str) -> Optional[str]:
+    """Returns the file_id Telegram assigned to the media in a sent message."""
+    if media_type == "video" and message.video:
+        return message.video.file_id
+    if media_type == "photo" and message.photo:
+        # Largest size goes last
+        return message.photo[-1].file_id
+    return None
+
+
+def remember_uploaded_media(messages: List[Message], uploaded: List[Optional[MediaData]]):
+    """
+    Stores file_ids of freshly uploaded local media.
+    `uploaded` is aligned with `messages`; None marks items that were not uploaded from disk.
+    """
+    for message, media in zip(messages or [], uploaded):
+        if media is None:
+            continue
+        file_id = extract_file_id(message, media.media_type)
+        if file_id:
+            media_cache.put(media.file_path, file_id, media.media_type)
+
+
+def is_current_post(session: UserSession, generation: Optional[str]) -> bool:
+    """
+    The session still holds the post a background stage was started for: `generation` is the
+    session.trace_id at start, and clear()/load_draft() issue a new one. None - no check.
+    """
+    return generation is None or session.trace_id == generation
+
+
+def store_preview_items(session: UserSession, items: List[Dict[str, Any]], generation: Optional[str] = None):
+    """Remember sent preview messages, unless the post was replaced while they were uploading"""
+    if not is_current_post(session, generation):
+        logger.info(f"Post in chat {session.chat_id} changed during preview upload, preview items dropped")
+        return
+    session.preview_items = items
+
+
+async def validate_session_media(check_urls: Callable[[List[str]], Awaitable[Dict[str, bool]]],
+                                 session: UserSession) -> dict:
+    """
+    Checks all web photo URLs of the session concurrently in one pass.
+    Later checks for the preview and every channel hit the cache.
+    """
+    urls = [photo.url for photo in session.get_web_photos()]
+    if not urls:
+        return {}
+    with span("validate", urls=len(urls)):
+        verdicts = await check_urls(urls)
+    invalid = [url for url, valid in verdicts.items() if not valid]
+    logger.info(f"Validated {len(verdicts)} image URL(s) for chat {session.chat_id}, invalid: {len(invalid)}")
+    return verdicts
+
+
+async def send_single_media(bot, destination_id: str, item: InputMedia, timeout: Optional[int] = None) -> Message:
+    """A one-item album goes out as a plain photo or video: sendMediaGroup needs at least two."""
+    send = bot.send_video if isinstance(item, InputMediaVideo) else bot.send_photo
+    return await send(destination_id, item.media, caption=item.caption, parse_mode=item.parse_mode, timeout=timeout)
+
+
+@timed_stage("send_to_destination")
+async def send_post(transport: Transport, destination_id: str, session: UserSession,
+                    timeout: Optional[int] = None, sent: Optional[List[int]] = None) -> bool:
+    """
+    Publishes the post as mixed photo/video albums in session order (src/albums.py):
+    the fewest sendMediaGroup calls, caption once on the first item.
+    `timeout` is the budget for the whole send in seconds: each Bot API request gets what is
+    left of it as its HTTP timeout, and once it is spent the send stops.
+    `sent` collects the ids of the published messages (for copyMessages to other channels).
+    """
+    bot = transport.bot
+    sent = sent if sent is not None else []
+    sent.clear()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def time_left() -> Optional[int]:
+        if deadline is None:
+            return None
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"{timeout}s budget for {destination_id} spent after {len(sent)} message(s)")
+        return math.ceil(left)
+
+    try:
+        verdicts = await transport.check_urls([photo.url for photo in session.get_web_photos()])
+        plan = build_post(session, verdicts, local_media_input)
+        if plan.skipped:
+            logger.warning(f"Skipping {plan.skipped} missing file(s) or invalid image URL(s) for {destination_id}")
+        logger.info(f"SEND TO {destination_id}: {plan.items} item(s) in {len(plan.albums)} album(s)")
+
+        if plan.text:
+            message = await bot.send_message(destination_id, plan.text, parse_mode='HTML', timeout=time_left())
+            sent.append(message.message_id)
+        for album in plan.albums:
+            uploads = [media for media in album.uploads if media is not None]
+            if len(album.inputs) > 1:
+                with span("media_group", destination=destination_id, items=len(album.inputs),
+                          uploads=[os.path.basename(media.file_path) for media in uploads]):
+                    messages = await bot.send_media_group(destination_id, album.inputs, timeout=time_left())
+            else:
+                with span("upload", destination=destination_id, media_type=album.media[0].media_type,
+                          cached=not uploads):
+                    messages = [await send_single_media(bot, destination_id, album.inputs[0], time_left())]
+            remember_uploaded_media(messages, album.uploads)
+            sent.extend(message.message_id for message in messages)
+
+        SEND_API_CALLS.observe(plan.calls)
+        logger.info(f"SENT {plan.items} item(s) to {destination_id} in {plan.calls} call(s)")
+        return True
+
+    except Exception as e:
+        logger.error(f"General sending error: {e}")
+        return False
+
+
+@timed_stage("preview_text")
+async def send_preview_text(bot, session: UserSession) -> Message:
+    """Sends the text part of the preview and remembers it for in-place edits."""
+    text = preview_text(session)
+    message = await bot.send_message(session.chat_id, text, parse_mode='HTML')
+    session.preview_message_id = message.message_id
+    session.preview_text = text
+    return message
+
+
+@timed_stage("preview_media")
+async def send_preview_media(transport: Transport, session: UserSession, generation: Optional[str] = None):
+    """Sends preview videos and the photo album, with file existence and image URL validation."""
+    bot = transport.bot
+    chat_id = session.chat_id
+    items = []
+
+    # Check all web photo URLs at once; results are cached for channel sends
+    verdicts = await transport.validate(session)
+    photos, videos = preview_media(session, verdicts)
+    skipped = len(session.selected_photos) + len(session.selected_videos) - len(photos) - len(videos)
+    if skipped:
+        logger.warning(f"Skipping {skipped} missing file(s) or invalid image URL(s) in preview for chat {chat_id}")
+
+    # Send videos (if any)
+    for i, video in enumerate(videos):
+        try:
+            # Cached file_id or InputFile for video
+            video_input = local_media_input(video)
+            caption = video_caption(i, len(videos))
+            msg = await bot.send_video(chat_id, video_input, caption=caption)
+            if isinstance(video_input, InputFile):
+                remember_uploaded_media([msg], [video])
+            items.append(preview_item(msg.message_id, video, caption))
+            logger.info(f"Sent video preview for chat {chat_id}")
+        except Exception as e:
+            logger.error(f"Error sending video preview: {e}")
+            await bot.send_message(chat_id, f"Error loading video: {e}")
+
+    # Send photos (if any)
+    media_group = []
+    uploaded = []
+    sent = []
+    for i, photo in enumerate(photos):
+        try:
+            # Local files - cached file_id or InputFile, web photos by URL
+            photo_input = local_media_input(photo) if photo.is_local_file else photo.url
+            media_group.append(InputMediaPhoto(photo_input, caption=photo_caption(i, len(photos))))
+            uploaded.append(photo if isinstance(photo_input, InputFile) else None)
+            sent.append(photo)
+        except Exception as e:
+            logger.error(f"Error preparing photo preview: {e}")
+            continue
+
+    if media_group:
+        try:
+            # Split into groups of 10
+            for i in range(0, len(media_group), 10):
+                messages = await bot.send_media_group(chat_id, media_group[i:i + 10])
+                remember_uploaded_media(messages, uploaded[i:i + 10])
+                for message, photo, media in zip(messages, sent[i:i + 10], media_group[i:i + 10]):
+                    items.append(preview_item(message.message_id, photo, media.caption or ""))
+            logger.info(f"✅ Sent {len(media_group)} photo preview(s) for chat {chat_id}")
+        except Exception as e:
+            logger.error(f"Error sending media group preview: {e}")
+    store_preview_items(session, items, generation)
+
+
+@timed_stage("preview")
+async def send_preview(transport: Transport, session: UserSession):
+    """Enhanced preview with separation of photos and videos, file existence and image URL validation."""
+    try:
+        await send_preview_text(transport.bot, session)
+        await send_preview_media(transport, session)
+    except Exception as e:
+        logger.error(f"Error sending preview: {e}")
+        await transport.bot.send_message(session.chat_id, f"Error creating preview: {e}")
+
+
+@timed_stage("preview_update")
+async def update_preview(transport: Transport, session: UserSession) -> bool:
+    """
+    Brings the sent preview in line with the session after a text edit, reorder or removal:
+    edits the text message and only the changed media instead of sending the whole post again.
+    Falls back to a full re-send when there is no preview yet or Telegram refuses an edit.
+    Returns True if the preview was updated in place.
+    """
+    bot = transport.bot
+    verdicts = await transport.validate(session)
+    plan = plan_preview_update(session, *preview_media(session, verdicts), media_input=local_media_input)
+    if plan is None:
+        await send_preview(transport, session)
+        record_preview_update(session, None, "resend")
+        return False
+    try:
+        for method, kwargs, upload in plan.calls:
+            try:
+                message = await getattr(bot, method)(**kwargs)
+            except API_ERRORS as e:
+                if not is_not_modified(e):
+                    raise
+                continue
+            if upload is not None and isinstance(message, Message):
+                remember_uploaded_media([message], [upload])
+        commit_preview_plan(session, plan)
+        if plan.resend_media:
+            await send_preview_media(transport, session)
+    except Exception as e:
+        logger.warning(f"In-place preview update failed for chat {session.chat_id}, sending it again: {e}")
+        for message_id in session.preview_message_ids():
+            try:
+                await bot.delete_message(session.chat_id, message_id)
+            except Exception:
+                pass
+        session.reset_preview()
+        await send_preview(transport, session)
+        record_preview_update(session, plan, "resend")
+        return False
+    record_preview_update(session, plan, "media" if plan.resend_media else "edit")
+    return True
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from telebot import apihelper, asyncio_helper
+
+from .config import settings
+from .metrics import observe_api_call
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые Telegram считает исходящими сообщениями и ограничивает flood control
+LIMITED_METHOD_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Забрать токены (в долг при нехватке) и вернуть, сколько секунд подождать"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Забрать токены, только если они есть"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def block_for(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        """Снова полный и не заблокирован - такой же, как новый bucket"""
+        with self._lock:
+            full = self.tokens + (now - self.updated) * self.rate >= self.capacity
+            return full and self.blocked_until <= now
+
+
+def prune_idle(buckets: Dict[Any, TokenBucket], now: float) -> int:
+    """
+    Удалить простаивающие bucket'ы (вызывать под замком владельца словаря). Лимиты не меняются:
+    для чата, который снова напишет, создастся такой же полный bucket. Возвращает число удаленных.
+    """
+    idle = [key for key, bucket in buckets.items() if bucket.is_idle(now)]
+    for key in idle:
+        del buckets[key]
+    return len(idle)
+
+
+def is_group_chat(chat_id: Any) -> bool:
+    """Каналы и группы: @username или отрицательный числовой id"""
+    text = str(chat_id)
+    return text.startswith("@") or text.startswith("-")
+
+
+def message_cost(method_name: str, params: Optional[Dict[str, Any]]) -> int:
+    """Альбом из N медиа и копия N сообщений Telegram считает как N сообщений"""
+    field = {"sendMediaGroup": "media", "copyMessages": "message_ids", "forwardMessages": "message_ids"}.get(method_name)
+    if field and params and params.get(field):
+        try:
+            return max(1, len(json.loads(params[field])))
+        except (TypeError, ValueError):
+            return 1
+    return 1
+
+
+class OutboundGovernor:
+    """
+    Единая точка для всех исходящих запросов к Bot API (apihelper.CUSTOM_REQUEST_SENDER).
+    Держит token bucket'ы: общий на бота, на личный чат и на группу/канал.
+    Bucket'ы простаивающих чатов удаляются при обращении, не чаще раза в prune_interval секунд.
+    На 429 ждет retry_after и повторяет запрос, а не отдает ошибку обработчику.
+    """
+
+    def __init__(self, global_rate: float = 30.0, private_chat_rate: float = 1.0,
+                 group_rate_per_minute: float = 20.0, max_retries: int = 3,
+                 sender: Optional[Callable[..., Any]] = None, prune_interval: float = 60.0):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.group_rate = group_rate_per_minute / 60.0
+        self.max_retries = max_retries
+        self._sender = sender
+        self._chats: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.prune_interval = prune_interval
+        self._pruned_at = time.monotonic()
+        self.throttled = 0
+        self.waited_seconds = 0.0
+        self.flood_errors = 0
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        key = str(chat_id)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._pruned_at >= self.prune_interval:
+                prune_idle(self._chats, now)
+                self._pruned_at = now
+            bucket = self._chats.get(key)
+            if bucket is None:
+                if is_group_chat(chat_id):
+                    # 20 сообщений в минуту, альбом из 10 фото укладывается целиком
+                    bucket = TokenBucket(self.group_rate, 10)
+                else:
+                    bucket = TokenBucket(self.private_chat_rate, 3)
+                self._chats[key] = bucket
+            return bucket
+
+    def reserve(self, chat_id: Any, cost: int = 1) -> float:
+        """Забрать токены и вернуть, сколько ждать до отправки (без ожидания)"""
+        wait = self.global_bucket.reserve(cost)
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).reserve(cost))
+        if wait > 0:
+            with self._lock:
+                self.throttled += 1
+                self.waited_seconds += wait
+            logger.debug(f"Throttling chat {chat_id} for {wait:.2f}s")
+        return wait
+
+    def acquire(self, chat_id: Any, cost: int = 1):
+        wait = self.reserve(chat_id, cost)
+        if wait > 0:
+            time.sleep(wait)
+
+    @staticmethod
+    def _rewind(files):
+        for value in (files or {}).values():
+            file_obj = value[1] if isinstance(value, tuple) else value
+            file_obj = getattr(file_obj, "file", file_obj)  # InputFile в режиме asyncio
+            if hasattr(file_obj, "seek"):
+                file_obj.seek(0)
+
+    @staticmethod
+    def _retry_after(response) -> Optional[float]:
+        if response.status_code != 429:
+            return None
+        try:
+            return float(response.json().get("parameters", {}).get("retry_after", 1))
+        except Exception:
+            return 1.0
+
+    def send(self, method: str, url: str, params=None, files=None, **kwargs):
+        """Совместим с сигнатурой apihelper.CUSTOM_REQUEST_SENDER"""
+        method_name = url.rsplit("/", 1)[-1]
+        limited = method_name.startswith(LIMITED_METHOD_PREFIXES)
+        chat_id = (params or {}).get("chat_id")
+        sender = self._sender or apihelper._get_req_session().request
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                self.acquire(chat_id, message_cost(method_name, params))
+            if attempt:
+                self._rewind(files)
+            started = time.monotonic()
+            response = sender(method, url, params=params, files=files, **kwargs)
+            observe_api_call(method_name, time.monotonic() - started, response.status_code,
+                             chat_id, params, files)
+            retry_after = self._retry_after(response)
+            if retry_after is None:
+                return response
+            # Блокируем чат (или весь бот), чтобы другие запросы не получили тот же 429
+            self._on_flood(method_name, chat_id, retry_after, attempt)
+            if not limited:
+                time.sleep(retry_after)
+        return response
+
+    def _on_flood(self, method_name: str, chat_id: Any, retry_after: float, attempt: int):
+        with self._lock:
+            self.flood_errors += 1
+        logger.warning(f"429 on {method_name} for chat {chat_id}, retry after {retry_after}s (attempt {attempt + 1})")
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket
+        bucket.block_for(retry_after)
+
+    async def send_async(self, process_request: Callable[..., Any], token, url, method="get",
+                         params=None, files=None, **kwargs):
+        """
+        То же для AsyncTeleBot: обертка над asyncio_helper._process_request.
+        Ожидание токенов и retry_after - asyncio.sleep, поток цикла событий не блокируется.
+        """
+        method_name = url.rsplit("/", 1)[-1]
+        limited = method_name.startswith(LIMITED_METHOD_PREFIXES)
+        chat_id = (params or {}).get("chat_id")
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                wait = self.reserve(chat_id, message_cost(method_name, params))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            if attempt:
+                self._rewind(files)
+            started = time.monotonic()
+            # _process_request забирает timeout из params - отдаем копию, чтобы повтор ушел с тем же таймаутом
+            request_params = dict(params) if params is not None else None
+            try:
+                result = await process_request(token, url, method, request_params, files, **kwargs)
+            except asyncio_helper.ApiTelegramException as e:
+                observe_api_call(method_name, time.monotonic() - started, e.error_code, chat_id, params, files)
+                retry_after = (e.result_json.get("parameters") or {}).get("retry_after") if e.error_code == 429 else None
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                self._on_flood(method_name, chat_id, float(retry_after), attempt)
+                if not limited:
+                    await asyncio.sleep(float(retry_after))
+                continue
+            observe_api_call(method_name, time.monotonic() - started, 200, chat_id, params, files)
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "throttled": self.throttled,
+                "waited_seconds": self.waited_seconds,
+                "flood_errors": self.flood_errors,
+            }
+
+
+class InboundLimiter:
+    """Ограничение входящих запросов от одного пользователя (settings.rate_limit_per_minute)"""
+
+    def __init__(self, per_minute: int, prune_interval: float = 60.0):
+        self.per_minute = per_minute
+        self._users: Dict[int, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.prune_interval = prune_interval
+        self._pruned_at = time.monotonic()
+        self.rejected = 0
+
+    def allow(self, user_id: int) -> bool:
+        if self.per_minute <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._pruned_at >= self.prune_interval:
+                prune_idle(self._users, now)
+                self._pruned_at = now
+            bucket = self._users.get(user_id)
+            if bucket is None:
+                bucket = self._users[user_id] = TokenBucket(self.per_minute / 60.0, self.per_minute)
+        allowed = bucket.try_acquire()
+        if not allowed:
+            with self._lock:
+                self.rejected += 1
+        return allowed
+
+
+outbound_governor = OutboundGovernor(
+    global_rate=settings.telegram_global_rate,
+    private_chat_rate=settings.telegram_chat_rate,
+    group_rate_per_minute=settings.telegram_group_rate_per_minute,
+    max_retries=settings.telegram_flood_retries,
+)
+inbound_limiter = InboundLimiter(settings.rate_limit_per_minute)
+
+
+def install_outbound_governor():
+    """Пропускать все запросы TeleBot через outbound_governor"""
+    apihelper.CUSTOM_REQUEST_SENDER = outbound_governor.send
+
+
+def install_async_outbound_governor():
+    """
+    То же для AsyncTeleBot: у asyncio_helper нет CUSTOM_REQUEST_SENDER,
+    поэтому оборачивается _process_request, через который идут все методы Bot API.
+    """
+    original = getattr(asyncio_helper._process_request, "__wrapped__", asyncio_helper._process_request)
+
+    async def process_request(token, url, method="get", params=None, files=None, **kwargs):
+        return await outbound_governor.send_async(original, token, url, method, params, files, **kwargs)
+
+    process_request.__wrapped__ = original
+    asyncio_helper._process_request = process_request
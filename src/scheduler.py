@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(order=True)
+class ScheduledAction:
+    run_at: float
+    seq: int
+    fn: Callable = field(compare=False)
+    args: Tuple = field(compare=False, default=())
+    kwargs: Dict[str, Any] = field(compare=False, default_factory=dict)
+    cancelled: bool = field(compare=False, default=False)
+
+
+class DelayedScheduler:
+    """
+    Один поток на все отложенные действия (удаление/редактирование сообщений).
+    Действия хранятся в куче по времени запуска, обработчики бота не ждут и не создают потоков.
+    """
+
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self._heap: List[ScheduledAction] = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.executed = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def schedule(self, delay: float, fn: Callable, *args, **kwargs) -> ScheduledAction:
+        """Выполнить fn(*args, **kwargs) через delay секунд"""
+        action = ScheduledAction(time.monotonic() + delay, next(self._seq), fn, args, kwargs)
+        with self._cond:
+            if self._stopped:
+                # После остановки выполняем сразу, чтобы ничего не потерять
+                self._execute(action)
+                return action
+            heapq.heappush(self._heap, action)
+            self._ensure_thread()
+            self._cond.notify()
+        return action
+
+    def every(self, interval: float, fn: Callable, *args, **kwargs) -> ScheduledAction:
+        """Периодическое действие; при остановке выполняется последний раз и больше не планируется"""
+        def run():
+            try:
+                fn(*args, **kwargs)
+            finally:
+                if not self._stopped:
+                    self.schedule(interval, run)
+        run.__name__ = getattr(fn, "__name__", "periodic")
+        return self.schedule(interval, run)
+
+    @staticmethod
+    def cancel(action: ScheduledAction):
+        action.cancelled = True
+
+    def _execute(self, action: ScheduledAction):
+        if action.cancelled:
+            return
+        lag = max(0.0, time.monotonic() - action.run_at)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        try:
+            action.fn(*action.args, **action.kwargs)
+            self.executed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Scheduled action {getattr(action.fn, '__name__', action.fn)} failed: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (not self._heap or self._heap[0].run_at > time.monotonic()):
+                    timeout = self._heap[0].run_at - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                action = heapq.heappop(self._heap)
+            self._execute(action)
+
+    def shutdown(self, drain: bool = True):
+        """Остановить поток; при drain=True выполнить все ожидающие действия немедленно"""
+        with self._cond:
+            self._stopped = True
+            pending = sorted(self._heap)
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if drain:
+            for action in pending:
+                self._execute(action)
+            if pending:
+                logger.info(f"Scheduler drained {len(pending)} pending action(s)")
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            depth = sum(1 for action in self._heap if not action.cancelled)
+        return {
+            "queue_depth": depth,
+            "executed": self.executed,
+            "failed": self.failed,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
+
+
+scheduler = DelayedScheduler()
@@ -1,6 +1,8 @@
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict
 from .config import settings
+from .media_prep import image_preprocessor
+from .tracing import new_trace_id
 import os
 import logging
 
@@ -45,6 +47,13 @@ class UserSession:
     photos_to_remove: List[int] = field(default_factory=list)
     videos_to_remove: List[int] = field(default_factory=list)
     post_type: str = "photo"
+    trace_id: str = field(default_factory=new_trace_id)  # Один пост - один trace (src/tracing.py)
+    # Отправленное превью - чтобы править его на месте (src/preview.py)
+    preview_message_id: Optional[int] = None
+    preview_text: str = ""
+    preview_items: List[Dict[str, Any]] = field(default_factory=list)
+    # Очередь готовых черновиков из массовой загрузки ссылок (src/bulk.py); clear() ее не трогает
+    drafts: List[Dict[str, Any]] = field(default_factory=list)
 
     def __post_init__(self):
         self.selected_photos = self.photos.copy()
@@ -53,6 +62,19 @@ class UserSession:
     def __repr__(self):
         return f"<UserSession chat_id={self.chat_id}, photos={len(self.selected_photos)}, videos={len(self.selected_videos)}>"
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализация для хранения сессии вне процесса"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UserSession":
+        media_fields = ("photos", "videos", "selected_photos", "selected_videos")
+        values = {k: v for k, v in data.items() if k in cls.__dataclass_fields__ and k not in media_fields}
+        session = cls(**values)
+        for name in media_fields:
+            setattr(session, name, [MediaData(**m) for m in data.get(name, [])])
+        return session
+
     def add_web_photos(self, urls: List[str]) -> int:
         """Добавить веб-фото"""
         added = 0
@@ -73,6 +95,8 @@ class UserSession:
                 logging.getLogger("src.session").disabled = True
                 # logger.warning(f"Photo file does not exist: {file_path}")
                 continue
+            if settings.image_preprocess:
+                file_path = image_preprocessor.prepare(file_path)
             media = MediaData(
                 url=file_path, 
                 is_custom=True, 
@@ -189,6 +213,18 @@ class UserSession:
         self.choose_send_msg_id = None
         self.photos_to_remove.clear()
         self.videos_to_remove.clear()
+        self.reset_preview()
+        self.trace_id = new_trace_id()
+
+    def reset_preview(self):
+        self.preview_message_id = None
+        self.preview_text = ""
+        self.preview_items = []
+
+    def preview_message_ids(self) -> List[int]:
+        """Все сообщения превью: текст и медиа"""
+        ids = [self.preview_message_id] if self.preview_message_id is not None else []
+        return ids + [item["message_id"] for item in self.preview_items]
     
     @property
     def has_media(self) -> bool:
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .config import settings
+from .session import UserSession
+
+logger = logging.getLogger(__name__)
+
+
+class MemorySessionBackend:
+    """Без внешнего хранилища: вытесненная сессия теряется"""
+
+    persistent = False
+
+    def load(self, chat_id: int) -> Optional[UserSession]:
+        return None
+
+    def save(self, session: UserSession):
+        pass
+
+    def delete(self, chat_id: int):
+        pass
+
+    def purge_older_than(self, timestamp: float) -> int:
+        return 0
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend:
+    """Сессии в SQLite-файле: переживают перезапуск пода при подключенном volume"""
+
+    persistent = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Файл открывается при первом обращении, а не при импорте - бот стартует и без volume"""
+        if self._conn is None:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    "chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                raise RuntimeError(
+                    f"SESSION_DB_PATH={self.path}: не удалось открыть хранилище сессий ({e}); "
+                    f"подключите volume с правом записи или укажите другой путь"
+                ) from e
+            self._conn = conn
+        return self._conn
+
+    def load(self, chat_id: int) -> Optional[UserSession]:
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+        if not row:
+            return None
+        try:
+            return UserSession.from_dict(json.loads(row[0]))
+        except Exception as e:
+            logger.warning(f"Broken stored session for {chat_id}, ignoring: {e}")
+            return None
+
+    def save(self, session: UserSession):
+        data = json.dumps(session.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (chat_id, data, updated_at) VALUES (?, ?, ?)",
+                (session.chat_id, data, time.time()),
+            )
+            self.conn.commit()
+
+    def delete(self, chat_id: int):
+        with self._lock:
+            self.conn.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
+            self.conn.commit()
+
+    def purge_older_than(self, timestamp: float) -> int:
+        """Удалить давно не менявшиеся сессии, кроме тех, где ждет очередь черновиков"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ? "
+                "AND COALESCE(json_array_length(data, '$.drafts'), 0) = 0",
+                (timestamp,),
+            )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SessionStore:
+    """
+    Хранилище сессий вместо голого dict: LRU-ограничение числа сессий в памяти,
+    удаление брошенных сессий по простою и необязательный постоянный backend.
+    Изменения сбрасываются в backend пачкой (flush) - по таймеру и при остановке.
+    Сессия в памяти считается актуальной, backend читается только при промахе, поэтому
+    хранилище рассчитано на один процесс бота: backend нужен для перезапуска, а не для
+    нескольких реплик (копия в памяти другой реплики устареет).
+    """
+
+    def __init__(self, backend=None, idle_ttl: float = 3600, max_sessions: int = 200):
+        self.backend = backend or MemorySessionBackend()
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        self._last_seen: Dict[int, float] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    def get_or_create(self, chat_id: int) -> UserSession:
+        with self._lock:
+            session = self.get(chat_id)
+            return session if session is not None else self._touch(chat_id, UserSession(chat_id=chat_id))
+
+    def get(self, chat_id: int) -> Optional[UserSession]:
+        """Сессия из памяти или из backend (после вытеснения или перезапуска); None - сессии нет"""
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                session = self.backend.load(chat_id)
+            return self._touch(chat_id, session) if session is not None else None
+
+    def _touch(self, chat_id: int, session: UserSession) -> UserSession:
+        with self._lock:
+            self._sessions[chat_id] = session
+            self._sessions.move_to_end(chat_id)
+            self._last_seen[chat_id] = time.monotonic()
+            # Обработчик может менять сессию на месте - сохраним при следующем flush
+            self._dirty.add(chat_id)
+            self._enforce_limit()
+            return session
+
+    def _enforce_limit(self):
+        while len(self._sessions) > self.max_sessions:
+            chat_id, session = self._sessions.popitem(last=False)
+            self._last_seen.pop(chat_id, None)
+            if chat_id in self._dirty:
+                self._dirty.discard(chat_id)
+                self.backend.save(session)
+            self.evicted_lru += 1
+            logger.info(f"Session {chat_id} evicted from memory (limit {self.max_sessions})")
+
+    def __contains__(self, chat_id: int) -> bool:
+        with self._lock:
+            return chat_id in self._sessions
+
+    def __getitem__(self, chat_id: int) -> UserSession:
+        with self._lock:
+            return self._sessions[chat_id]
+
+    def __delitem__(self, chat_id: int):
+        self.delete(chat_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def sessions(self) -> List[UserSession]:
+        """Сессии в памяти (копия списка - для отчетов, не для изменения)"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def memory_report(self) -> str:
+        """Сколько медиа и истории держат сессии и их размер в JSON (для /profile memory)"""
+        sessions = self.sessions()
+        media_lists = ("photos", "videos", "selected_photos", "selected_videos")
+        media_items = sum(len(getattr(s, name)) for s in sessions for name in media_lists)
+        local_files = sum(1 for s in sessions for m in s.photos + s.videos if m.is_local_file)
+        history = sum(len(s.message_history) for s in sessions)
+        serialized = [len(json.dumps(s.to_dict(), ensure_ascii=False, default=str)) for s in sessions]
+        largest = sorted(zip(serialized, (s.chat_id for s in sessions)), reverse=True)[:5]
+        return (
+            f"Сессий: {len(sessions)}, медиа в списках: {media_items} (локальных файлов: {local_files}), "
+            f"id сообщений в истории: {history}\n"
+            f"Сессии в JSON: {sum(serialized) / 1024:.1f} KiB, самые большие: "
+            f"{', '.join(f'{chat_id} - {size / 1024:.1f} KiB' for size, chat_id in largest) or '-'}"
+        )
+
+    def delete(self, chat_id: int):
+        with self._lock:
+            self._sessions.pop(chat_id, None)
+            self._last_seen.pop(chat_id, None)
+            self._dirty.discard(chat_id)
+        self.backend.delete(chat_id)
+
+    def evict_idle(self) -> int:
+        """
+        Удалить сессии без активности дольше idle_ttl. Сессия с очередью черновиков не удаляется:
+        она сохраняется в backend и уходит из памяти (в памяти без backend - остается).
+        """
+        deadline = time.monotonic() - self.idle_ttl
+        with self._lock:
+            expired = [chat_id for chat_id, seen in self._last_seen.items() if seen < deadline]
+            with_drafts = {chat_id for chat_id in expired if self._sessions[chat_id].drafts}
+        for chat_id in with_drafts:
+            self._park(chat_id)
+        expired = [chat_id for chat_id in expired if chat_id not in with_drafts]
+        for chat_id in expired:
+            self.delete(chat_id)
+        purged = self.backend.purge_older_than(time.time() - self.idle_ttl)
+        self.evicted_idle += len(expired)
+        if expired or purged:
+            logger.info(f"Idle sessions removed: {len(expired)} in memory, {purged} stored")
+        return len(expired)
+
+    def _park(self, chat_id: int):
+        """Сохранить сессию в backend и освободить память; get() загрузит ее обратно"""
+        if not self.backend.persistent:
+            return
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                return
+            try:
+                self.backend.save(session)
+            except Exception as e:
+                logger.warning(f"Could not save idle session {chat_id}, keeping it in memory: {e}")
+                return
+            self._sessions.pop(chat_id, None)
+            self._last_seen.pop(chat_id, None)
+            self._dirty.discard(chat_id)
+
+    def flush(self):
+        """Записать измененные сессии в backend"""
+        with self._lock:
+            dirty = [self._sessions[chat_id] for chat_id in self._dirty if chat_id in self._sessions]
+            self._dirty.clear()
+        for session in dirty:
+            try:
+                self.backend.save(session)
+            except Exception as e:
+                logger.warning(f"Could not save session {session.chat_id}: {e}")
+
+    def maintain(self):
+        self.evict_idle()
+        self.flush()
+
+    def close(self):
+        self.flush()
+        self.backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evicted_idle": self.evicted_idle,
+                "evicted_lru": self.evicted_lru,
+            }
+
+
+def create_session_store() -> SessionStore:
+    """Хранилище по настройкам: session_backend = memory | sqlite"""
+    if settings.session_backend == "sqlite":
+        backend = SQLiteSessionBackend(settings.session_db_path)
+    else:
+        backend = MemorySessionBackend()
+    return SessionStore(
+        backend=backend,
+        idle_ttl=settings.session_idle_ttl,
+        max_sessions=settings.session_max,
+    )
@@ -0,0 +1,44 @@
+"""
+Общий код на корутинах (обработчики, src/publishing.py, рассылка) в синхронном режиме.
+Все, что он ждет, здесь - обычный блокирующий вызов, поэтому корутина выполняется
+до конца за один шаг, без цикла событий.
+"""
+
+
+def run_sync(coro):
+    """
+    Выполнить корутину до конца в текущем потоке.
+    В синхронном режиме все, что ждут обработчики (AwaitableBot, SyncRuntime), завершается сразу,
+    и корутина доходит до конца за один шаг. Если она все же уступила управление - она ждет
+    что-то из asyncio, а цикла событий здесь нет.
+    """
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError(f"{coro.__qualname__} ждет цикл событий asyncio в синхронном режиме")
+
+
+def call_sync(coroutine_function, *args):
+    """coroutine_function(*args) до конца - для планировщика, пулов и колбэков из других потоков"""
+    return run_sync(coroutine_function(*args))
+
+
+def awaitable(function):
+    """Блокирующая функция как корутинная: ее результат готов сразу"""
+
+    async def call(*args, **kwargs):
+        return function(*args, **kwargs)
+
+    return call
+
+
+class AwaitableBot:
+    """TeleBot для общего кода: метод возвращает корутину, которая сразу выполняет запрос"""
+
+    def __init__(self, bot):
+        self._bot = bot
+
+    def __getattr__(self, name):
+        return awaitable(getattr(self._bot, name))
@@ -0,0 +1,152 @@
+"""
+Трассировка публикации: один trace_id на пост (UserSession.trace_id) от ссылки до каналов.
+
+Шаги оформляются как span'ы (with span("fetch"): ...). Завершенный span пишется
+JSON-строкой в логгер mybot.trace (stdout или settings.trace_log_path):
+    {"trace_id": ..., "span_id": ..., "parent_id": ..., "span": "fetch", "duration_ms": 812.4, ...}
+
+Разбор лога - самые медленные посты и их самые медленные шаги:
+    python -m src.tracing bot.log
+"""
+import contextvars
+import functools
+import json
+import logging
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .config import settings
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_chat_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("trace_chat_id", default=None)
+_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span_id", default=None)
+
+trace_logger = logging.getLogger("mybot.trace")
+
+
+def _configure_logger():
+    if trace_logger.handlers:
+        return
+    if settings.trace_log_path:
+        handler: logging.Handler = logging.FileHandler(settings.trace_log_path, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False  # JSON не должен обрастать префиксом общего формата
+
+
+_configure_logger()
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def bind_trace(trace_id: Optional[str], chat_id: Optional[int] = None):
+    """Сделать trace_id текущим до конца обработки обновления (см. instrumentation.instrumented)"""
+    _trace_id.set(trace_id)
+    if chat_id is not None:
+        _chat_id.set(chat_id)
+
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """
+    Шаг публикации. Пишется, только если к концу шага известен trace_id:
+    вне поста (бенчмарки, тесты) span'ы ничего не стоят.
+    В attrs можно дописывать поля внутри блока: with span("x") as fields: fields["n"] = 3
+    """
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    started_at = time.time()
+    started = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield attrs
+    except BaseException as e:
+        status, error = "error", type(e).__name__
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        _span_id.reset(token)
+        trace_id = _trace_id.get()
+        if trace_id and settings.tracing_enabled:
+            record = {
+                "trace_id": trace_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "span": name,
+                "chat_id": _chat_id.get(),
+                "start": round(started_at, 3),
+                "duration_ms": round(duration_ms, 1),
+                "status": status,
+                **({"error": error} if error else {}),
+                **attrs,
+            }
+            trace_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def propagate(function: Callable) -> Callable:
+    """
+    Обернуть задачу для пула потоков так, чтобы она шла в текущем trace.
+    Копия контекста снимается при вызове propagate - оборачивать каждую отправку в пул отдельно.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, function)
+
+
+def load_records(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """JSON-записи span'ов из лога (прочие строки пропускаются)"""
+    records = []
+    for line in lines:
+        start = line.find("{")
+        if start < 0 or '"trace_id"' not in line:
+            continue
+        try:
+            records.append(json.loads(line[start:]))
+        except ValueError:
+            continue
+    return records
+
+
+def slowest_posts(records: List[Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
+    """Посты по убыванию общей длительности и самый долгий шаг каждого"""
+    by_trace: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        by_trace[record["trace_id"]].append(record)
+    posts = []
+    for trace_id, spans in by_trace.items():
+        begin = min(s["start"] for s in spans)
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in spans)
+        leaves = [s for s in spans if not any(o.get("parent_id") == s["span_id"] for o in spans)] or spans
+        slowest = max(leaves, key=lambda s: s["duration_ms"])
+        posts.append({
+            "trace_id": trace_id,
+            "chat_id": next((s["chat_id"] for s in spans if s.get("chat_id") is not None), None),
+            "total_ms": round((end - begin) * 1000, 1),
+            "spans": len(spans),
+            "errors": sum(1 for s in spans if s.get("status") == "error"),
+            "slowest_span": slowest["span"],
+            "slowest_ms": slowest["duration_ms"],
+        })
+    return sorted(posts, key=lambda p: -p["total_ms"])[:limit]
+
+
+if __name__ == "__main__":
+    source = open(sys.argv[1], encoding="utf-8") if len(sys.argv) > 1 else sys.stdin
+    with source:
+        for post in slowest_posts(load_records(source)):
+            print(f"{post['trace_id']} chat={post['chat_id']} total={post['total_ms']:.0f} ms "
+                  f"spans={post['spans']} errors={post['errors']} "
+                  f"slowest={post['slowest_span']} ({post['slowest_ms']:.0f} ms)")
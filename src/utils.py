@@ -1,160 +1,139 @@
-import os
-import requests
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
 from telebot import TeleBot
-from telebot.types import InputMediaPhoto,  InputFile
+from telebot.types import Message
 from src.session import UserSession
 import logging
 from .config import settings
+from .media_cache import media_cache
+from .channels import channel_registry
+from .image_check import image_validator
+from .instrumentation import emit, FIRST_PREVIEW, PREVIEW_READY
+from .profiling import profiler
+from . import publishing
+from .publishing import Transport, is_current_post
+from .sync_bridge import AwaitableBot, awaitable, run_sync
+from .tracing import propagate
 
 logger = logging.getLogger(__name__)
 
+# Background media stage of previews (start_preview_pipeline)
+_preview_executor = ThreadPoolExecutor(max_workers=settings.preview_workers, thread_name_prefix="preview")
+
+
+def _run_stage(coro):
+    """Runs a shared coroutine (src/publishing.py) in this thread; profiled in cpu mode like any stage."""
+    return profiler.run(run_sync, coro)
+
+
+def _transport(bot: TeleBot) -> Transport:
+    """TeleBot for the shared sending code: blocking Bot API calls and URL checks."""
+
+    def check_urls(urls):
+        return {url: is_valid_image_url(url) for url in urls}
+
+    return Transport(AwaitableBot(bot), awaitable(validate_session_media), awaitable(check_urls))
+
 
 def is_valid_image_url(url: str) -> bool:
     """
     Checks if the given URL points to a valid image resource (status 200 and content-type includes 'image').
+    Verdicts are cached for settings.image_check_ttl seconds.
     """
-    try:
-        resp = requests.head(url, timeout=5, allow_redirects=True)
-        if resp.status_code == 200 and 'image' in resp.headers.get('content-type', ''):
-            return True
-        else:
-            logger.warning(f"URL does not point to a valid image: {url} (status: {resp.status_code}, content-type: {resp.headers.get('content-type')})")
-            return False
-    except Exception as e:
-        logger.warning(f"Error checking image URL {url}: {e}")
-        return False
+    return image_validator.is_valid(url)
 
 
-def send_photos_to_destination(bot: TeleBot, destination_id: str, session: UserSession) -> bool:
-    """Simplified media sending with file/video existence and image URL validation."""
-    try:
-        photos = session.selected_photos
-        videos = session.selected_videos
-
-        logger.info(f"SEND TO {destination_id}: {len(photos)} photo(s), {len(videos)} video(s)")
-
-        # Removed separate text sending to avoid duplication
-
-        # Send videos (if any)
-        if videos:
-            for video in videos:
-                try:
-                    if video.is_custom and video.file_path:
-                        if not os.path.exists(video.file_path):
-                            logger.warning(f"Video file does not exist, skipping: {video.file_path}")
-                            continue
-                        logger.info(f"Sending video: {video.file_path}")
-                        video_input = InputFile(video.file_path)
-                        bot.send_video(destination_id, video_input)
-                        logger.info(f"Video sent: {video.file_path}")
-                except Exception as e:
-                    logger.error(f"Error sending video: {e}")
-
-        # Send photos as a group (if any)
-        if photos:
-            media_group = []
-            for i, photo in enumerate(photos):
-                try:
-                    caption = session.text if i == 0 else None
-                    parse_mode = 'HTML' if i == 0 else None
-                    if photo.is_custom and photo.file_path:
-                        if not os.path.exists(photo.file_path):
-                            logger.warning(f"Photo file does not exist, skipping: {photo.file_path}")
-                            continue
-                        photo_input = InputFile(photo.file_path)
-                        media_group.append(InputMediaPhoto(photo_input, caption=caption, parse_mode=parse_mode))
-                    else:
-                        # Photo by URL, check if it's a valid image URL
-                        if not is_valid_image_url(photo.url):
-                            logger.warning(f"Skipping invalid image URL: {photo.url}")
-                            continue
-                        media_group.append(InputMediaPhoto(photo.url, caption=caption, parse_mode=parse_mode))
-                except Exception as e:
-                    logger.error(f"Error preparing photo: {e}")
-                    continue
-
-            if media_group:
-                # Split into groups of 10
-                for i in range(0, len(media_group), 10):
-                    bot.send_media_group(destination_id, media_group[i:i + 10])
-                logger.info(f"SENT {len(media_group)} photo(s) to {destination_id}")
-
-        return True
+def validate_session_media(session: UserSession) -> dict:
+    """
+    Checks all web photo URLs of the session concurrently in one pass.
+    Later is_valid_image_url calls for the preview and every channel hit the cache.
+    """
+    return run_sync(publishing.validate_session_media(awaitable(image_validator.validate_many), session))
+
+
+def has_uncached_local_media(session: UserSession) -> bool:
+    """True if at least one selected local file has no cached file_id yet."""
+    return any(
+        media.is_local_file and not media_cache.contains(media.file_path, media.media_type)
+        for media in session.get_all_media()
+    )
+
+
+def send_photos_to_destination(bot: TeleBot, destination_id: str, session: UserSession,
+                               timeout: Optional[int] = None, sent: Optional[List[int]] = None) -> bool:
+    """
+    Publishes the post to one channel (publishing.send_post).
+    `timeout` is the budget for the whole send, shared by all of its Bot API requests.
+    `sent` collects the ids of the published messages (for copyMessages to other channels).
+    """
+    return _run_stage(publishing.send_post(_transport(bot), destination_id, session, timeout, sent))
+
+
+def send_preview_text(bot: TeleBot, session: UserSession) -> Message:
+    """Sends the text part of the preview and remembers it for in-place edits."""
+    return _run_stage(publishing.send_preview_text(AwaitableBot(bot), session))
+
+
+def send_preview_media(bot: TeleBot, session: UserSession, generation: Optional[str] = None):
+    """Sends preview videos and the photo album, with file existence and image URL validation."""
+    return _run_stage(publishing.send_preview_media(_transport(bot), session, generation))
 
-    except Exception as e:
-        logger.error(f"General sending error: {e}")
-        return False
-    
 
 def send_preview(bot: TeleBot, session: UserSession):
     """Enhanced preview with separation of photos and videos, file existence and image URL validation."""
-    try:
-        chat_id = session.chat_id
-        photos = session.selected_photos
-        videos = session.selected_videos
-
-        # Send preview text
-        preview_text = f"TEXT PREVIEW:\n\n{session.text}\n\n"
-        preview_text += f"Media: {len(photos)} photo(s), {len(videos)} video(s)"
-
-        bot.send_message(chat_id, preview_text, parse_mode='HTML')
-
-        # Send videos (if any)
-        if videos:
-            for i, video in enumerate(videos):
-                try:
-                    if video.is_custom and video.file_path:
-                        if not os.path.exists(video.file_path):
-                            logger.warning(f"Video file does not exist for preview, skipping: {video.file_path}")
-                            continue
-                        # Use InputFile for video
-                        video_input = InputFile(video.file_path)
-                        caption = f"VIDEO {i+1}/{len(videos)}" if len(videos) > 1 else "VIDEO"
-                        msg = bot.send_video(chat_id, video_input, caption=caption)
-                        logger.info(f"My {msg}")
-                        logger.info(f"Sent video preview for chat {chat_id}")
-                    else:
-                        logger.warning(f"Video file not found for preview: {getattr(video, 'file_path', 'N/A')}")
-                except Exception as e:
-                    logger.error(f"Error sending video preview: {e}")
-                    bot.send_message(chat_id, f"Error loading video: {e}")
-
-        # Send photos (if any)
-        if photos:
-            media_group = []
-            for i, photo in enumerate(photos):
-                try:
-                    if photo.is_custom and photo.file_path:
-                        if not os.path.exists(photo.file_path):
-                            logger.warning(f"Photo file does not exist for preview, skipping: {photo.file_path}")
-                            continue
-                        # Local files - use InputFile
-                        photo_input = InputFile(photo.file_path)
-                        caption = f"PHOTO {i+1}/{len(photos)}" if i == 0 and len(photos) > 1 else ""
-                        media_group.append(InputMediaPhoto(photo_input, caption=caption))
-                    else:
-                        # Photo by URL, check if it's a valid image URL
-                        if not is_valid_image_url(photo.url):
-                            logger.warning(f"Skipping invalid image URL for preview: {photo.url}")
-                            continue
-                        caption = f"PHOTO {i+1}/{len(photos)}" if i == 0 and len(photos) > 1 else ""
-                        media_group.append(InputMediaPhoto(photo.url, caption=caption))
-                except Exception as e:
-                    logger.error(f"Error preparing photo preview: {e}")
-                    continue
-
-            if media_group:
-                try:
-                    # Split into groups of 10
-                    for i in range(0, len(media_group), 10):
-                        bot.send_media_group(chat_id, media_group[i:i + 10])
-                    logger.info(f"✅ Sent {len(media_group)} photo preview(s) for chat {chat_id}")
-                except Exception as e:
-                    logger.error(f"Error sending media group preview: {e}")
+    return _run_stage(publishing.send_preview(_transport(bot), session))
+
+
+def update_preview(bot: TeleBot, session: UserSession) -> bool:
+    """
+    Edits the sent preview in place after a text edit, reorder or removal (publishing.update_preview).
+    Returns True if the preview was updated in place, False if it was sent again.
+    """
+    return _run_stage(publishing.update_preview(_transport(bot), session))
+
 
+def start_preview_pipeline(bot: TeleBot, session: UserSession,
+                           on_ready: Optional[Callable[[], None]] = None,
+                           started_at: Optional[float] = None) -> Future:
+    """
+    Pipelined preview: the text goes out immediately, while image URL validation and
+    media upload run in the background. `on_ready` is called once the media are sent
+    (e.g. to show the action menu). Emits FIRST_PREVIEW and PREVIEW_READY timings.
+    The media stage runs outside the chat's update order: if the post is cleared or replaced
+    meanwhile, it stops and neither touches the new post nor shows the menu.
+    """
+    chat_id = session.chat_id
+    started_at = started_at if started_at is not None else time.monotonic()
+    generation = session.trace_id
+    text_sent = threading.Event()
+
+    def media_stage():
+        try:
+            # Runs while the text preview is still being sent
+            validate_session_media(session)
+            text_sent.wait(timeout=30)
+            if not is_current_post(session, generation):
+                return
+            send_preview_media(bot, session, generation)
+            emit(PREVIEW_READY, chat_id=chat_id, seconds=time.monotonic() - started_at)
+        except Exception as e:
+            logger.error(f"Error sending preview media: {e}")
+        finally:
+            if on_ready and is_current_post(session, generation):
+                on_ready()
+
+    future = _preview_executor.submit(propagate(media_stage))
+    try:
+        send_preview_text(bot, session)
+        emit(FIRST_PREVIEW, chat_id=chat_id, seconds=time.monotonic() - started_at)
     except Exception as e:
         logger.error(f"Error sending preview: {e}")
         bot.send_message(chat_id, f"Error creating preview: {e}")
+    finally:
+        text_sent.set()
+    return future
 
 def create_photo_markup(session: UserSession):
     """Обновленная клавиатура для управления медиа"""
@@ -214,9 +193,11 @@ def create_multi_channel_markup():
     # Кнопка "Только себе"
     markup.add(types.InlineKeyboardButton("Only Myself", callback_data="send_self_only"))
     
-    # Кнопки для конкретных каналов
+    # Кнопки для конкретных каналов; права бота - из реестра каналов
     for name, channel_id in settings.all_channels:
-        markup.add(types.InlineKeyboardButton(f"{name}", callback_data=f"send_to_{channel_id}"))
+        channel = channel_registry.get(channel_id)
+        label = f"{name} (нет прав)" if channel and channel.can_post is False else f"{name}"
+        markup.add(types.InlineKeyboardButton(label, callback_data=f"send_to_{channel_id}"))
     
     return markup
 
@@ -229,4 +210,28 @@ def create_confirmation_markup():
         types.InlineKeyboardButton("Yes, Send", callback_data="confirm_send"),
         types.InlineKeyboardButton("Cancel", callback_data="cancel_send")
     )
-    return markup
\ No newline at end of file
+    return markup
+
+def create_drafts_markup(count: int):
+    """Создает меню очереди черновиков (массовая загрузка ссылок)"""
+    from telebot import types
+    
+    markup = types.InlineKeyboardMarkup(row_width=1)
+    if count:
+        markup.add(
+            types.InlineKeyboardButton(f"Open Next Draft ({count})", callback_data="bulk_next"),
+            types.InlineKeyboardButton("Publish All Everywhere", callback_data="bulk_publish_all"),
+            types.InlineKeyboardButton("Clear Queue", callback_data="bulk_clear"),
+        )
+    return markup
+
+def create_bulk_confirmation_markup():
+    """Создает меню подтверждения публикации всей очереди"""
+    from telebot import types
+    
+    markup = types.InlineKeyboardMarkup()
+    markup.add(
+        types.InlineKeyboardButton("Yes, Publish All", callback_data="bulk_publish_confirm"),
+        types.InlineKeyboardButton("Cancel", callback_data="bulk_publish_cancel")
+    )
+    return markup
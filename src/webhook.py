@@ -0,0 +1,79 @@
+import atexit
+import logging
+
+from flask import Flask, Response, abort, jsonify, request
+from telebot import types
+
+from src import metrics
+from src.config import settings
+from src.handlers import start_background_jobs
+from src.main import create_runtime, shutdown
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhook"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+_state = {"ready": False, "updates": 0}
+
+
+def setup_webhook(bot):
+    """
+    Зарегистрировать webhook в Telegram (если задан WEBHOOK_URL).
+    Обновления, пришедшие пока под перезапускался, по умолчанию сохраняются и будут доставлены.
+    """
+    if not settings.webhook_url:
+        logger.warning("WEBHOOK_URL не задан - webhook в Telegram не регистрируется")
+        return
+    bot.set_webhook(
+        url=settings.webhook_url.rstrip("/") + WEBHOOK_PATH,
+        secret_token=settings.webhook_secret or None,
+        drop_pending_updates=settings.webhook_drop_pending_updates,
+    )
+    logger.info(f"Webhook зарегистрирован: {settings.webhook_url}")
+
+
+def create_app(register_webhook: bool = True) -> Flask:
+    """
+    Flask-приложение для режима webhook.
+    Обновления передаются тем же обработчикам, что и в long polling (src.main).
+    Запуск: gunicorn -w 1 --threads 8 -b 0.0.0.0:8080 'src.webhook:create_app()'
+    """
+    bot = create_runtime().raw_bot
+    app = Flask(__name__)
+
+    @app.post(WEBHOOK_PATH)
+    def receive_update():
+        if settings.webhook_secret and request.headers.get(SECRET_HEADER) != settings.webhook_secret:
+            abort(403)
+        update = types.Update.de_json(request.get_data(as_text=True))
+        if update is None:
+            abort(400)
+        bot.process_new_updates([update])
+        _state["updates"] += 1
+        return "", 200
+
+    @app.get("/healthz")
+    def liveness():
+        return jsonify(status="ok", updates=_state["updates"])
+
+    @app.get("/readyz")
+    def readiness():
+        if not _state["ready"]:
+            return jsonify(status="starting"), 503
+        return jsonify(status="ready")
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+    if register_webhook:
+        setup_webhook(bot)
+    start_background_jobs()
+    atexit.register(shutdown)
+    _state["ready"] = True
+    return app
+
+
+if __name__ == "__main__":
+    create_app().run(host="0.0.0.0", port=settings.webhook_port)
@@ -0,0 +1,11 @@
+import pytest
+
+from src.media_cache import media_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_media_cache(tmp_path, monkeypatch):
+    """Глобальный кэш file_id пишет во временный каталог теста, а не в data/ репозитория"""
+    monkeypatch.setattr(media_cache, "path", str(tmp_path / "media_cache.json"))
+    monkeypatch.setattr(media_cache, "_entries", {})
+    yield media_cache
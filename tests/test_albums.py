@@ -0,0 +1,121 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+from telebot.types import InputMediaPhoto, InputMediaVideo
+
+from src import async_utils
+from src.albums import CAPTION_LIMIT, album_sizes, build_post
+from src.session import UserSession
+from src.utils import send_photos_to_destination
+
+
+def make_session(tmp_path, photos=3, videos=1, text="<b>Rolex</b>"):
+    session = UserSession(chat_id=1, text=text)
+    session.add_web_photos([f"https://img/{i}.jpg" for i in range(photos)])
+    paths = []
+    for i in range(videos):
+        path = tmp_path / f"video{i}.mp4"
+        path.write_bytes(b"video")
+        paths.append(str(path))
+    session.add_custom_videos(paths)
+    return session
+
+
+def test_album_sizes_use_fewest_groups_without_single_items():
+    assert album_sizes(0) == []
+    assert album_sizes(1) == [1]
+    assert album_sizes(10) == [10]
+    assert album_sizes(11) == [6, 5]
+    assert album_sizes(21) == [7, 7, 7]
+
+
+def test_mixed_album_keeps_session_order_and_caption_once(tmp_path):
+    session = make_session(tmp_path)
+
+    plan = build_post(session, {}, media_input=lambda media: "file-id")
+
+    assert plan.calls == 1 and plan.text is None
+    inputs = plan.albums[0].inputs
+    assert [type(item) for item in inputs] == [InputMediaPhoto] * 3 + [InputMediaVideo]
+    assert [item.caption for item in inputs] == ["<b>Rolex</b>", None, None, None]
+    assert inputs[0].parse_mode == "HTML"
+
+
+def test_long_text_goes_as_separate_message(tmp_path):
+    session = make_session(tmp_path, text="x" * (CAPTION_LIMIT + 1))
+
+    plan = build_post(session, {"https://img/1.jpg": False}, media_input=lambda media: "file-id")
+
+    assert plan.text == session.text
+    assert plan.calls == 2
+    assert plan.skipped == 1
+    assert all(item.caption is None for item in plan.albums[0].inputs)
+
+
+def test_send_to_destination_is_one_call_per_album(tmp_path):
+    bot = Mock()
+    bot.send_media_group.side_effect = lambda chat_id, media, **kw: [Mock(video=None, photo=None) for _ in media]
+    session = make_session(tmp_path, photos=9, videos=2)
+
+    with patch("src.utils.is_valid_image_url", return_value=True):
+        assert send_photos_to_destination(bot, "@channel", session)
+
+    # 11 медиа: два альбома 6 + 5 вместо двух send_video и двух альбомов
+    assert [len(call.args[1]) for call in bot.send_media_group.call_args_list] == [6, 5]
+    bot.send_video.assert_not_called()
+    bot.send_message.assert_not_called()
+
+
+def test_single_item_is_sent_without_media_group(tmp_path):
+    bot = Mock()
+    session = make_session(tmp_path, photos=0, videos=1)
+
+    assert send_photos_to_destination(bot, "@channel", session)
+
+    bot.send_media_group.assert_not_called()
+    assert bot.send_video.call_args.kwargs["caption"] == "<b>Rolex</b>"
+
+
+def test_sync_and_async_send_make_the_same_calls(tmp_path):
+    session = make_session(tmp_path, photos=9, videos=2, text="x" * (CAPTION_LIMIT + 1))
+    sync_bot = Mock()
+    sync_bot.send_message.return_value = Mock(message_id=1)
+    sync_bot.send_media_group.side_effect = lambda chat_id, media, **kw: [Mock(video=None, photo=None) for _ in media]
+    async_bot = Mock()
+    async_bot.send_message = AsyncMock(return_value=Mock(message_id=1))
+    async_bot.send_media_group = AsyncMock(side_effect=sync_bot.send_media_group.side_effect)
+    verdicts = {photo.url: True for photo in session.get_web_photos()}
+
+    with patch("src.utils.is_valid_image_url", return_value=True), \
+            patch("src.async_utils.image_validator.validate_many_async", AsyncMock(return_value=verdicts)):
+        assert send_photos_to_destination(sync_bot, "@channel", session, timeout=5)
+        assert asyncio.run(async_utils.send_photos_to_destination(async_bot, "@channel", session, timeout=5))
+
+    # Одна реализация (src/publishing.py): режимы различаются только транспортом
+    assert async_bot.send_message.call_args_list == sync_bot.send_message.call_args_list
+    def albums(bot):
+        return [[(type(item), item.caption) for item in call.args[1]] for call in bot.send_media_group.call_args_list]
+
+    assert albums(async_bot) == albums(sync_bot)
+    assert [len(album) for album in albums(sync_bot)] == [6, 5]
+
+
+def test_timeout_is_a_budget_for_the_whole_send(tmp_path):
+    clock = [0.0]
+
+    def media_group(chat_id, media, **kwargs):
+        clock[0] += 60
+        return [Mock(video=None, photo=None, message_id=i) for i, _ in enumerate(media)]
+
+    bot = Mock()
+    bot.send_media_group.side_effect = media_group
+    session = make_session(tmp_path, photos=9, videos=12)
+    sent = []
+
+    with patch("src.utils.is_valid_image_url", return_value=True), \
+            patch("src.publishing.time.monotonic", side_effect=lambda: clock[0]):
+        assert not send_photos_to_destination(bot, "@channel", session, timeout=100, sent=sent)
+
+    # Три альбома по 7: третий уже не укладывается в 100 секунд на канал
+    assert [call.kwargs["timeout"] for call in bot.send_media_group.call_args_list] == [100, 40]
+    assert len(sent) == 14
@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from telebot import asyncio_helper, types
+
+from src.chat_executor import ChatOrderedAsyncTeleBot
+from src.dispatcher import fan_out_async
+from src.ratelimit import OutboundGovernor
+from src.session import UserSession
+
+URL = "https://api.telegram.org/bot1:x/"
+CHANNELS = [("A", "@a"), ("B", "@b"), ("C", "@c")]
+
+
+def flood(retry_after):
+    return asyncio_helper.ApiTelegramException(
+        "sendMessage", None, {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": retry_after}})
+
+
+def message(chat_id, message_id):
+    return types.Message.de_json({
+        "message_id": message_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "hi"})
+
+
+def test_async_governor_retries_429_with_same_params():
+    process_request = AsyncMock(side_effect=[flood(3), {"message_id": 1}])
+    governor = OutboundGovernor(sender=Mock())
+    params = {"chat_id": "@channel", "text": "hi", "timeout": 10}
+
+    with patch("src.ratelimit.asyncio.sleep", new=AsyncMock()) as sleep:
+        result = asyncio.run(governor.send_async(process_request, "1:x", URL + "sendMessage", "post", params))
+
+    assert result == {"message_id": 1}
+    assert process_request.await_count == 2
+    # Повтор уходит с тем же таймаутом, хотя _process_request забирает его из params
+    assert [call.args[3]["timeout"] for call in process_request.await_args_list] == [10, 10]
+    assert any(call.args[0] >= 2.9 for call in sleep.await_args_list)
+    assert governor.stats()["flood_errors"] == 1
+
+
+def test_async_bot_serializes_updates_of_one_chat():
+    bot = ChatOrderedAsyncTeleBot("1:x")
+    running = {1: 0, 2: 0}
+    overlaps = []
+    order = []
+
+    async def handler(update):
+        chat_id = update.chat.id
+        running[chat_id] += 1
+        if running[chat_id] > 1:
+            overlaps.append(chat_id)
+        await asyncio.sleep(0.05 if (chat_id, update.message_id) == (1, 0) else 0)
+        order.append((chat_id, update.message_id))
+        running[chat_id] -= 1
+
+    bot.register_message_handler(handler)
+
+    async def run():
+        updates = [message(1, n) for n in range(5)] + [message(2, n) for n in range(3)]
+        await bot.process_new_messages(updates)
+        assert await bot.join(timeout=1)
+
+    asyncio.run(run())
+
+    assert overlaps == []
+    assert [n for chat_id, n in order if chat_id == 1] == list(range(5))
+    # Чат 2 не ждет медленное первое обновление чата 1
+    assert order.index((2, 2)) < order.index((1, 0))
+    assert bot.stats()["executed"] == 8
+
+
+def test_async_bot_rejects_when_chat_queue_is_full():
+    rejected = []
+
+    async def on_reject(chat_id, update, first):
+        rejected.append((update.message_id, first))
+
+    bot = ChatOrderedAsyncTeleBot("1:x", chat_queue_limit=1, on_reject=on_reject)
+
+    async def handler(update):
+        await asyncio.sleep(0.01)
+
+    bot.register_message_handler(handler)
+    # 0 в работе, 1 ждет, 2 и 3 лишние
+    asyncio.run(bot.process_new_messages([message(7, n) for n in range(4)]))
+
+    assert rejected == [(2, True), (3, False)]
+    assert bot.stats()["rejected"] == 2
+
+
+def test_fan_out_async_keeps_order_and_retries():
+    calls = []
+
+    async def send(bot, destination_id, session, timeout=None, sent=None):
+        calls.append(destination_id)
+        if destination_id == "@b" and calls.count("@b") == 1:
+            raise RuntimeError("flood")
+        return True
+
+    with patch("src.dispatcher.has_uncached_local_media", return_value=True), \
+            patch("src.dispatcher.asyncio.sleep", new=AsyncMock()):
+        results = asyncio.run(fan_out_async(Mock(), CHANNELS, UserSession(chat_id=1), send=send))
+
+    assert calls[0] == "@a"
+    assert [r[0] for r in results] == ["A", "B", "C"]
+    assert all(r[2] for r in results)
+    assert calls.count("@b") == 2
+
+
+def test_shared_handler_coroutine_runs_without_event_loop_in_sync_mode():
+    from src.main import AwaitableBot, run_sync
+
+    telebot = Mock()
+    telebot.send_message.return_value = "sent"
+    bot = AwaitableBot(telebot)
+
+    async def handler(chat_id):
+        return await bot.send_message(chat_id, "hi")
+
+    class Suspend:
+        def __await__(self):
+            yield  # Как будущий результат из цикла событий
+
+    async def waits_for_loop():
+        await Suspend()
+
+    assert run_sync(handler(1)) == "sent"
+    telebot.send_message.assert_called_once_with(1, "hi")
+    with pytest.raises(RuntimeError, match="waits_for_loop"):
+        run_sync(waits_for_loop())
+
+
+def test_async_preview_items_are_not_written_into_a_newer_post():
+    from src.async_utils import start_preview_pipeline
+
+    session = UserSession(chat_id=1, text="<b>Rolex</b>")
+    session.add_web_photos(["https://img/1.jpg"])
+    bot = Mock(send_message=AsyncMock(return_value=message(1, 10)))
+
+    async def media_group_sent_after_clear(chat_id, media, **kwargs):
+        session.clear()
+        session.text = "<b>Omega</b>"
+        return [message(1, 11)]
+
+    bot.send_media_group = AsyncMock(side_effect=media_group_sent_after_clear)
+    on_ready = AsyncMock()
+
+    async def run():
+        with patch("src.async_utils.validate_session_media", AsyncMock(return_value={"https://img/1.jpg": True})):
+            task = await start_preview_pipeline(bot, session, on_ready=on_ready)
+            await task
+
+    asyncio.run(run())
+
+    bot.send_media_group.assert_awaited_once()
+    assert session.preview_items == []
+    on_ready.assert_not_awaited()
+
+
+def test_importing_runtimes_builds_no_bot():
+    import subprocess
+    import sys
+
+    code = ("import src.main, src.async_main, src.handlers; "
+            "assert src.handlers.runtime is None and src.main._runtime is None and src.async_main._runtime is None")
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+
+
+def test_handlers_are_installed_for_one_runtime_only(monkeypatch):
+    from src import handlers
+
+    monkeypatch.setattr(handlers, "runtime", Mock(name="sync"))
+    with pytest.raises(RuntimeError, match="уже зарегистрированы"):
+        handlers.install(Mock())
+
+
+def test_scheduled_action_does_not_block_scheduler_thread(caplog):
+    from src import async_main
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def slow():
+        await asyncio.sleep(0.5)
+
+    async def failing():
+        raise ValueError("boom")
+
+    try:
+        with patch.object(async_main, "_loop", loop):
+            started = time.monotonic()
+            async_main._run_scheduled(slow)
+            async_main._run_scheduled(failing)
+            assert time.monotonic() - started < 0.2
+
+            deadline = time.monotonic() + 5
+            while async_main._scheduled and time.monotonic() < deadline:
+                time.sleep(0.01)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    assert not async_main._scheduled
+    assert "Scheduled action failed: ValueError('boom')" in caplog.text
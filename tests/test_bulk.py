@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from src.bulk import (MAX_REPORTED_ERRORS, BulkProgress, extract_links, limit_links, load_draft, parse_links,
+                      queue_drafts, result_draft)
+from src.parser import LombardParser
+from src.session import UserSession
+
+LINKS = [f"https://lombard-perspectiva.ru/clock/{i}/" for i in range(4)]
+
+
+def fake_parser(barrier=None, delay=0.0):
+    """
+    parse ждет на barrier: пройдет, только если страницы грузятся одновременно.
+    delay - пауза, тем длиннее, чем раньше ссылка: страницы готовы в обратном порядке
+    """
+    parser = Mock()
+
+    def parse(url):
+        if barrier is not None:
+            barrier.wait(timeout=2)
+        time.sleep(delay * (len(LINKS) - int(url[-2])))
+        if url.endswith("/2/"):
+            raise ValueError("404")
+        return f"<b>Rolex {url[-2]}</b>\nОписание", [f"https://img/{url[-2]}.jpg"]
+
+    parser.parse.side_effect = parse
+    parser.get_custom_photos.return_value = []
+    parser.get_custom_videos.return_value = []
+    return parser
+
+
+def test_extract_links_from_pasted_text():
+    text = (f"Новые часы:\n{LINKS[0]}, {LINKS[1]}.\n"
+            f"повтор {LINKS[0]} и чужая https://example.com/clock/1/ ({LINKS[2]})")
+
+    assert extract_links(text) == LINKS[:3]
+    assert extract_links(None) == []
+
+
+def test_links_are_parsed_concurrently_into_draft_queue():
+    session = UserSession(chat_id=1)
+    parser = fake_parser(threading.Barrier(len(LINKS)))
+    progress = BulkProgress(len(LINKS), interval=0)
+    drafts = [None] * len(LINKS)
+
+    def on_done(index, result):
+        drafts[index] = result_draft(session, parser, LINKS[index], result, progress)
+
+    parse_links(parser, LINKS, on_done, workers=len(LINKS))
+    queue_drafts(session, drafts, progress)
+
+    assert [draft["url"] for draft in session.drafts] == [LINKS[0], LINKS[1], LINKS[3]]
+    assert progress.failed == [(LINKS[2], "404")]
+    assert "Черновиков в очереди: 3" in progress.report(len(session.drafts))
+
+
+def test_drafts_keep_paste_order_not_completion_order():
+    session = UserSession(chat_id=1)
+    parser = fake_parser(delay=0.02)
+    progress = BulkProgress(len(LINKS), interval=0)
+    drafts, finished = [None] * len(LINKS), []
+
+    def on_done(index, result):
+        finished.append(index)
+        drafts[index] = result_draft(session, parser, LINKS[index], result, progress)
+
+    parse_links(parser, LINKS, on_done, workers=len(LINKS))
+    queue_drafts(session, drafts, progress)
+
+    assert finished == [3, 2, 1, 0]
+    assert [draft["url"] for draft in session.drafts] == [LINKS[0], LINKS[1], LINKS[3]]
+
+
+def test_draft_queue_is_capped_and_dropped_links_are_reported():
+    session = UserSession(chat_id=1)
+    parser = fake_parser()
+
+    with patch("src.bulk.settings") as mock_settings:
+        mock_settings.bulk_max_links = 50
+        mock_settings.bulk_max_drafts = 3
+        mock_settings.max_text_length = 4000
+        session.drafts.append({"url": "old"})
+        links, skipped = limit_links(LINKS, len(session.drafts))
+        progress = BulkProgress(len(links), skipped)
+        drafts = [result_draft(session, parser, url, parser.parse(url), progress) for url in links]
+        session.drafts.append({"url": "opened meanwhile"})
+        queue_drafts(session, drafts, progress)
+        report = progress.report(len(session.drafts))
+
+    assert links == LINKS[:2] and skipped == LINKS[2:]
+    assert [draft["url"] for draft in session.drafts] == ["old", "opened meanwhile", LINKS[0]]
+    assert progress.skipped == [LINKS[2], LINKS[3], LINKS[1]]
+    assert all(url in report for url in LINKS[1:])
+
+
+def test_parse_many_reports_each_page():
+    parser = LombardParser(cache=None)
+    parse = fake_parser().parse
+    in_flight, peak = [], []
+
+    async def parse_async(url):
+        in_flight.append(url)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(url)
+        return parse(url)
+
+    parser.parse_async = parse_async
+    done = []
+
+    async def on_done(index, result):
+        done.append((index, isinstance(result, Exception)))
+
+    results = asyncio.run(parser.parse_many(LINKS, concurrency=2, on_done=on_done))
+
+    assert sorted(done) == [(0, False), (1, False), (2, True), (3, False)]
+    assert isinstance(results[2], ValueError)
+    assert max(peak) == 2
+
+
+def test_draft_opens_as_post_and_queue_survives_storage():
+    session = UserSession(chat_id=1, text="старый пост")
+    parser = fake_parser()
+    drafts = [result_draft(session, parser, url, parser.parse(url), BulkProgress(2)) for url in LINKS[:2]]
+    queue_drafts(session, drafts, BulkProgress(2))
+
+    restored = UserSession.from_dict(session.to_dict())
+    draft = restored.drafts.pop(0)
+    load_draft(restored, draft)
+
+    assert restored.url == LINKS[0]
+    assert restored.text.startswith("<b>Rolex 0</b>")
+    assert [photo.url for photo in restored.selected_photos] == ["https://img/0.jpg"]
+    assert [d["url"] for d in restored.drafts] == [LINKS[1]]
+
+
+def test_progress_is_throttled_and_report_is_bounded():
+    progress = BulkProgress(30, interval=60)
+
+    assert not progress.due()  # Интервал еще не прошел с начала
+    for i in range(30):
+        progress.record(f"https://lombard-perspectiva.ru/clock/{i}/", "timeout")
+
+    assert not progress.due()  # Последняя страница - вместо правки итоговый отчет
+    report = progress.report(0)
+    assert report.count("timeout") == MAX_REPORTED_ERRORS
+    assert f"...и еще {30 - MAX_REPORTED_ERRORS}" in report
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, PropertyMock, patch
+
+from src.channels import ChannelRegistry, can_post, describe_channel
+from src.config import Settings
+from src.utils import create_multi_channel_markup
+
+CHANNELS = [("Основной", "@main"), ("Личный", "-100")]
+
+
+def chat(chat_id, title, chat_type="channel"):
+    return Mock(id=chat_id, title=title, username=title.lower(), type=chat_type)
+
+
+def fake_bot(barrier=None):
+    """get_chat ждет на barrier: пройдет, только если каналы опрашиваются одновременно"""
+    chats = {"@main": chat(-1001, "Main"), "-100": chat(-100, "Mine")}
+
+    def get_chat(channel_id):
+        if barrier is not None:
+            barrier.wait(timeout=2)
+        return chats[channel_id]
+
+    bot = Mock()
+    bot.get_me.return_value = Mock(id=7, username="lombard_bot")
+    bot.get_chat.side_effect = get_chat
+    bot.get_chat_member.side_effect = lambda chat_id, user_id: Mock(
+        status="administrator", can_post_messages=chat_id == -1001)
+    return bot
+
+
+def test_refresh_resolves_channels_in_parallel():
+    registry = ChannelRegistry(ttl=60, channels=CHANNELS)
+    bot = fake_bot(threading.Barrier(len(CHANNELS)))
+
+    registry.refresh(bot)
+
+    assert registry.get("@main").title == "Main"
+    assert registry.get(-1001).channel_id == "@main"
+    assert registry.get("@main").can_post is True
+    assert registry.get("-100").can_post is False
+    assert registry.bot_username == "lombard_bot"
+    assert not registry.stale
+
+
+def test_handlers_read_from_memory_without_api_calls():
+    registry = ChannelRegistry(ttl=60, channels=CHANNELS)
+    bot = fake_bot()
+    registry.refresh(bot)
+    bot.reset_mock()
+
+    with patch("src.utils.channel_registry", registry), \
+            patch.object(Settings, "all_channels", new_callable=PropertyMock, return_value=CHANNELS):
+        labels = [row[0].text for row in create_multi_channel_markup().keyboard]
+    text = "\n".join(describe_channel(entry) for entry in registry.all())
+
+    assert labels[-2:] == ["Основной", "Личный (нет прав)"]
+    assert "Бот может публиковать: НЕТ" in text
+    bot.get_chat.assert_not_called()
+
+
+def test_failed_refresh_keeps_last_known_info():
+    registry = ChannelRegistry(ttl=60, channels=CHANNELS)
+    bot = fake_bot()
+    registry.refresh(bot)
+    bot.get_chat.side_effect = RuntimeError("network down")
+
+    registry.refresh(bot)
+
+    assert registry.get("@main").title == "Main"
+    assert registry.stats()["resolved"] == 2
+
+
+def test_async_refresh_gathers_channels():
+    registry = ChannelRegistry(ttl=60, channels=CHANNELS)
+    bot = Mock()
+    bot.get_me = AsyncMock(return_value=Mock(id=7, username="lombard_bot"))
+    in_flight = []
+
+    async def get_chat(channel_id):
+        in_flight.append(channel_id)
+        await asyncio.sleep(0.05)
+        return {"@main": chat(-1001, "Main"), "-100": chat(-100, "Mine")}[channel_id]
+
+    bot.get_chat = get_chat
+    bot.get_chat_member = AsyncMock(side_effect=RuntimeError("member list is inaccessible"))
+
+    started = time.monotonic()
+    entries = asyncio.run(registry.refresh_async(bot))
+
+    assert time.monotonic() - started < 0.1
+    assert [entry.title for entry in entries] == ["Main", "Mine"]
+    assert all(entry.can_post is None for entry in entries)
+
+
+def test_can_post_rules():
+    assert can_post("channel", Mock(status="creator"))
+    assert not can_post("channel", Mock(status="member"))
+    assert can_post("supergroup", Mock(status="member"))
+    assert not can_post("supergroup", Mock(status="restricted", can_send_messages=False))
+    assert can_post("channel", None) is None
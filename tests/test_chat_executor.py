@@ -0,0 +1,109 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from telebot import types
+
+from src.chat_executor import ChatExecutor, ChatOrderedTeleBot, update_chat_id
+
+
+def test_same_chat_runs_in_order_other_chats_in_parallel():
+    executor = ChatExecutor(workers=4, chat_queue_limit=50)
+    running = {1: 0, 2: 0}
+    overlaps = []
+    order = []
+    chat2_done = threading.Event()
+    lock = threading.Lock()
+
+    def handler(chat_id, n):
+        with lock:
+            running[chat_id] += 1
+            if running[chat_id] > 1:
+                overlaps.append((chat_id, n))
+        if chat_id == 1:
+            # Пока чат 1 занят медленной задачей, чат 2 успевает целиком
+            chat2_done.wait(1) if n == 0 else time.sleep(0.001)
+            order.append(n)
+        else:
+            time.sleep(0.001)
+        with lock:
+            running[chat_id] -= 1
+
+    for n in range(10):
+        executor.submit(1, handler, 1, n)
+    for n in range(5):
+        executor.submit(2, handler, 2, n)
+    executor.submit(None, chat2_done.set)  # без чата - вне очередей
+    assert executor.join(timeout=5)
+
+    assert overlaps == []
+    assert order == list(range(10))
+    assert executor.stats()["executed"] == 16
+    executor.shutdown()
+
+
+def test_full_chat_queue_rejects_and_notifies_once():
+    release = threading.Event()
+    rejected = []
+    executor = ChatExecutor(workers=2, chat_queue_limit=2,
+                            on_reject=lambda chat_id, args, first: rejected.append((args, first)))
+
+    assert executor.submit(7, release.wait, 1)   # в работе
+    time.sleep(0.05)
+    assert executor.submit(7, lambda: None)       # в очереди 1
+    assert executor.submit(7, lambda: None)       # в очереди 2
+    assert not executor.submit(7, lambda x: None, "a")
+    assert not executor.submit(7, lambda x: None, "b")
+    assert executor.submit(8, lambda: None)       # другой чат не страдает
+
+    release.set()
+    assert executor.join(timeout=5)
+    assert rejected == [(("a",), True), (("b",), False)]
+    assert executor.stats()["rejected"] == 2
+    executor.shutdown()
+
+
+def test_handler_errors_do_not_stop_the_chat_queue():
+    executor = ChatExecutor(workers=1)
+    done = []
+
+    def failing():
+        raise RuntimeError("boom")
+
+    executor.submit(3, failing)
+    executor.submit(3, done.append, "next")
+    assert executor.join(timeout=5)
+    assert done == ["next"]
+    executor.shutdown()
+
+
+def test_bot_routes_updates_by_chat():
+    executor = Mock()
+    bot = ChatOrderedTeleBot("1:x", executor)
+    message = types.Message.de_json({
+        "message_id": 1, "date": 0, "chat": {"id": 42, "type": "private"}, "text": "hi"})
+    call = Mock(spec=["message", "from_user", "id"], message=message)
+    handler = Mock()
+
+    bot._exec_task(handler, message)
+    bot._exec_task(handler, call)
+    bot._exec_task(handler, [message])
+
+    assert [c.args[0] for c in executor.submit.call_args_list] == [42, 42, None]
+    assert update_chat_id(Mock(spec=["from_user"], from_user=Mock(id=5))) == 5
+
+
+def test_handler_errors_go_to_bot_exception_handler():
+    executor = ChatExecutor(workers=1)
+    exception_handler = Mock()
+    exception_handler.handle.return_value = True
+    bot = ChatOrderedTeleBot("1:x", executor, exception_handler=exception_handler)
+    message = types.Message.de_json({
+        "message_id": 1, "date": 0, "chat": {"id": 42, "type": "private"}, "text": "hi"})
+    error = RuntimeError("boom")
+
+    bot._exec_task(Mock(side_effect=error), message)
+    assert executor.join(timeout=5)
+
+    exception_handler.handle.assert_called_once_with(error)
+    executor.shutdown()
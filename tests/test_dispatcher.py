@@ -0,0 +1,119 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+from src.dispatcher import FanoutSavings, copy_fan_out, fan_out, deliver
+from src.session import UserSession
+
+
+CHANNELS = [("A", "@a"), ("B", "@b"), ("C", "@c")]
+
+
+def test_fan_out_runs_channels_in_parallel():
+    barrier = threading.Barrier(len(CHANNELS), timeout=2)
+
+    def send(bot, destination_id, session, timeout=None, sent=None):
+        # Пройдет только если все каналы отправляются одновременно
+        barrier.wait()
+        return True
+
+    with patch("src.dispatcher.has_uncached_local_media", return_value=False):
+        results = fan_out(Mock(), CHANNELS, UserSession(chat_id=1), send=send)
+
+    assert [r[0] for r in results] == ["A", "B", "C"]
+    assert all(r[2] for r in results)
+
+
+def test_deliver_retries_then_reports_error():
+    send = Mock(side_effect=RuntimeError("flood"))
+
+    with patch("src.dispatcher.settings") as mock_settings, patch("src.dispatcher.time.sleep"):
+        mock_settings.fanout_retries = 2
+        mock_settings.fanout_timeout = 5
+        name, cid, success, status = deliver(Mock(), "A", "@a", UserSession(chat_id=1), send=send)
+
+    assert send.call_count == 3
+    assert not success
+    assert "flood" in status
+
+
+def test_deliver_does_not_retry_after_partial_send():
+    def send(bot, destination_id, session, timeout=None, sent=None):
+        # Текст ушел, альбом - нет: повтор отправил бы текст второй раз
+        sent.append(5)
+        raise RuntimeError("flood")
+
+    send = Mock(side_effect=send)
+    with patch("src.dispatcher.settings") as mock_settings, patch("src.dispatcher.time.sleep"):
+        mock_settings.fanout_retries = 2
+        mock_settings.fanout_timeout = 5
+        name, cid, success, status = deliver(Mock(), "A", "@a", UserSession(chat_id=1), send=send)
+
+    assert send.call_count == 1
+    assert not success
+    assert "flood" in status and "частично" in status
+
+
+def test_uncached_media_goes_to_first_channel_first():
+    order = []
+
+    def send(bot, destination_id, session, timeout=None, sent=None):
+        order.append(destination_id)
+        time.sleep(0.01)
+        return True
+
+    with patch("src.dispatcher.has_uncached_local_media", return_value=True):
+        fan_out(Mock(), CHANNELS, UserSession(chat_id=1), send=send)
+
+    assert order[0] == "@a"
+
+
+def publish(sent_ids):
+    def send(bot, destination_id, session, timeout=None, sent=None):
+        if sent is not None:
+            sent.extend(sent_ids)
+        return True
+    return Mock(side_effect=send)
+
+
+def test_copy_fan_out_uploads_once_and_copies_the_rest():
+    bot = Mock()
+    bot.copy_messages.side_effect = lambda chat_id, from_chat_id, message_ids: [Mock() for _ in message_ids]
+    send = publish([5, 6, 7])
+    savings = FanoutSavings()
+    session = UserSession(chat_id=1, text="x" * 2000)
+    session.add_web_photos([f"https://img/{i}.jpg" for i in range(3)])
+
+    with patch("src.dispatcher.validate_session_media", return_value={}):
+        results = copy_fan_out(bot, CHANNELS, session, send=send, savings=savings)
+
+    assert send.call_count == 1
+    assert sorted(call.args[:3] for call in bot.copy_messages.call_args_list) == [
+        ("@b", "@a", [5, 6, 7]), ("@c", "@a", [5, 6, 7])]
+    assert [r[0] for r in results] == ["A", "B", "C"] and all(r[2] for r in results)
+    # Длинный текст и альбом - два запроса на канал, копия - один, и без 2000 символов текста
+    assert savings.copies == 2 and savings.calls == 2
+    assert savings.bytes > 2 * 2000
+
+
+def test_failed_copy_falls_back_to_full_send():
+    bot = Mock()
+    bot.copy_messages.side_effect = [RuntimeError("protected content"), [Mock()]]
+    send = publish([5])
+
+    with patch("src.dispatcher.validate_session_media", return_value={}):
+        results = copy_fan_out(bot, CHANNELS, UserSession(chat_id=1), send=send)
+
+    assert send.call_count == 2
+    assert all(r[2] for r in results)
+
+
+def test_savings_add_up_across_posts():
+    bot = Mock()
+    bot.copy_messages.side_effect = lambda chat_id, from_chat_id, message_ids: [Mock() for _ in message_ids]
+    savings = FanoutSavings()
+
+    with patch("src.dispatcher.validate_session_media", return_value={}):
+        for _ in range(3):
+            copy_fan_out(bot, CHANNELS, UserSession(chat_id=1, text="x" * 2000), send=publish([5]), savings=savings)
+
+    assert savings.copies == 3 * 2
@@ -0,0 +1,62 @@
+from unittest.mock import Mock
+from src.image_check import ImageUrlValidator
+
+
+def make_http(content_type="image/jpeg", status=200):
+    http = Mock()
+    http.head.return_value = Mock(status_code=status, headers={"content-type": content_type})
+    return http
+
+
+def test_validate_many_checks_each_url_once():
+    http = make_http()
+    validator = ImageUrlValidator(ttl=60, http=http)
+    urls = [f"https://img/{i}.jpg" for i in range(5)]
+
+    verdicts = validator.validate_many(urls + urls[:2])
+
+    assert all(verdicts.values())
+    assert http.head.call_count == 5
+
+    # Повторные проверки (превью, каналы) берут ответ из кэша
+    assert validator.is_valid(urls[0])
+    assert http.head.call_count == 5
+
+
+def test_invalid_content_type():
+    validator = ImageUrlValidator(ttl=60, http=make_http(content_type="text/html"))
+
+    assert validator.is_valid("https://img/page") is False
+
+
+def test_network_errors_are_not_cached():
+    http = Mock()
+    http.head.side_effect = ConnectionError("boom")
+    validator = ImageUrlValidator(ttl=60, http=http)
+
+    assert validator.is_valid("https://img/1.jpg") is False
+    assert validator.is_valid("https://img/1.jpg") is False
+    assert http.head.call_count == 2
+
+
+def test_ttl_expiry():
+    http = make_http()
+    validator = ImageUrlValidator(ttl=0, http=http)
+
+    validator.is_valid("https://img/1.jpg")
+    validator.is_valid("https://img/1.jpg")
+
+    assert http.head.call_count == 2
+
+
+def test_verdict_cache_is_bounded_and_drops_expired():
+    validator = ImageUrlValidator(ttl=60, http=make_http(), max_entries=3)
+
+    validator.validate_many([f"https://img/{i}.jpg" for i in range(5)])
+
+    assert validator.stats()["entries"] == 3
+    assert list(validator._verdicts) == [f"https://img/{i}.jpg" for i in (2, 3, 4)]
+
+    validator.ttl = 0
+    validator.is_valid("https://img/new.jpg")
+    assert list(validator._verdicts) == []
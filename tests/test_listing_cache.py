@@ -0,0 +1,55 @@
+from unittest.mock import Mock
+from src.listing_cache import ListingCache, normalize_url
+from src.parser import LombardParser
+from tests.test_parser_mock import MOCK_HTML
+
+URL = "https://lombard-perspectiva.ru/clock/rolex-1/"
+
+
+def make_response(status=200, headers=None):
+    return Mock(status_code=status, text=MOCK_HTML, headers=headers or {})
+
+
+def test_normalize_url():
+    assert normalize_url(URL + "?utm_source=tg#photos") == normalize_url("HTTPS://Lombard-Perspectiva.ru/clock/rolex-1")
+
+
+def test_fresh_entry_skips_network():
+    http = Mock()
+    http.get.return_value = make_response()
+    parser = LombardParser(http=http, cache=ListingCache(ttl=600))
+
+    first = parser.parse(URL)
+    second = parser.parse(URL + "?utm_source=tg")
+
+    assert first == second
+    assert http.get.call_count == 1
+    assert parser.cache.stats()["hits"] == 1
+
+
+def test_expired_entry_is_revalidated_with_304():
+    http = Mock()
+    http.get.return_value = make_response(headers={"ETag": '"abc"'})
+    cache = ListingCache(ttl=0)
+    parser = LombardParser(http=http, cache=cache)
+    html, _ = parser.parse(URL)
+
+    http.get.return_value = make_response(status=304)
+    assert parser.parse(URL)[0] == html
+
+    sent_headers = http.get.call_args.kwargs["headers"]
+    assert sent_headers["If-None-Match"] == '"abc"'
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_lru_eviction():
+    http = Mock()
+    http.get.return_value = make_response()
+    cache = ListingCache(max_size=2)
+    parser = LombardParser(http=http, cache=cache)
+
+    for i in range(3):
+        parser.parse(f"{URL}{i}")
+
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,21 @@
+from unittest.mock import patch
+
+from benchmarks.loadtest import STEPS, LoadTestConfig, run_load_test
+from src.ratelimit import outbound_governor
+
+
+def test_managers_complete_full_flow_against_fakes():
+    config = LoadTestConfig(managers=2, flows=1, flood_rate=0.0, step_timeout=20)
+
+    # Лимиты Telegram здесь не проверяем - они растягивают сценарий на десятки секунд
+    with patch.object(outbound_governor, "private_chat_rate", 1000.0), \
+            patch.object(outbound_governor, "group_rate", 1000.0), \
+            patch.object(outbound_governor, "_chats", {}):
+        report = run_load_test(config)
+
+    summary = report.summary()
+    assert summary["flows_ok"] == 2
+    assert summary["error_rate"] == 0.0
+    for step in STEPS:
+        assert summary["steps"][step]["count"] == 2
+    assert summary["api"]["by_method"]["sendMediaGroup"] >= 4  # превью + два канала на сценарий
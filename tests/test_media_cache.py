@@ -0,0 +1,70 @@
+import os
+import pytest
+from unittest.mock import Mock, patch
+from src.media_cache import MediaFileCache
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"\xff\xd8" + b"0" * 100)
+    return str(path)
+
+
+def test_miss_then_hit(tmp_path, media_file):
+    cache = MediaFileCache(str(tmp_path / "cache.json"))
+
+    assert cache.get(media_file) is None
+    cache.put(media_file, "FILE_ID_1")
+    assert cache.get(media_file) == "FILE_ID_1"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_survives_restart(tmp_path, media_file):
+    cache_path = str(tmp_path / "cache.json")
+    MediaFileCache(cache_path).put(media_file, "FILE_ID_1")
+
+    # Новый экземпляр читает file_id с диска
+    assert MediaFileCache(cache_path).get(media_file) == "FILE_ID_1"
+
+
+def test_invalidated_when_file_changes(tmp_path, media_file):
+    cache = MediaFileCache(str(tmp_path / "cache.json"))
+    cache.put(media_file, "FILE_ID_1")
+
+    with open(media_file, "ab") as f:
+        f.write(b"more bytes")
+
+    assert cache.get(media_file) is None
+    assert cache.stats()["invalidations"] == 1
+    assert len(cache) == 0
+
+
+def test_photo_and_video_keys_are_separate(tmp_path, media_file):
+    cache = MediaFileCache(None)
+    cache.put(media_file, "PHOTO_ID", media_type="photo")
+
+    assert cache.get(media_file, media_type="video") is None
+    assert not os.path.exists(str(tmp_path / "cache.json"))
+
+
+def test_rejects_non_string_file_id(tmp_path, media_file):
+    cache_path = tmp_path / "cache.json"
+    cache = MediaFileCache(str(cache_path))
+
+    cache.put(media_file, Mock())
+
+    assert len(cache) == 0
+    assert not cache_path.exists()
+
+
+def test_failed_save_leaves_no_temp_file(tmp_path, media_file):
+    cache = MediaFileCache(str(tmp_path / "cache.json"))
+    cache.put(media_file, "FILE_ID_1")
+
+    with patch("src.media_cache.json.dump", side_effect=TypeError("not serializable")):
+        cache.put(media_file, "FILE_ID_2")
+
+    assert sorted(os.listdir(tmp_path)) == ["cache.json", "photo.jpg"]
+    assert MediaFileCache(str(tmp_path / "cache.json")).get(media_file) == "FILE_ID_1"
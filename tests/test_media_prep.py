@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from src.media_prep import ImagePreprocessor
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def big_photo(tmp_path):
+    path = str(tmp_path / "big.jpg")
+    # Шум плохо сжимается - файл получается большим, как настоящие фото
+    Image.effect_noise((3000, 2000), 80).convert("RGB").save(path, quality=98)
+    return path
+
+
+def test_photo_is_downsized_and_cached(tmp_path, big_photo):
+    prep = ImagePreprocessor(str(tmp_path / "derivatives"), max_side=1280)
+
+    out = prep.prepare(big_photo)
+
+    assert out != big_photo
+    with Image.open(out) as img:
+        assert max(img.size) == 1280
+    assert prep.stats.bytes_saved > 0
+    saved = prep.stats.bytes_saved
+
+    # Второй вызов берет готовый файл и не считает экономию повторно
+    assert prep.prepare(big_photo) == out
+    assert prep.stats.files == 2
+    assert prep.stats.cache_hits == 1
+    assert prep.stats.bytes_saved == saved
+
+
+def test_concurrent_prepare_of_same_photo(tmp_path, big_photo):
+    prep = ImagePreprocessor(str(tmp_path / "derivatives"), max_side=1280)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        outputs = list(pool.map(lambda _: prep.prepare(big_photo), range(4)))
+
+    assert len(set(outputs)) == 1 and outputs[0] != big_photo
+    with Image.open(outputs[0]) as img:
+        assert max(img.size) == 1280
+    assert not [name for name in os.listdir(tmp_path / "derivatives") if name.endswith(".tmp")]
+
+
+def test_exif_orientation_applied(tmp_path, big_photo):
+    with Image.open(big_photo) as img:
+        exif = img.getexif()
+        exif[0x0112] = 6  # Поворот на 90°
+        img.save(big_photo, exif=exif, quality=98)
+
+    out = ImagePreprocessor(str(tmp_path / "derivatives")).prepare(big_photo)
+
+    with Image.open(out) as img:
+        assert img.size[1] > img.size[0]
+
+
+def test_small_photo_kept_as_is(tmp_path):
+    path = str(tmp_path / "small.jpg")
+    Image.effect_noise((200, 200), 80).convert("RGB").save(path, quality=40, optimize=True)
+
+    assert ImagePreprocessor(str(tmp_path / "derivatives")).prepare(path) == path
+    assert os.path.exists(path)
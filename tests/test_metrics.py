@@ -0,0 +1,56 @@
+import io
+import pytest
+from unittest.mock import Mock
+
+from src.instrumentation import instrumented
+from src.metrics import Counter, Histogram, HANDLER_SECONDS, ERRORS, UPLOAD_BYTES, observe_api_call, registry
+from src.ratelimit import OutboundGovernor
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Тест", ["method"], buckets=(0.1, 1))
+    histogram.observe(0.05, method="sendMessage")
+    histogram.observe(0.5, method="sendMessage")
+    histogram.observe(5, method="sendMessage")
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{method="sendMessage",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{method="sendMessage",le="1"} 2' in lines
+    assert 'test_seconds_bucket{method="sendMessage",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{method="sendMessage"} 3' in lines
+    assert histogram.quantile(0.5, method="sendMessage") == 1
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("test_total", "Тест", ["where"])
+    counter.inc(where='say "hi"')
+
+    assert 'test_total{where="say \\"hi\\""} 1' in counter.render()
+
+
+def test_instrumented_records_duration_and_errors():
+    @instrumented
+    def failing_handler(message):
+        raise KeyError("boom")
+
+    with pytest.raises(KeyError):
+        failing_handler(Mock())
+
+    assert HANDLER_SECONDS.snapshot()[("failing_handler",)][2] == 1
+    assert ERRORS.values()[("failing_handler", "KeyError")] == 1
+
+
+def test_governor_reports_api_calls_and_upload_bytes():
+    sender = Mock(return_value=Mock(status_code=200))
+    governor = OutboundGovernor(global_rate=1000, private_chat_rate=1000, group_rate_per_minute=60000, sender=sender)
+
+    governor.send("post", "https://api.telegram.org/bot1:x/sendPhoto",
+                  params={"chat_id": "@metrics_channel"}, files={"photo": ("a.jpg", io.BytesIO(b"x" * 2048))})
+    observe_api_call("sendMessage", 0.01, 200, chat_id=42, params={"chat_id": 42, "text": "hi"})
+
+    text = registry.render()
+    assert 'mybot_telegram_request_duration_seconds_count{method="sendPhoto"}' in text
+    assert 'mybot_telegram_responses_total{method="sendPhoto",code="200"}' in text
+    assert UPLOAD_BYTES.snapshot()[("@metrics_channel",)][1] == 2048
+    assert ("private",) not in UPLOAD_BYTES.snapshot()  # без файлов - без загрузки
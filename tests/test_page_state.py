@@ -0,0 +1,106 @@
+import json
+import os
+import pytest
+from unittest.mock import patch
+from src import parser as parser_module
+from src.page_state import extract_product
+from src.parser import LombardParser, extraction_stats
+from tests.test_parser_mock import MOCK_HTML
+
+URL = "https://lombard-perspectiva.ru/clocks_today/rolex-1/"
+NUXT_PAGE = os.path.join(os.path.dirname(__file__), "fixtures", "nuxt_listing.html")
+
+PRODUCT = {
+    "@context": "https://schema.org",
+    "@type": "Product",
+    "name": "Rolex Submariner",
+    "brand": {"@type": "Brand", "name": "Rolex"},
+    "sku": "124060",
+    "image": ["/upload/full/1.jpg?v=2", {"@type": "ImageObject", "contentUrl": "/upload/full/2.jpg"}],
+    "offers": {"@type": "Offer", "price": "350000", "priceCurrency": "RUB"},
+    "itemCondition": "https://schema.org/UsedCondition",
+    "additionalProperty": [
+        {"@type": "PropertyValue", "name": "Материал корпуса", "value": "Сталь"},
+        {"@type": "PropertyValue", "name": "Диаметр корпуса, мм", "value": 41},
+    ],
+}
+
+
+def ld_json_page(data) -> str:
+    return f'<html><head><script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script></head>' \
+           f'<body>{MOCK_HTML}</body></html>'
+
+
+@pytest.fixture
+def paths():
+    parser_module.extraction_paths.clear()
+    yield
+    parser_module.extraction_paths.clear()
+
+
+def test_json_ld_product_serves_parse(paths):
+    html, photos = LombardParser().parse_html(ld_json_page(PRODUCT), URL)
+
+    assert "<b>Rolex</b>  <b>SUBMARINER</b>" in html
+    assert "<code>Ref.\u200b 124060</code>" in html
+    assert "<b>Состояние:</b> Б/у" in html
+    assert "<b>Материал корпуса:</b> Сталь" in html
+    assert "<b>Диаметр:</b> 41" in html
+    assert photos == [
+        "https://lombard-perspectiva.ru/upload/full/1.jpg",
+        "https://lombard-perspectiva.ru/upload/full/2.jpg",
+    ]
+    assert extraction_stats() == {"state": 1, "dom": 0}
+
+
+def test_product_inside_graph_and_nuxt_state():
+    graph = {"@context": "https://schema.org", "@graph": [{"@type": "WebPage"}, PRODUCT]}
+    nuxt = f"<script>window.__NUXT__ = {json.dumps({'data': [{'product': PRODUCT}]})};</script>"
+
+    assert extract_product(ld_json_page(graph))["sku"] == "124060"
+    assert extract_product(nuxt.encode("utf-8"), "utf-8")["sku"] == "124060"
+
+
+def test_falls_back_to_dom(paths):
+    broken = '<script type="application/ld+json">{"@type": "Product", </script>' + MOCK_HTML
+    no_photos = ld_json_page({**PRODUCT, "image": []})
+
+    for page in (MOCK_HTML, broken, no_photos):
+        html, photos = LombardParser().parse_html(page, URL)
+        assert "REF: 124060" in html
+        assert len(photos) == 2
+
+    assert extraction_stats() == {"state": 0, "dom": 3}
+
+
+def test_nuxt_data_payload_matches_dom(paths):
+    with open(NUXT_PAGE, "rb") as f:
+        page = f.read()
+
+    product = extract_product(page, "utf-8")
+    state_html, state_photos = LombardParser().parse_html(page, URL)
+    with patch.object(parser_module.settings, "parser_state_fast_path", False):
+        dom_html, dom_photos = LombardParser().parse_html(page, URL)
+
+    assert product["brand"] == "Rolex" and product["sku"] == "124060"
+    assert extraction_stats() == {"state": 1, "dom": 1}
+    assert state_html == dom_html
+    assert "<code>Ref.\u200b 124060</code>" in state_html
+    assert "<b>Диаметр:</b> 41" in state_html
+    assert state_photos == dom_photos == [
+        "https://lombard-perspectiva.ru/upload/full/51873_1.jpg",
+        "https://lombard-perspectiva.ru/upload/full/51873_2.jpg",
+    ]
+
+
+@pytest.mark.parametrize("sku", ["220.10.41", "Ref. 220.10.41", "REF: 220.10.41"])
+def test_state_reference_matches_dom_reference(sku):
+    page = ld_json_page({**PRODUCT, "sku": sku}).replace("REF: 124060", "Ref. 220.10.41")
+
+    state_html, _ = LombardParser().parse_html(page, URL)
+    with patch.object(parser_module.settings, "parser_state_fast_path", False):
+        dom_html, _ = LombardParser().parse_html(page, URL)
+
+    reference_line = dom_html.split("\n")[1]
+    assert reference_line == "<code>Ref.\u200b 220.\u200b10.\u200b41</code>"
+    assert reference_line in state_html.split("\n")
@@ -0,0 +1,30 @@
+from benchmarks.corpus import synthetic_page
+from benchmarks.parser_bench import StubTransport, check_regressions, run
+from src.parser import LombardParser
+
+
+def test_synthetic_pages_parse_like_real_listings():
+    page = synthetic_page(1)
+
+    html, photos = LombardParser(http=StubTransport([page])).parse(page.url)
+
+    assert len(page.content) > 100_000
+    assert "Ref." in html
+    assert 4 <= len(photos) <= 10
+
+
+def test_run_reports_all_metrics():
+    report = run("lxml", rounds=1, workers=2, pages=[synthetic_page(0), synthetic_page(1)])
+
+    for key in ("p50_ms", "p95_ms", "peak_kb", "allocations", "pages_per_sec", "pages_per_sec_workers"):
+        assert report[key] > 0
+
+
+def test_check_regressions():
+    baseline = {"p50_ms": 10.0, "p95_ms": 20.0, "peak_kb": 100.0, "allocations": 50, "pages_per_sec": 100.0}
+    same = dict(baseline, pages_per_sec_workers=100.0)
+    worse = dict(same, p50_ms=16.0, peak_kb=120.0, pages_per_sec=40.0)
+
+    assert check_regressions(same, baseline, tolerance=0.5, memory_tolerance=0.1) == []
+    problems = check_regressions(worse, baseline, tolerance=0.5, memory_tolerance=0.1)
+    assert [p.split(":")[0] for p in problems] == ["p50_ms", "peak_kb", "pages_per_sec"]
@@ -1,5 +1,7 @@
+import asyncio
+import aiohttp
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 from src.parser import LombardParser
 
 # Мок HTML контент
@@ -62,4 +64,67 @@ def test_html_contains_characteristics(parser, mock_requests_get):
     assert "Материал корпуса" in html
     assert "Нержавеющая сталь" in html
     assert "Функции" in html  # должно быть "Нет данных" по умолчанию
-    assert "Материал ремешка" in html
\ No newline at end of file
+    assert "Материал ремешка" in html
+
+def test_parse_many_keeps_order_and_errors(parser):
+    def get(url, **kwargs):
+        # Ответ aiohttp: async with http.get(...) as response
+        response = MagicMock(status=200 if url.endswith("/1") else 404, charset="utf-8", headers={})
+        response.read = AsyncMock(return_value=MOCK_HTML.encode())
+        if response.status == 404:
+            response.raise_for_status.side_effect = aiohttp.ClientResponseError(Mock(), (), status=404)
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=response)
+        context.__aexit__ = AsyncMock(return_value=False)
+        return context
+
+    http = Mock(get=Mock(side_effect=get))
+    urls = ["https://test.com/watch/1", "https://test.com/watch/2"]
+    with patch("src.parser.get_async_http_session", AsyncMock(return_value=http)):
+        results = asyncio.run(parser.parse_many(urls, concurrency=2))
+
+    assert isinstance(results[0], tuple) and "SUBMARINER" in results[0][0]
+    assert isinstance(results[1], aiohttp.ClientResponseError)
+    assert http.get.call_count == 2
+
+def test_pooled_session_is_used():
+    http = Mock()
+    http.get.return_value = Mock(text=MOCK_HTML)
+
+    _, photos = LombardParser(http=http).parse("https://test.com/watch/1")
+
+    http.get.assert_called_once()
+    assert len(photos) == 2
+
+TRICKY_HTML = """<?xml version="1.0" encoding="utf-8"?>
+<html><body>
+    <a class="x catalog-item--brand-title"> Omega <!-- old --> <b>Seamaster&nbsp;</b><script>var s=1;</script></a>
+    <div class="catalog-item--model-wrap">не модель</div>
+    <div class="catalog-item--model"> Aqua <style>.a{}</style>Terra </div>
+    <div class="text-gray">Ref. 220.10.41</div>
+    <p class="item-price--text">   </p>
+    <div class="flex-shrink-0 pa-2">Хорошее &amp; чистое</div>
+    <div class="catalog-item--photos__grid">
+        <img src="/img/1.jpg?w=100"/><img src="/img/1.jpg"/><img src="/img/noimage.png"/>
+        <img src="data:image/png;base64,AAA"/><img/><img src="https://cdn.test/2.jpg"/>
+    </div>
+    <div class="my-2 align-baseline justify-space-between flex-nowrap d-sm-flex d-block">
+        <div class="option-label">Диаметр корпуса, мм</div><div class="option-value">41</div>
+    </div>
+    <div class="d-block d-sm-flex flex-nowrap justify-space-between align-baseline my-2">
+        <div class="option-label">Материал корпуса и ремешка</div><div class="option-value">Сталь</div>
+    </div>
+    <div class="d-block d-sm-flex">
+        <div class="option-label">Водонепроницаемость</div><div class="option-value">не строка характеристик</div>
+    </div>
+</body></html>
+"""
+
+@pytest.mark.parametrize("page", [MOCK_HTML, TRICKY_HTML])
+def test_lxml_engine_matches_bs4(page):
+    url = "https://test.com/watch/1"
+
+    expected = LombardParser(engine="bs4").parse_html(page, url)
+
+    assert LombardParser(engine="lxml").parse_html(page, url) == expected
+    assert LombardParser(engine="lxml").parse_html(page.encode("utf-8"), url, "utf-8") == expected
@@ -0,0 +1,122 @@
+from unittest.mock import Mock, patch
+
+from telebot.apihelper import ApiTelegramException
+
+from src.preview import plan_preview_update, preview_media, preview_stats
+from src.session import UserSession
+from src.utils import send_preview_media, send_preview_text, update_preview
+
+URLS = ["https://img/1.jpg", "https://img/2.jpg", "https://img/3.jpg"]
+
+
+def sent_preview():
+    """Сессия с уже отправленным превью: текст и альбом из трех фото"""
+    bot = Mock()
+    bot.send_message.return_value = Mock(message_id=10)
+    bot.send_media_group.side_effect = lambda chat_id, media, **kw: [Mock(message_id=11 + i) for i in range(len(media))]
+    session = UserSession(chat_id=1, text="Rolex", url="https://lombard-perspectiva.ru/clock/1/")
+    session.add_web_photos(URLS)
+    with patch("src.utils.image_validator.validate_many", return_value={}):
+        send_preview_text(bot, session)
+        send_preview_media(bot, session)
+    return bot, session
+
+
+def plan(session):
+    return plan_preview_update(session, *preview_media(session, {}), media_input=Mock())
+
+
+def test_sent_preview_is_tracked():
+    _, session = sent_preview()
+
+    assert session.preview_message_id == 10
+    assert [item["message_id"] for item in session.preview_items] == [11, 12, 13]
+    assert session.preview_items[0]["caption"] == "PHOTO 1/3"
+
+
+def test_text_edit_only_edits_text_message():
+    _, session = sent_preview()
+    session.text = "Patek"
+
+    result = plan(session)
+
+    assert [call[0] for call in result.calls] == ["edit_message_text"]
+    assert result.calls[0][1]["message_id"] == 10
+    assert result.saved_bytes > 0
+
+
+def test_reorder_edits_only_swapped_photos():
+    _, session = sent_preview()
+    session.move_photo_down(1)
+
+    result = plan(session)
+
+    assert [(method, kwargs["message_id"]) for method, kwargs, _ in result.calls] == [
+        ("edit_message_media", 12), ("edit_message_media", 13)]
+    assert result.calls[0][1]["media"].media == URLS[2]
+
+
+def test_removal_deletes_tail_and_fixes_caption():
+    _, session = sent_preview()
+    session.remove_photo(0)
+
+    result = plan(session)
+
+    methods = [(method, kwargs["message_id"]) for method, kwargs, _ in result.calls]
+    # Счетчик медиа в тексте, первое фото (с подписью), второе; третье сообщение больше не нужно
+    assert methods == [("edit_message_text", 10), ("edit_message_media", 11),
+                       ("edit_message_media", 12), ("delete_message", 13)]
+    assert result.calls[1][1]["media"].caption == "PHOTO 1/2"
+    assert [item["message_id"] for item in result.items] == [11, 12]
+    assert not result.resend_media
+
+
+def test_more_media_than_sent_resends_media_only():
+    _, session = sent_preview()
+    session.add_web_photos(["https://img/4.jpg"])
+
+    result = plan(session)
+
+    assert result.resend_media
+    assert {method for method, _, _ in result.calls} == {"delete_message", "edit_message_text"}
+
+
+def test_update_preview_edits_in_place_and_counts_savings():
+    bot, session = sent_preview()
+    bot.reset_mock()
+    session.text = "Patek"
+    before = preview_stats()
+
+    with patch("src.utils.image_validator.validate_many", return_value={}):
+        assert update_preview(bot, session)
+
+    bot.send_media_group.assert_not_called()
+    bot.edit_message_text.assert_called_once()
+    assert "Patek" in session.preview_text
+    assert preview_stats()["edits"] == before["edits"] + 1
+    assert preview_stats()["bytes_saved"] > before["bytes_saved"]
+
+
+def test_update_preview_resends_when_edit_is_refused():
+    bot, session = sent_preview()
+    bot.reset_mock()
+    bot.edit_message_text.side_effect = ApiTelegramException(
+        "editMessageText", None, {"error_code": 400, "description": "Bad Request: message to edit not found"})
+    session.text = "Patek"
+
+    with patch("src.utils.image_validator.validate_many", return_value={}):
+        assert not update_preview(bot, session)
+
+    # Старое превью удалено, новое отправлено целиком
+    assert sorted(call.args[1] for call in bot.delete_message.call_args_list) == [10, 11, 12, 13]
+    bot.send_media_group.assert_called_once()
+
+
+def test_not_modified_is_not_an_error():
+    bot, session = sent_preview()
+    bot.edit_message_caption.side_effect = ApiTelegramException(
+        "editMessageCaption", None, {"error_code": 400, "description": "Bad Request: message is not modified"})
+    session.preview_items[0]["caption"] = "stale"
+
+    with patch("src.utils.image_validator.validate_many", return_value={}):
+        assert update_preview(bot, session)
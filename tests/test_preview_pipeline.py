@@ -0,0 +1,75 @@
+import threading
+from unittest.mock import Mock, patch
+from src import instrumentation
+from src.metrics import STAGE_SECONDS
+from src.session import UserSession
+from src.utils import start_preview_pipeline
+
+
+def make_session():
+    session = UserSession(chat_id=1, text="<b>Rolex</b>")
+    session.add_web_photos(["https://img/1.jpg", "https://img/2.jpg"])
+    return session
+
+
+def test_text_is_sent_before_media_and_menu():
+    bot = Mock()
+    order = []
+    bot.send_message.side_effect = lambda chat_id, text, **kw: order.append("text") or Mock(message_id=10)
+    bot.send_media_group.side_effect = lambda chat_id, media, **kw: order.append("media") or []
+    validation_started = threading.Event()
+
+    def slow_validation(urls):
+        validation_started.set()
+        return {url: True for url in urls}
+
+    with patch("src.utils.image_validator.validate_many", side_effect=slow_validation), \
+         patch("src.utils.is_valid_image_url", return_value=True):
+        future = start_preview_pipeline(bot, make_session(), on_ready=lambda: order.append("menu"))
+        future.result(timeout=5)
+
+    assert validation_started.is_set()
+    assert order == ["text", "media", "menu"]
+
+
+def test_first_preview_hook_is_emitted():
+    seen = []
+    instrumentation.subscribe(instrumentation.FIRST_PREVIEW, lambda **fields: seen.append(fields))
+
+    with patch("src.utils.image_validator.validate_many", return_value={}), \
+         patch("src.utils.is_valid_image_url", return_value=True):
+        start_preview_pipeline(Mock(), make_session()).result(timeout=5)
+
+    assert seen and seen[-1]["chat_id"] == 1
+    assert seen[-1]["seconds"] >= 0
+
+
+def test_media_stage_stops_when_post_is_cleared_meanwhile():
+    bot = Mock()
+    bot.send_message.return_value = Mock(message_id=10)
+    session = make_session()
+    on_ready = Mock()
+
+    def cleared_during_validation(urls):
+        session.clear()  # /clear или следующий черновик, пока проверяются ссылки
+        return {url: True for url in urls}
+
+    with patch("src.utils.image_validator.validate_many", side_effect=cleared_during_validation), \
+         patch("src.utils.is_valid_image_url", return_value=True):
+        start_preview_pipeline(bot, session, on_ready=on_ready).result(timeout=5)
+
+    bot.send_media_group.assert_not_called()
+    on_ready.assert_not_called()
+    assert session.preview_items == []
+
+
+def test_preview_media_stage_is_recorded():
+    def media_count():
+        return STAGE_SECONDS.snapshot().get(("preview_media",), ([], 0, 0))[2]
+
+    before = media_count()
+    with patch("src.utils.image_validator.validate_many", return_value={}), \
+         patch("src.utils.is_valid_image_url", return_value=True):
+        start_preview_pipeline(Mock(), make_session()).result(timeout=5)
+
+    assert media_count() == before + 1
@@ -0,0 +1,108 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.instrumentation import instrumented, timed_stage
+from src.profiling import Profiler
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    with patch("src.instrumentation.profiler", profiler):
+        yield profiler
+    profiler.stop()
+
+
+def busy(n=20000):
+    return sum(i * i for i in range(n))
+
+
+def test_cpu_profile_stops_after_n_handlers_and_reports(profiler):
+    reports = []
+
+    @instrumented
+    def handle_link(message):
+        return busy()
+
+    with patch("src.profiling.scheduler.schedule") as schedule:
+        profiler.start("cpu", invocations=2, on_done=lambda report, name: reports.append((report, name)))
+        handle_link(Mock())
+        handle_link(Mock())
+        # Второй обработчик закрыл профиль - отчет строится в потоке планировщика
+        finish = schedule.call_args_list[-1]
+        finish.args[1](*finish.args[2:])
+
+    assert not profiler.active
+    report, file_name = reports[0]
+    assert file_name.startswith("profile-cpu-") and file_name.endswith(".txt")
+    assert "обработчиков: 2" in report
+    assert "busy" in report
+
+
+def test_cpu_profile_skips_concurrent_handlers_instead_of_failing(profiler):
+    release = threading.Event()
+    results = []
+
+    @timed_stage("slow_stage")
+    def slow():
+        release.wait(2)
+        return "slow"
+
+    profiler.start("cpu", seconds=30)
+    worker = threading.Thread(target=lambda: results.append(slow()))
+    worker.start()
+    time.sleep(0.1)
+
+    # cProfile один на процесс: второй поток работает без профиля
+    assert timed_stage("fast_stage")(lambda: "fast")() == "fast"
+    release.set()
+    worker.join()
+
+    assert results == ["slow"]
+    assert profiler.skipped == 1
+    assert "function calls" in profiler.stop()
+
+
+def test_sampler_sees_work_in_other_threads(profiler):
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            busy(1000)
+
+    worker = threading.Thread(target=spin)
+    worker.start()
+    try:
+        profiler.start("sample", seconds=30)
+        time.sleep(0.3)
+        report = profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert "Сэмплов:" in report
+    assert "spin (test_profiling.py" in report
+
+
+def test_memory_diff_includes_session_context(profiler):
+    profiler.memory_context = lambda: "Сессий: 3"
+    profiler.start("memory", seconds=30)
+    grown = [bytearray(1024) for _ in range(200)]
+
+    report = profiler.stop()
+
+    assert "Сессий: 3" in report
+    assert "Рост по строкам" in report
+    assert "test_profiling.py" in report
+    assert len(grown) == 200
+
+
+def test_only_one_profile_at_a_time(profiler):
+    profiler.start("sample", seconds=30)
+    with pytest.raises(RuntimeError):
+        profiler.start("cpu", invocations=5)
+    with pytest.raises(ValueError):
+        Profiler().start("gpu", seconds=1)
@@ -0,0 +1,91 @@
+import json
+import time
+from unittest.mock import Mock, patch
+from src.ratelimit import OutboundGovernor, InboundLimiter, TokenBucket, message_cost
+
+URL = "https://api.telegram.org/bot1:x/"
+
+
+def response(status=200, retry_after=None):
+    body = {"ok": status == 200, "result": True}
+    if retry_after is not None:
+        body["parameters"] = {"retry_after": retry_after}
+    return Mock(status_code=status, json=Mock(return_value=body))
+
+
+def test_429_is_retried_after_retry_after():
+    sender = Mock(side_effect=[response(429, retry_after=3), response()])
+    governor = OutboundGovernor(sender=sender)
+
+    with patch("src.ratelimit.time.sleep") as sleep:
+        result = governor.send("post", URL + "sendMediaGroup", params={"chat_id": "@channel", "media": "[]"})
+
+    assert result.status_code == 200
+    assert sender.call_count == 2
+    assert any(call.args[0] >= 2.9 for call in sleep.call_args_list)
+    assert governor.stats()["flood_errors"] == 1
+
+
+def test_group_chat_is_limited_to_20_per_minute():
+    governor = OutboundGovernor(sender=Mock(return_value=response()))
+    media = json.dumps([{"type": "photo", "media": "x"}] * 10)
+
+    with patch("src.ratelimit.time.sleep") as sleep:
+        governor.send("post", URL + "sendMediaGroup", params={"chat_id": "-100123", "media": media})
+        sleep.assert_not_called()
+        governor.send("post", URL + "sendMediaGroup", params={"chat_id": "-100123", "media": media})
+
+    # Второй альбом из 10 фото ждет ~30 секунд
+    assert sleep.call_args.args[0] > 25
+
+
+def test_read_methods_are_not_throttled():
+    governor = OutboundGovernor(global_rate=1, sender=Mock(return_value=response()))
+
+    with patch("src.ratelimit.time.sleep") as sleep:
+        for _ in range(5):
+            governor.send("get", URL + "getChat", params={"chat_id": "@channel"})
+
+    sleep.assert_not_called()
+
+
+def test_message_cost():
+    assert message_cost("sendMediaGroup", {"media": json.dumps([1, 2, 3])}) == 3
+    assert message_cost("sendMessage", {"text": "hi"}) == 1
+    assert message_cost("copyMessages", {"message_ids": json.dumps([5, 6])}) == 2
+
+
+def test_inbound_limiter():
+    limiter = InboundLimiter(per_minute=2)
+
+    assert limiter.allow(1) and limiter.allow(1)
+    assert not limiter.allow(1)
+    assert limiter.allow(2)
+    assert limiter.rejected == 1
+
+
+def test_token_bucket_reserve():
+    bucket = TokenBucket(rate=1, capacity=1)
+
+    assert bucket.reserve() == 0
+    assert 0.9 < bucket.reserve() <= 1.0
+
+
+def test_idle_buckets_are_pruned_on_access():
+    governor = OutboundGovernor(sender=Mock(return_value=response()), prune_interval=60)
+    limiter = InboundLimiter(per_minute=2, prune_interval=60)
+    now = time.monotonic()
+
+    with patch("src.ratelimit.time.monotonic", return_value=now):
+        for chat_id in range(100):
+            governor.reserve(chat_id)
+            limiter.allow(chat_id)
+        governor._chat_bucket(-100123).block_for(3600)
+
+    with patch("src.ratelimit.time.monotonic", return_value=now + 100):
+        governor.reserve(7)
+        assert limiter.allow(7)
+
+    # Остались только свежий чат и заблокированный после 429
+    assert set(governor._chats) == {"7", "-100123"}
+    assert set(limiter._users) == {7}
@@ -0,0 +1,51 @@
+import threading
+import time
+from src.scheduler import DelayedScheduler
+
+
+def test_actions_run_in_time_order():
+    scheduler = DelayedScheduler()
+    done = threading.Event()
+    calls = []
+
+    scheduler.schedule(0.05, calls.append, "late")
+    scheduler.schedule(0.01, calls.append, "early")
+    scheduler.schedule(0.06, done.set)
+
+    assert done.wait(2)
+    assert calls == ["early", "late"]
+    assert scheduler.stats()["queue_depth"] == 0
+    scheduler.shutdown()
+
+
+def test_schedule_does_not_block_caller():
+    scheduler = DelayedScheduler()
+    started = time.monotonic()
+
+    scheduler.schedule(10, lambda: None)
+
+    assert time.monotonic() - started < 0.1
+    assert scheduler.stats()["queue_depth"] == 1
+    scheduler.shutdown(drain=False)
+
+
+def test_shutdown_drains_pending():
+    scheduler = DelayedScheduler()
+    calls = []
+    scheduler.schedule(60, calls.append, 1)
+    scheduler.schedule(30, calls.append, 2)
+
+    scheduler.shutdown(drain=True)
+
+    assert calls == [2, 1]
+
+
+def test_cancelled_action_is_skipped():
+    scheduler = DelayedScheduler()
+    calls = []
+    action = scheduler.schedule(60, calls.append, 1)
+    scheduler.cancel(action)
+
+    scheduler.shutdown(drain=True)
+
+    assert calls == []
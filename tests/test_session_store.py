@@ -0,0 +1,104 @@
+import time
+import pytest
+from unittest.mock import patch
+from src.session import MediaData
+from src.session_store import SessionStore, SQLiteSessionBackend
+
+
+def test_lru_limit():
+    store = SessionStore(max_sessions=2)
+    for chat_id in (1, 2, 3):
+        store.get_or_create(chat_id)
+
+    assert 1 not in store
+    assert len(store) == 2
+    assert store.stats()["evicted_lru"] == 1
+
+
+def test_idle_sessions_evicted():
+    store = SessionStore(idle_ttl=60)
+    with patch("src.session_store.time.monotonic", return_value=0):
+        store.get_or_create(1)
+    with patch("src.session_store.time.monotonic", return_value=50):
+        store.get_or_create(2)
+
+    with patch("src.session_store.time.monotonic", return_value=100):
+        assert store.evict_idle() == 1
+
+    assert 1 not in store and 2 in store
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    db_path = str(tmp_path / "sessions.sqlite3")
+    store = SessionStore(backend=SQLiteSessionBackend(db_path))
+    session = store.get_or_create(42)
+    session.text = "Rolex"
+    session.add_web_photos(["https://img/1.jpg", "https://img/2.jpg"])
+    session.move_photo_down(0)
+    store.close()
+
+    restored = SessionStore(backend=SQLiteSessionBackend(db_path)).get_or_create(42)
+
+    assert restored.text == "Rolex"
+    assert [p.url for p in restored.selected_photos] == ["https://img/2.jpg", "https://img/1.jpg"]
+    assert isinstance(restored.photos[0], MediaData)
+
+
+def test_lru_eviction_keeps_session_in_backend(tmp_path):
+    store = SessionStore(backend=SQLiteSessionBackend(str(tmp_path / "s.sqlite3")), max_sessions=1)
+    store.get_or_create(1).text = "first"
+    store.get_or_create(2)
+
+    assert store.get_or_create(1).text == "first"
+
+
+def test_get_finds_session_only_in_backend(tmp_path):
+    db_path = str(tmp_path / "s.sqlite3")
+    store = SessionStore(backend=SQLiteSessionBackend(db_path))
+    store.get_or_create(7).text = "Rolex"
+    store.close()
+
+    restarted = SessionStore(backend=SQLiteSessionBackend(db_path))
+    assert 7 not in restarted
+    session = restarted.get(7)
+    session.clear()
+    restarted.flush()
+
+    assert restarted.get(8) is None
+    assert SQLiteSessionBackend(db_path).load(7).text == ""
+
+
+def test_idle_eviction_keeps_draft_queue(tmp_path):
+    db_path = str(tmp_path / "s.sqlite3")
+    store = SessionStore(backend=SQLiteSessionBackend(db_path), idle_ttl=60)
+    with patch("src.session_store.time.monotonic", return_value=0):
+        store.get_or_create(1).drafts.append({"url": "https://lombard-perspectiva.ru/clock/1/"})
+        store.get_or_create(2).text = "без черновиков"
+
+    with patch("src.session_store.time.monotonic", return_value=100), \
+         patch("src.session_store.time.time", return_value=time.time() + 100):
+        assert store.evict_idle() == 1
+
+    assert 1 not in store and 2 not in store
+    assert store.get(2) is None
+    assert [draft["url"] for draft in store.get(1).drafts] == ["https://lombard-perspectiva.ru/clock/1/"]
+
+
+def test_memory_store_keeps_idle_session_with_drafts():
+    store = SessionStore(idle_ttl=60)
+    with patch("src.session_store.time.monotonic", return_value=0):
+        store.get_or_create(1).drafts.append({"url": "u"})
+
+    with patch("src.session_store.time.monotonic", return_value=100):
+        assert store.evict_idle() == 0
+
+    assert store.get(1).drafts == [{"url": "u"}]
+
+
+def test_sqlite_path_is_opened_lazily_and_named_in_errors(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    backend = SQLiteSessionBackend(str(blocker / "sessions.sqlite3"))
+
+    with pytest.raises(RuntimeError, match="SESSION_DB_PATH"):
+        backend.load(1)
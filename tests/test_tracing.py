@@ -0,0 +1,85 @@
+import json
+import logging
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.instrumentation import instrumented
+from src.tracing import bind_trace, current_trace_id, load_records, propagate, slowest_posts, span, trace_logger
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def spans():
+    handler = _Records()
+    trace_logger.addHandler(handler)
+    yield handler.records
+    trace_logger.removeHandler(handler)
+
+
+def test_spans_are_linked_and_only_emitted_inside_a_trace(spans):
+    with span("outside"):
+        pass
+
+    @instrumented
+    def handler():
+        bind_trace("t1", chat_id=7)
+        with span("fetch", url="https://x"):
+            pass
+        with pytest.raises(ValueError), span("parse"):
+            raise ValueError("bad page")
+
+    handler()
+
+    by_name = {record["span"]: record for record in spans}
+    assert set(by_name) == {"fetch", "parse", "handler"}
+    assert by_name["fetch"]["parent_id"] == by_name["handler"]["span_id"]
+    assert by_name["fetch"]["url"] == "https://x"
+    assert by_name["parse"]["status"] == "error" and by_name["parse"]["error"] == "ValueError"
+    assert all(record["trace_id"] == "t1" and record["chat_id"] == 7 for record in spans)
+    # trace обработчика не остается в потоке после него
+    assert current_trace_id() is None
+
+
+def test_trace_follows_tasks_into_thread_pool(spans):
+    @instrumented
+    def confirm():
+        bind_trace("t2")
+        with span("fan_out"), ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(propagate(lambda n=n: span_in_worker(n))) for n in range(2)]
+            return [f.result() for f in futures]
+
+    def span_in_worker(n):
+        with span("deliver", destination=n):
+            return current_trace_id()
+
+    assert confirm() == ["t2", "t2"]
+    fan_out = next(record for record in spans if record["span"] == "fan_out")
+    delivers = [record for record in spans if record["span"] == "deliver"]
+    assert len(delivers) == 2
+    assert all(record["parent_id"] == fan_out["span_id"] for record in delivers)
+
+
+def test_slowest_posts_from_log_lines():
+    lines = [
+        "2025-01-01 [INFO] src.main - not a span",
+        json.dumps({"trace_id": "a", "span_id": "1", "parent_id": None, "span": "handle_link",
+                    "chat_id": 1, "start": 100.0, "duration_ms": 900.0, "status": "ok"}),
+        json.dumps({"trace_id": "a", "span_id": "2", "parent_id": "1", "span": "fetch",
+                    "chat_id": 1, "start": 100.1, "duration_ms": 700.0, "status": "ok"}),
+        json.dumps({"trace_id": "b", "span_id": "3", "parent_id": None, "span": "handle_link",
+                    "chat_id": 2, "start": 200.0, "duration_ms": 100.0, "status": "ok"}),
+    ]
+
+    posts = slowest_posts(load_records(lines))
+
+    assert [post["trace_id"] for post in posts] == ["a", "b"]
+    assert posts[0]["slowest_span"] == "fetch"
+    assert posts[0]["total_ms"] == 900.0
@@ -0,0 +1,90 @@
+import glob
+import os
+import time
+import pytest
+from unittest.mock import Mock, patch
+from telebot import apihelper
+
+pytest.importorskip("flask")
+
+from src.webhook import create_app
+from tests.webhook_harness import FIXTURES_DIR, load_updates, post_updates
+
+
+@pytest.fixture
+def api_calls():
+    """Фейковый Bot API: записывает вызванные методы"""
+    calls = []
+
+    def sender(method, url, params=None, files=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        calls.append((api_method, params or {}))
+        result = True
+        if api_method.startswith(("send", "edit")):
+            result = {"message_id": len(calls), "date": 0, "chat": {"id": 5001, "type": "private"}, "text": ""}
+        return Mock(status_code=200, text="", json=Mock(return_value={"ok": True, "result": result}))
+
+    with patch.object(apihelper, "CUSTOM_REQUEST_SENDER", sender):
+        yield calls
+
+
+@pytest.fixture
+def client():
+    return create_app(register_webhook=False).test_client()
+
+
+def wait_for(calls, method, count=1, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if sum(1 for name, _ in calls if name == method) >= count:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_health_endpoints(client):
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 200
+
+
+def test_recorded_updates_reach_handlers(client, api_calls):
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json")))
+
+    codes = post_updates(client, load_updates(paths))
+
+    assert codes == [200] * len(paths)
+    # /start, неверная ссылка и меню каналов отвечают сообщением, callback подтверждается
+    assert wait_for(api_calls, "sendMessage", count=3)
+    assert wait_for(api_calls, "answerCallbackQuery")
+
+
+def test_secret_token_is_checked(client, api_calls):
+    with patch("src.webhook.settings") as mock_settings:
+        mock_settings.webhook_secret = "s3cret"
+        update = load_updates([os.path.join(FIXTURES_DIR, "start.json")])
+
+        assert post_updates(client, update) == [403]
+        assert post_updates(client, update, secret="s3cret") == [200]
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "mybot_active_sessions" in response.get_data(as_text=True)
+
+
+def test_webhook_registration_keeps_pending_updates_unless_asked():
+    from src import webhook
+
+    bot = Mock()
+    with patch.object(webhook, "settings") as mock_settings:
+        mock_settings.webhook_url = "https://bot.example.com/"
+        mock_settings.webhook_secret = "s"
+        mock_settings.webhook_drop_pending_updates = False
+        webhook.setup_webhook(bot)
+        mock_settings.webhook_drop_pending_updates = True
+        webhook.setup_webhook(bot)
+
+    assert [c.kwargs["drop_pending_updates"] for c in bot.set_webhook.call_args_list] == [False, True]
+    assert bot.set_webhook.call_args.kwargs["url"] == "https://bot.example.com/webhook"
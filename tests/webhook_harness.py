@@ -0,0 +1,46 @@
+"""
+Отправка записанных обновлений Telegram в webhook.
+
+Как скрипт - в запущенный сервис:
+    python -m tests.webhook_harness http://localhost:8080/webhook tests/fixtures/updates/*.json
+В тестах - через Flask test client (post_updates(client, ...)).
+"""
+import glob
+import json
+import os
+import sys
+from typing import Iterable, List
+
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "updates")
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_updates(paths: Iterable[str]) -> List[dict]:
+    updates = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            updates.append(json.load(f))
+    return updates
+
+
+def post_updates(target, updates: Iterable[dict], secret: str = "") -> List[int]:
+    """target - URL webhook или Flask test client; возвращает HTTP-коды ответов"""
+    headers = {SECRET_HEADER: secret} if secret else {}
+    codes = []
+    for update in updates:
+        if isinstance(target, str):
+            response = requests.post(target, json=update, headers=headers, timeout=10)
+            codes.append(response.status_code)
+        else:
+            response = target.post("/webhook", json=update, headers=headers)
+            codes.append(response.status_code)
+    return codes
+
+
+if __name__ == "__main__":
+    url, *paths = sys.argv[1:]
+    paths = paths or sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json")))
+    for path, code in zip(paths, post_updates(url, load_updates(paths), os.environ.get("WEBHOOK_SECRET", ""))):
+        print(f"{code} {os.path.basename(path)}")